@@ -0,0 +1,192 @@
+import itertools
+import os
+from math import gcd
+
+import numpy as np
+
+from codec import ENGLISH_ALPHABET, RUSSIAN_ALPHABET, get_codec
+from hill import MAX_KEY_SIZE
+from modmath import _matrix_inverse_mod, mod_inverse
+import parallel
+
+# Сколько наборов из n блоков перебирать в поисках обратимой матрицы открытого текста
+MAX_CRIB_COMBINATIONS = 5000
+# Сколько блоков шифртекста оценивается при переборе: дальше оценка почти не уточняется
+SAMPLE_BLOCKS = int(os.environ.get("KURSOVAYA_ANALYSIS_SAMPLE_BLOCKS", "200"))
+TOP_KEYS = 10
+PREVIEW_LETTERS = 60
+ROWS_PER_STEP = 16  # Первых строк матрицы за один шаг: промежуточный массив ROWS_PER_STEP * m * m * блоков
+
+# Частоты букв (%) в обычных текстах; буквы a-f английского алфавита в открытом тексте не встречаются
+LETTER_FREQUENCIES = {
+    RUSSIAN_ALPHABET: {
+        'О': 10.97, 'Е': 8.49, 'А': 8.01, 'И': 7.35, 'Н': 6.70, 'Т': 6.26, 'С': 5.47, 'Р': 4.73,
+        'В': 4.54, 'Л': 4.40, 'К': 3.49, 'М': 3.21, 'Д': 2.98, 'П': 2.81, 'У': 2.62, 'Я': 2.01,
+        'Ы': 1.90, 'Ь': 1.74, 'Г': 1.70, 'З': 1.65, 'Б': 1.59, 'Ч': 1.44, 'Й': 1.21, 'Х': 0.97,
+        'Ж': 0.94, 'Ш': 0.73, 'Ю': 0.64, 'Ц': 0.48, 'Щ': 0.36, 'Э': 0.32, 'Ф': 0.26,
+    },
+    ENGLISH_ALPHABET: {
+        'E': 12.70, 'T': 9.06, 'A': 8.17, 'O': 7.51, 'I': 6.97, 'N': 6.75, 'S': 6.33, 'H': 6.09,
+        'R': 5.99, 'D': 4.25, 'L': 4.03, 'C': 2.78, 'U': 2.76, 'M': 2.41, 'W': 2.36, 'F': 2.23,
+        'G': 2.02, 'Y': 1.97, 'P': 1.93, 'B': 1.49, 'V': 0.98, 'K': 0.77, 'J': 0.15, 'X': 0.15,
+        'Q': 0.10, 'Z': 0.07,
+    },
+}
+MISSING_LETTER_PERCENT = 0.001
+# Частые пары букв: без образца текста модель пар — произведение частот букв,
+# усиленное для этих пар. Иначе ключи с переставленными строками неразличимы
+COMMON_DIGRAMS = {
+    RUSSIAN_ALPHABET: ('СТ', 'НО', 'ТО', 'НА', 'ЕН', 'ОВ', 'НИ', 'РА', 'ВО', 'КО', 'ЕР', 'ПО', 'ОС', 'ПР', 'ЛИ',
+                       'ЕТ', 'АЛ', 'ЛА', 'ЕЛ', 'ОЛ', 'ОР', 'ОН', 'НЕ', 'ТА', 'ЛЬ', 'ГО', 'ТЕ', 'РЕ', 'ОМ', 'ВА'),
+    ENGLISH_ALPHABET: ('TH', 'HE', 'IN', 'ER', 'AN', 'RE', 'ND', 'AT', 'ON', 'NT', 'HA', 'ES', 'ST', 'EN', 'ED',
+                       'TO', 'IT', 'OU', 'EA', 'HI', 'IS', 'OR', 'TI', 'AS', 'TE', 'ET', 'NG', 'OF', 'AL', 'DE'),
+}
+COMMON_DIGRAM_BOOST = 4.0
+
+
+def key_to_string(key_matrix: np.ndarray) -> str:
+    # В формате parse_key: n*n чисел через пробел по строкам
+    return ' '.join(str(int(value)) for value in np.asarray(key_matrix).ravel())
+
+
+def _aligned_blocks(plain: np.ndarray, cipher: np.ndarray, n: int, offset: int):
+    # Открытый текст начинается с буквы offset шифртекста; пары блоков берутся
+    # с ближайшей границы блока
+    skip = -offset % n
+    plain = plain[skip:]
+    cipher = cipher[offset + skip:offset + skip + len(plain)]
+    count = min(len(plain), len(cipher)) // n
+    return plain[:count * n].reshape(-1, n), cipher[:count * n].reshape(-1, n)
+
+
+def _solve(plain_blocks: np.ndarray, cipher_blocks: np.ndarray, mod: int):
+    # C = P K^T (блоки — строки). Из n блоков с обратимой матрицей S: K^T = S^-1 T
+    n = plain_blocks.shape[1]
+    for rows in itertools.islice(itertools.combinations(range(len(plain_blocks)), n), MAX_CRIB_COMBINATIONS):
+        try:
+            s_inverse = np.array(_matrix_inverse_mod(plain_blocks[list(rows)].tolist(), mod), dtype=np.int64)
+        except ValueError:
+            continue
+        key_matrix = ((s_inverse @ cipher_blocks[list(rows)].astype(np.int64)) % mod).T
+        if np.array_equal((plain_blocks.astype(np.int64) @ key_matrix.T) % mod, cipher_blocks):
+            return key_matrix
+    return None
+
+
+def recover_key(plaintext: str, ciphertext: str, alphabet: str, n: int = None, offset: int = 0):
+    # Атака по известному открытому тексту: (матрица ключа, число проверенных блоков).
+    # Без n перебираются размеры 2..MAX_KEY_SIZE; ValueError, если ключ не найден
+    codec = get_codec(alphabet)
+    plain = codec.encode(plaintext)
+    cipher = codec.encode(ciphertext, keep_case=True)
+    if offset < 0 or offset >= len(cipher):
+        raise ValueError("Смещение открытого текста выходит за пределы шифртекста")
+    sizes = [n] if n else range(2, MAX_KEY_SIZE + 1)
+    for size in sizes:
+        if size < 2 or size > MAX_KEY_SIZE:
+            raise ValueError(f"Размер ключа должен быть от 2 до {MAX_KEY_SIZE}")
+        plain_blocks, cipher_blocks = _aligned_blocks(plain, cipher, size, offset)
+        if len(plain_blocks) < size:
+            if n:
+                raise ValueError(f"Для ключа {size}x{size} нужно хотя бы {size} полных блоков открытого текста")
+            break
+        key_matrix = _solve(plain_blocks, cipher_blocks, codec.size)
+        if key_matrix is not None:
+            mod_inverse(key_matrix, codec.size)  # Ключ шифрования всегда обратим; иначе пары не от шифра Хилла
+            return key_matrix, len(plain_blocks)
+    raise ValueError("Ключ не найден: открытый текст не соответствует шифртексту или его слишком мало")
+
+
+def language_model(alphabet: str, reference: str = None):
+    # Логарифмы вероятностей букв и пар соседних букв (вероятность второй буквы
+    # при первой). С образцом текста того же языка пары считаются по нему (сглаживание +1)
+    codec = get_codec(alphabet)
+    percent = np.full(codec.size, MISSING_LETTER_PERCENT)
+    for letter, value in LETTER_FREQUENCIES[alphabet].items():
+        percent[alphabet.index(letter)] = value
+    probability = percent / percent.sum()
+    letters = codec.encode(reference).astype(np.intp) if reference else np.empty(0, dtype=np.intp)
+    if len(letters) >= 2:
+        counts = np.ones((codec.size, codec.size))
+        np.add.at(counts, (letters[:-1], letters[1:]), 1)
+    else:
+        counts = np.outer(probability, probability)
+        for pair in COMMON_DIGRAMS[alphabet]:
+            counts[alphabet.index(pair[0]), alphabet.index(pair[1])] *= COMMON_DIGRAM_BOOST
+    digram = np.log(counts / counts.sum(axis=1, keepdims=True)).astype(np.float32)
+    return np.log(probability).astype(np.float32), digram
+
+
+def _row_streams(cipher_blocks: np.ndarray, mod: int) -> np.ndarray:
+    # Строка (a, b) обратной матрицы даёт свою букву каждого блока: (a*c0 + b*c1) mod m.
+    # Все m*m строк сразу: массив (m*m, число блоков)
+    rows = np.indices((mod, mod)).reshape(2, -1).T.astype(np.int64)
+    return ((rows @ cipher_blocks.T.astype(np.int64)) % mod).astype(np.uint8)
+
+
+def _score_segment(cipher_bytes: bytes, blocks: int, mod: int, unigram_bytes: bytes, digram_bytes: bytes,
+                   start: int, stop: int, top: int):
+    # Оценки всех обратимых матриц 2x2, первая строка которых — с номерами start..stop-1;
+    # возвращает top лучших (оценка, номер первой строки, номер второй строки)
+    cipher_blocks = np.frombuffer(cipher_bytes, dtype=np.uint8).reshape(blocks, 2)
+    unigram = np.frombuffer(unigram_bytes, dtype=np.float32)
+    digram = np.frombuffer(digram_bytes, dtype=np.float32).reshape(mod, mod)
+    streams = _row_streams(cipher_blocks, mod)
+    row_scores = unigram[streams].sum(axis=1)
+    rows = np.indices((mod, mod)).reshape(2, -1).T.astype(np.int64)
+    coprime = np.array([gcd(value, mod) == 1 for value in range(mod)])
+    best_scores, best_first, best_second = [], [], []
+    for step in range(start, stop, ROWS_PER_STEP):
+        first = np.arange(step, min(step + ROWS_PER_STEP, stop))
+        # Буквы обеих строк, пары внутри блока (первая строка, вторая) и на стыке блоков (вторая, следующая первая)
+        scores = row_scores[first][:, None] + row_scores[None, :]
+        scores += digram[streams[first][:, None, :], streams[None, :, :]].sum(axis=2)
+        scores += digram[streams[None, :, :-1], streams[first][:, None, 1:]].sum(axis=2)
+        det = (rows[first, 0][:, None] * rows[None, :, 1] - rows[first, 1][:, None] * rows[None, :, 0]) % mod
+        scores[~coprime[det]] = -np.inf
+        flat = scores.ravel()
+        count = min(top, len(flat))
+        chosen = np.argpartition(flat, -count)[-count:]
+        best_scores.append(flat[chosen])
+        best_first.append(first[chosen // scores.shape[1]])
+        best_second.append(chosen % scores.shape[1])
+    if not best_scores:
+        return []
+    best_scores = np.concatenate(best_scores)
+    order = np.argsort(best_scores)[::-1][:top]
+    return [(float(best_scores[i]), int(np.concatenate(best_first)[i]), int(np.concatenate(best_second)[i]))
+            for i in order if np.isfinite(best_scores[i])]
+
+
+def brute_force_2x2(ciphertext: str, alphabet: str, top: int = TOP_KEYS, reference: str = None,
+                    processes: int = None):
+    # Перебор всех обратимых ключей 2x2: каждая обратная матрица применяется к
+    # шифртексту, расшифровка оценивается частотами букв (и пар букв по образцу reference).
+    # Первые строки матриц делятся между процессами пула
+    codec = get_codec(alphabet)
+    mod = codec.size
+    cipher = codec.encode(ciphertext, keep_case=True)
+    cipher_blocks = cipher[:len(cipher) // 2 * 2].reshape(-1, 2)
+    if len(cipher_blocks) < 2:
+        raise ValueError("Для перебора нужно хотя бы 4 буквы шифртекста")
+    sample = np.ascontiguousarray(cipher_blocks[:SAMPLE_BLOCKS])
+    unigram, digram = language_model(alphabet, reference)
+    args = (sample.tobytes(), len(sample), mod, unigram.tobytes(), digram.tobytes())
+    processes = processes or parallel.CIPHER_PROCESSES
+    if processes > 1:
+        bounds = np.linspace(0, mod * mod, processes * 4 + 1, dtype=np.int64)
+        pool = parallel.get_pool(processes)
+        futures = [pool.submit(_score_segment, *args, int(start), int(stop), top)
+                   for start, stop in zip(bounds[:-1], bounds[1:])]
+        found = [item for future in futures for item in future.result()]
+    else:
+        found = _score_segment(*args, 0, mod * mod, top)
+    found.sort(reverse=True)
+    rows = np.indices((mod, mod)).reshape(2, -1).T
+    candidates = []
+    preview_blocks = cipher_blocks[:PREVIEW_LETTERS // 2].astype(np.int64)
+    for score, first, second in found[:top]:
+        inverse = np.array([rows[first], rows[second]], dtype=np.int64)
+        preview = codec.decode(((preview_blocks @ inverse.T) % mod).astype(np.uint8))
+        candidates.append({"key": mod_inverse(inverse, mod), "score": score, "preview": preview})
+    return candidates
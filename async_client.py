@@ -0,0 +1,87 @@
+import asyncio
+import os
+
+try:
+    import httpx
+except ImportError:  # Асинхронный клиент нужен только для скриптов массовой загрузки
+    httpx = None
+
+BASE_URL = os.environ.get("KURSOVAYA_URL", "http://127.0.0.1:8000")
+TIMEOUT = 60.0
+CONCURRENCY = 16
+
+
+class AsyncClient:
+    # Асинхронный клиент для скриптов: одно пуловое соединение на все запросы,
+    # массовые операции идут параллельно не более чем по concurrency штук.
+    # Пример:
+    #     async with AsyncClient(token=token) as client:
+    #         await client.add_texts(texts)
+
+    def __init__(self, base_url: str = BASE_URL, token: str = None, concurrency: int = CONCURRENCY,
+                 timeout: float = TIMEOUT, transport=None):
+        if httpx is None:
+            raise RuntimeError("Для асинхронного клиента нужен пакет httpx: pip install httpx")
+        self.token = token
+        self.concurrency = concurrency
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        self._client = httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits, transport=transport)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def _post(self, path: str, data: dict) -> dict:
+        response = await self._client.post(path, json=data)
+        response.raise_for_status()
+        return response.json()
+
+    async def _get(self, path: str, params: dict = None) -> dict:
+        response = await self._client.get(path, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def register(self, login: str, password: str) -> str:
+        response = await self._post("/create_user", {"login": login, "password": password, "token": ""})
+        self.token = response["token"]
+        return self.token
+
+    async def login(self, login: str, password: str) -> str:
+        response = await self._post("/login", {"login": login, "password": password, "token": ""})
+        self.token = response["token"]
+        return self.token
+
+    async def add_text(self, text: str) -> dict:
+        return await self._post("/add_text", {"token": self.token, "text": text})
+
+    async def encrypt(self, text: str, key: str) -> str:
+        return (await self._post("/cipher/encrypt/", {"token": self.token, "text": text, "key": key}))["message"]
+
+    async def decrypt(self, text: str, key: str) -> str:
+        return (await self._post("/cipher/decrypt/", {"token": self.token, "text": text, "key": key}))["message"]
+
+    async def encrypt_batch(self, texts, key: str) -> list:
+        items = [{"text": text, "key": key} for text in texts]
+        return (await self._post("/cipher/encrypt/batch", {"token": self.token, "items": items}))["results"]
+
+    async def _gather(self, func, values):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(value):
+            async with semaphore:
+                return await func(value)
+
+        return await asyncio.gather(*(run(value) for value in values))
+
+    async def add_texts(self, texts) -> list:
+        # Порядок ответов совпадает с порядком текстов, порядок сохранения на
+        # сервере — нет: запросы идут параллельно
+        return await self._gather(self.add_text, texts)
+
+    async def encrypt_many(self, texts, key: str) -> list:
+        return await self._gather(lambda text: self.encrypt(text, key), texts)
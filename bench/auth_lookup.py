@@ -0,0 +1,58 @@
+# Сравнение задержки запроса /get_user_id при сканировании каталога users/
+# и при поиске по индексу UserIndex.
+# Запуск из корня репозитория: python -m bench.auth_lookup [--users 10000 100000]
+import argparse
+import json
+import os
+import random
+
+from fastapi.testclient import TestClient
+
+import main
+from storage import FileStorage
+from bench.common import measure, seed_users, summarize, temp_workdir
+
+
+def legacy_token_search(token: str):
+    # Прежняя реализация token_search: открывает и разбирает каждый файл
+    for filename in os.listdir('users'):
+        if filename.endswith(".json"):
+            with open(os.path.join('users', filename), 'r') as file:
+                user_data = json.load(file)
+                if user_data["token"] == token:
+                    return user_data["id"], user_data["login"]
+    return None, None
+
+
+def run(user_counts, repeat: int, legacy_repeat: int):
+    results = []
+    indexed_search = main.token_search
+    for count in user_counts:
+        with temp_workdir():
+            tokens = seed_users(count)
+            main.storage = FileStorage('.')
+            with TestClient(main.app) as client:
+                def request():
+                    token = random.choice(tokens)
+                    assert client.get(f"/get_user_id/{token}").status_code == 200
+
+                main.token_search = indexed_search
+                indexed = summarize(measure(request, repeat))
+                main.token_search = legacy_token_search
+                try:
+                    legacy = summarize(measure(request, legacy_repeat))
+                finally:
+                    main.token_search = indexed_search
+        results.append({"users": count, "index": indexed, "scan": legacy})
+        print(f"{count} пользователей: индекс p50={indexed['p50_ms']:.3f} мс, "
+              f"сканирование p50={legacy['p50_ms']:.3f} мс")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--legacy-repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.users, args.repeat, args.legacy_repeat), indent=2))
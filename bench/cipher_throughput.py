@@ -0,0 +1,61 @@
+# Пропускная способность hill_cipher_encrypt / hill_cipher_decrypt на текстах разного размера.
+# Запуск из корня репозитория: python -m bench.cipher_throughput [--sizes 1 4 16] [--legacy]
+import argparse
+import json
+import time
+
+import numpy as np
+
+from bench.common import random_text
+from codec import ENGLISH_ALPHABET, RUSSIAN_ALPHABET
+from hill import hill_cipher_decrypt, hill_cipher_encrypt
+
+
+def legacy_encrypt(text: str, key_matrix: np.ndarray, alphabet: str):
+    # Прежний посимвольный путь: alphabet.index() для каждого символа
+    n = key_matrix.shape[0]
+    text = text.replace(" ", "").upper()
+    text_numbers = [alphabet.index(char) for char in text if char in alphabet]
+    while len(text_numbers) % n != 0:
+        text_numbers.append(alphabet.index('X' if alphabet == ENGLISH_ALPHABET else 'Е'))
+    matrix = np.array(text_numbers).reshape(-1, n).T
+    encrypted = np.dot(key_matrix, matrix) % len(alphabet)
+    return ''.join(alphabet[i] for i in encrypted.T.flatten())
+
+
+def throughput(func, text: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return len(text.encode('utf-8')) / best / 1e6
+
+
+def run(sizes_mb, repeat: int, legacy: bool):
+    key_matrix = np.array([[3, 3], [2, 5]])
+    results = []
+    for alphabet in (ENGLISH_ALPHABET, RUSSIAN_ALPHABET):
+        for size_mb in sizes_mb:
+            text = random_text(int(size_mb * 1_000_000), alphabet)
+            encrypted = hill_cipher_encrypt(text, key_matrix, alphabet)
+            row = {
+                "alphabet": "english" if alphabet == ENGLISH_ALPHABET else "russian",
+                "size_mb": size_mb,
+                "encrypt_mb_s": throughput(lambda: hill_cipher_encrypt(text, key_matrix, alphabet), text, repeat),
+                "decrypt_mb_s": throughput(lambda: hill_cipher_decrypt(encrypted, key_matrix, alphabet), text, repeat),
+            }
+            if legacy:
+                row["legacy_encrypt_mb_s"] = throughput(lambda: legacy_encrypt(text, key_matrix, alphabet), text, 1)
+            results.append(row)
+            print(row)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--legacy", action="store_true", help="также измерить прежнюю посимвольную реализацию")
+    args = parser.parse_args()
+    print(json.dumps(run(args.sizes, args.repeat, args.legacy), indent=2))
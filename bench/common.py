@@ -0,0 +1,77 @@
+import json
+import os
+import secrets
+import shutil
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+@contextmanager
+def temp_workdir():
+    # main.py работает с относительными путями users/, user_text/, encrypted_text/,
+    # поэтому бенчмарки запускаются во временном каталоге
+    old_cwd = os.getcwd()
+    path = tempfile.mkdtemp(prefix="kursovaya_bench_")
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(old_cwd)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def seed_users(count: int, user_folder: str = 'users'):
+    # Создаёт count файлов пользователей в формате register_user и возвращает их токены
+    os.makedirs(user_folder, exist_ok=True)
+    tokens = []
+    for user_id in range(1, count + 1):
+        token = secrets.token_hex(16)
+        user_data = {"id": user_id, "login": f"user{user_id}", "password": "", "token": token}
+        with open(os.path.join(user_folder, f"user_{user_id}.json"), 'w') as f:
+            json.dump(user_data, f)
+        tokens.append(token)
+    return tokens
+
+
+def measure(func, repeat: int):
+    # Возвращает задержки вызовов func в миллисекундах
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        "mean_ms": statistics.fmean(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+        "runs": len(timings),
+    }
+
+
+def random_text(size_bytes: int, alphabet: str, seed: int = 0) -> str:
+    # Случайный текст из букв алфавита; size_bytes — примерный размер в UTF-8
+    import numpy as np
+    from codec import get_codec
+    codec = get_codec(alphabet)
+    char_bytes = len(alphabet[0].encode('utf-8'))
+    rng = np.random.default_rng(seed)
+    indices = rng.integers(0, codec.size, max(1, size_bytes // char_bytes), dtype=np.uint8)
+    return codec.decode(indices)
+
+
+def random_key(n: int, mod: int, seed: int = 0):
+    # Случайный обратимый по модулю mod ключ n x n
+    import numpy as np
+    from modmath import is_invertible_mod
+    rng = np.random.default_rng(seed)
+    while True:
+        key_matrix = rng.integers(0, mod, (n, n))
+        if is_invertible_mod(key_matrix, mod):
+            return key_matrix
@@ -0,0 +1,49 @@
+# Время полного перебора ключей 2x2 (brute_force_2x2) по числу процессов и длине шифртекста.
+# Запуск из корня репозитория: python -m bench.key_search [--letters 100 400] [--processes 1 2 4]
+import argparse
+import json
+import os
+
+import numpy as np
+
+from analysis import brute_force_2x2
+from bench.common import random_key
+from bench.process_scaling import best_time
+from codec import ENGLISH_ALPHABET
+from hill import hill_cipher_encrypt
+from parallel import get_pool, shutdown
+
+SAMPLE = ("It was the best of times, it was the worst of times, it was the age of wisdom, it was the age of "
+          "foolishness, it was the epoch of belief, it was the epoch of incredulity, it was the season of Light, "
+          "it was the season of Darkness, it was the spring of hope, it was the winter of despair.")
+
+
+def run(letter_counts, process_counts, repeat: int):
+    results = []
+    key_matrix = random_key(2, len(ENGLISH_ALPHABET), seed=2)
+    try:
+        for letters in letter_counts:
+            plaintext = (SAMPLE * (letters // len(SAMPLE) + 1))[:letters * 5 // 4]
+            ciphertext = hill_cipher_encrypt(plaintext, key_matrix, ENGLISH_ALPHABET)[:letters]
+            for processes in process_counts:
+                get_pool(processes).submit(int).result()  # Запуск процессов не входит в замер
+                seconds, found = best_time(
+                    lambda: brute_force_2x2(ciphertext, ENGLISH_ALPHABET, top=1, processes=processes), repeat)
+                row = {"letters": letters, "processes": processes, "seconds": seconds,
+                       "keys_per_s": len(ENGLISH_ALPHABET) ** 4 / seconds,
+                       "found": bool(np.array_equal(found[0]["key"], key_matrix % len(ENGLISH_ALPHABET)))}
+                results.append(row)
+                print(f"{letters} букв, {processes} процессов: {seconds:.2f} с, "
+                      f"{row['keys_per_s'] / 1e6:.2f} млн ключей/с, ключ найден: {row['found']}")
+    finally:
+        shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--letters", type=int, nargs="+", default=[100, 200, 400])
+    parser.add_argument("--processes", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.letters, args.processes, args.repeat), indent=2))
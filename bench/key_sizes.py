@@ -0,0 +1,35 @@
+# Пропускная способность шифрования для ключей n x n и разных размеров текста.
+# Запуск из корня репозитория: python -m bench.key_sizes [--keys 2 4 8 16] [--sizes 1e3 1e5 1e7 1e8]
+import argparse
+import json
+import time
+
+from bench.common import random_key, random_text
+from codec import RUSSIAN_ALPHABET
+from hill import hill_cipher_encrypt
+
+
+def run(key_sizes, text_sizes, repeat: int):
+    results = []
+    for size in text_sizes:
+        text = random_text(int(size), RUSSIAN_ALPHABET)
+        for n in key_sizes:
+            key_matrix = random_key(n, len(RUSSIAN_ALPHABET), seed=n)
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                hill_cipher_encrypt(text, key_matrix, RUSSIAN_ALPHABET)
+                best = min(best, time.perf_counter() - start)
+            row = {"key_size": n, "text_bytes": int(size), "seconds": best, "mb_s": size / best / 1e6}
+            results.append(row)
+            print(row)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, nargs="+", default=list(range(2, 17)))
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1e3, 1e5, 1e7, 1e8])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.keys, args.sizes, args.repeat), indent=2))
@@ -0,0 +1,121 @@
+# Нагрузочный тест: локальный uvicorn и параллельные клиенты. Смесь коротких
+# запросов (поиск пользователя, страница текстов, шифрование короткого текста)
+# с редкими крупными текстами; печатает p50/p99 по каждому виду запросов.
+# Запуск из корня репозитория: python -m bench.load_test [--clients 32] [--duration 10]
+# Сравнение с другой версией сервера:
+#   git worktree add /tmp/kursovaya_before <коммит>
+#   python -m bench.load_test --app-dir /tmp/kursovaya_before
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from bench.common import random_text, summarize, temp_workdir
+from codec import ENGLISH_ALPHABET
+
+KEY = "3 3 2 5"
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app_dir: str, port: int, env: dict):
+    server_env = dict(os.environ, PYTHONPATH=app_dir, **env)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=server_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            requests.get(url + "/", timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("Сервер не запустился")
+
+
+def client_loop(url: str, token: str, deadline: float, large_text: str, large_ratio: float, seed: int, timings: dict):
+    rng = random.Random(seed)
+    session = requests.Session()
+    small_text = random_text(200, ENGLISH_ALPHABET, seed)
+    requests_by_kind = {
+        "get_user_id": lambda: session.get(f"{url}/get_user_id/{token}"),
+        "view_page": lambda: session.get(f"{url}/view_texts/{token}", params={"limit": 20}),
+        "encrypt_small": lambda: session.post(f"{url}/cipher/encrypt/", json={"token": token, "text": small_text, "key": KEY}),
+        "encrypt_large": lambda: session.post(f"{url}/cipher/encrypt/", json={"token": token, "text": large_text, "key": KEY}),
+    }
+    small_kinds = ["get_user_id", "view_page", "encrypt_small"]
+    while time.perf_counter() < deadline:
+        kind = "encrypt_large" if rng.random() < large_ratio else rng.choice(small_kinds)
+        start = time.perf_counter()
+        response = requests_by_kind[kind]()
+        elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            raise RuntimeError(f"{kind}: {response.status_code} {response.text[:200]}")
+        timings[kind].append(elapsed)
+
+
+def run(app_dir: str, clients: int, duration: float, large_size: int, large_ratio: float, env: dict):
+    with temp_workdir():
+        process, url = start_server(app_dir, free_port(), env)
+        try:
+            token = requests.post(f"{url}/create_user", json={
+                "login": "load", "password": "LoadTest.Password1", "token": ""}).json()["token"]
+            for i in range(100):
+                requests.post(f"{url}/add_text", json={"token": token, "text": f"Text number {i}"})
+            large_text = random_text(large_size, ENGLISH_ALPHABET, seed=1)
+            timings = {kind: [] for kind in ["get_user_id", "view_page", "encrypt_small", "encrypt_large"]}
+            per_client = [{kind: [] for kind in timings} for _ in range(clients)]
+            deadline = time.perf_counter() + duration
+            threads = [threading.Thread(target=client_loop, args=(url, token, deadline, large_text, large_ratio, i, per_client[i]))
+                       for i in range(clients)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            process.terminate()
+            process.wait()
+    for client_timings in per_client:
+        for kind, values in client_timings.items():
+            timings[kind].extend(values)
+    total = sum(len(values) for values in timings.values())
+    result = {"app_dir": app_dir, "clients": clients, "duration_s": duration, "requests": total,
+              "rps": total / duration, "env": env}
+    for kind, values in timings.items():
+        if values:
+            result[kind] = summarize(values)
+            print(f"{kind}: p50={result[kind]['p50_ms']:.2f} мс, p99={result[kind]['p99_ms']:.2f} мс, "
+                  f"запросов {len(values)}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app-dir", default=REPO_DIR, help="каталог с main.py проверяемой версии")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--large-size", type=int, default=2_000_000, help="размер крупного текста в байтах")
+    parser.add_argument("--large-ratio", type=float, default=0.02, help="доля запросов с крупным текстом")
+    parser.add_argument("--cipher-workers", type=int, help="KURSOVAYA_CIPHER_WORKERS для сервера")
+    parser.add_argument("--offload-threshold", type=int, help="KURSOVAYA_CIPHER_OFFLOAD_THRESHOLD для сервера")
+    args = parser.parse_args()
+    env = {}
+    if args.cipher_workers is not None:
+        env["KURSOVAYA_CIPHER_WORKERS"] = str(args.cipher_workers)
+    if args.offload_threshold is not None:
+        env["KURSOVAYA_CIPHER_OFFLOAD_THRESHOLD"] = str(args.offload_threshold)
+    print(json.dumps(run(os.path.abspath(args.app_dir), args.clients, args.duration,
+                         args.large_size, args.large_ratio, env), indent=2))
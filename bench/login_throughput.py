@@ -0,0 +1,89 @@
+# Пропускная способность /login при разных схемах и стоимости хеширования паролей
+# и задержка коротких запросов шифрования, пока идут входы.
+# Запуск из корня репозитория:
+#   python -m bench.login_throughput [--cases hex_sha256 pbkdf2_sha256:29000 bcrypt:12] [--logins 200]
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+import main
+from bench.common import summarize, temp_workdir
+from passwords import HASH_WORKERS, PasswordHasher, make_context
+from storage import FileStorage
+
+PASSWORD = "Bench.Password1"
+
+
+async def timed(func, timings):
+    start = time.perf_counter()
+    response = await func()
+    timings.append((time.perf_counter() - start) * 1000)
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.status_code} {response.text[:200]}")
+
+
+async def run_case(scheme: str, rounds, logins: int, concurrency: int, workers: int):
+    main.passwords = PasswordHasher(make_context(scheme, rounds), workers)
+    main.storage = FileStorage('.')
+    main.storage.build()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        token = (await client.post("/create_user", json={"login": "bench", "password": PASSWORD, "token": ""})).json()["token"]
+        login_data = {"login": "bench", "password": PASSWORD, "token": ""}
+        cipher_data = {"token": token, "text": "Hello world", "key": "3 3 2 5"}
+        login_timings, cipher_timings = [], []
+        semaphore = asyncio.Semaphore(concurrency)
+        done = asyncio.Event()
+
+        async def login():
+            async with semaphore:
+                await timed(lambda: client.post("/login", json=login_data), login_timings)
+
+        async def cipher_probe():
+            # Короткие запросы шифрования раз в 10 мс, пока идут входы
+            while not done.is_set():
+                await timed(lambda: client.post("/cipher/encrypt/", json=cipher_data), cipher_timings)
+                await asyncio.sleep(0.01)
+
+        probe = asyncio.create_task(cipher_probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe
+    main.passwords.shutdown()
+    actual_rounds = rounds if main.passwords.scheme == scheme else None  # Схема была заменена запасной
+    return {"scheme": main.passwords.scheme, "rounds": actual_rounds, "logins_per_s": logins / elapsed,
+            "login": summarize(login_timings), "cipher_during_logins": summarize(cipher_timings)}
+
+
+def run(cases, logins: int, concurrency: int, workers: int):
+    results = []
+    old_passwords, old_storage = main.passwords, main.storage
+    try:
+        for case in cases:
+            scheme, _, rounds = case.partition(':')
+            with temp_workdir():
+                row = asyncio.run(run_case(scheme, int(rounds) if rounds else None, logins, concurrency, workers))
+            results.append(row)
+            print(f"{row['scheme']} {row['rounds'] or ''}: {row['logins_per_s']:.1f} входов/с, "
+                  f"вход p99={row['login']['p99_ms']:.1f} мс, "
+                  f"шифрование p99={row['cipher_during_logins']['p99_ms']:.1f} мс")
+    finally:
+        main.passwords, main.storage = old_passwords, old_storage
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", nargs="+",
+                        default=["hex_sha256", "pbkdf2_sha256:29000", "pbkdf2_sha256:290000", "bcrypt:10", "bcrypt:12"],
+                        help="схема[:стоимость]")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=HASH_WORKERS, help="размер пула хеширования")
+    args = parser.parse_args()
+    print(json.dumps(run(args.cases, args.logins, args.concurrency, args.workers), indent=2))
@@ -0,0 +1,53 @@
+# Масштабирование шифрования крупного текста по числу процессов.
+# Запуск из корня репозитория: python -m bench.process_scaling [--size 5e7] [--processes 1 2 4 8]
+import argparse
+import json
+import os
+import time
+
+from bench.common import random_key, random_text
+from codec import ENGLISH_ALPHABET
+from hill import hill_cipher_encrypt
+from parallel import get_pool, hill_cipher_parallel, shutdown
+
+
+def best_time(func, repeat: int):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(size: float, key_size: int, process_counts, repeat: int):
+    text = random_text(int(size), ENGLISH_ALPHABET)
+    key_matrix = random_key(key_size, len(ENGLISH_ALPHABET), seed=key_size)
+    seconds, expected = best_time(lambda: hill_cipher_encrypt(text, key_matrix, ENGLISH_ALPHABET), repeat)
+    results = [{"processes": 0, "seconds": seconds, "mb_s": size / seconds / 1e6}]
+    print(f"в одном потоке: {results[0]['mb_s']:.1f} МБ/с")
+    try:
+        for processes in process_counts:
+            get_pool(processes).submit(int).result()  # Запуск процессов не входит в замер
+            seconds, output = best_time(
+                lambda: hill_cipher_parallel(text, key_matrix, ENGLISH_ALPHABET, processes=processes), repeat)
+            if output != expected:
+                raise AssertionError(f"Результат для {processes} процессов отличается от hill_cipher_encrypt")
+            row = {"processes": processes, "seconds": seconds, "mb_s": size / seconds / 1e6,
+                   "speedup": results[0]["seconds"] / seconds}
+            results.append(row)
+            print(f"{processes} процессов: {row['mb_s']:.1f} МБ/с, ускорение {row['speedup']:.2f}")
+    finally:
+        shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=float, default=5e7, help="размер текста в байтах")
+    parser.add_argument("--key", type=int, default=4)
+    parser.add_argument("--processes", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.size, args.key, args.processes, args.repeat), indent=2))
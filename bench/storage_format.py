@@ -0,0 +1,74 @@
+# Место на диске и время записи/чтения текстов в обычном UTF-8, в упакованном виде
+# (шифртексты по 5 бит на символ) и со сжатием открытых текстов.
+# Запуск из корня репозитория: python -m bench.storage_format [--texts 200] [--size 100000]
+import argparse
+import json
+import time
+
+import numpy as np
+
+from bench.common import random_key, random_text, temp_workdir
+from codec import ENGLISH_ALPHABET, RUSSIAN_ALPHABET
+from hill import hill_cipher_encrypt
+from packed import TextFormat
+from storage import ENCRYPTED, PLAIN, FileStorage, SQLiteStorage
+
+FORMATS = {
+    "utf8": TextFormat(pack=False, compression=None),
+    "packed": TextFormat(pack=True, compression=None),
+    "packed+zlib": TextFormat(pack=True, compression='zlib'),
+}
+SAMPLE = ("Все счастливые семьи похожи друг на друга, каждая несчастливая семья несчастлива по-своему. "
+          "Все смешалось в доме Облонских. Жена узнала, что муж был в связи с бывшею в их доме француженкою.")
+
+
+def make_texts(count: int, size: int):
+    # Пары (kind, text): открытые тексты из слов образца, шифртексты — поровну русских и английских
+    texts = []
+    for i in range(count):
+        alphabet = RUSSIAN_ALPHABET if i % 2 else ENGLISH_ALPHABET
+        plaintext = random_text(size, alphabet, seed=i)
+        key_matrix = random_key(3, len(alphabet), seed=i)
+        texts.append((ENCRYPTED, hill_cipher_encrypt(plaintext, key_matrix, alphabet)))
+        words = SAMPLE.split()
+        rng = np.random.default_rng(i)  # Слова образца в случайном порядке: повтор образца сжался бы нечестно хорошо
+        plain = ' '.join(words[j] for j in rng.integers(0, len(words), size // 12))
+        texts.append((PLAIN, plain))
+    return texts
+
+
+def run(backends, count: int, size: int):
+    texts = make_texts(count, size)
+    results = []
+    for backend in backends:
+        for name, text_format in FORMATS.items():
+            with temp_workdir():
+                storage = FileStorage('.', text_format) if backend == 'files' else SQLiteStorage('bench.db',
+                                                                                                 text_format=text_format)
+                start = time.perf_counter()
+                ids = [(kind, storage.add_text(1, kind, text)) for kind, text in texts]
+                write_s = time.perf_counter() - start
+                start = time.perf_counter()
+                for kind, text_id in ids:
+                    storage.read_text(1, kind, text_id)
+                read_s = time.perf_counter() - start
+                row = {"backend": backend, "format": name, "texts": len(ids), "write_s": write_s, "read_s": read_s}
+                for kind in (ENCRYPTED, PLAIN):
+                    infos = [storage.text_info(1, kind, text_id) for text_kind, text_id in ids if text_kind == kind]
+                    row[f"{kind}_bytes"] = int(np.sum([info["size"] for info in infos]))
+                    row[f"{kind}_stored_bytes"] = int(np.sum([info["stored_size"] for info in infos]))
+                    row[f"{kind}_ratio"] = row[f"{kind}_bytes"] / row[f"{kind}_stored_bytes"]
+                storage.close()
+            results.append(row)
+            print(f"{backend:6} {name:12} шифртексты x{row['encrypted_ratio']:.2f}, открытые x{row['plain_ratio']:.2f}, "
+                  f"запись {write_s:.2f} с, чтение {read_s:.2f} с")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=["files", "sqlite"])
+    parser.add_argument("--texts", type=int, default=100, help="шифртекстов (и столько же открытых текстов)")
+    parser.add_argument("--size", type=int, default=100_000, help="байт открытого текста на шифртекст")
+    args = parser.parse_args()
+    print(json.dumps(run(args.backends, args.texts, args.size), indent=2))
@@ -0,0 +1,47 @@
+# Задержка операций хранилища при росте числа пользователей и текстов.
+# Запуск из корня репозитория: python -m bench.storage_scaling [--users 1000 10000] [--texts 100 1000]
+import argparse
+import json
+import random
+import secrets
+
+from bench.common import measure, summarize, temp_workdir
+from storage import PLAIN, FileStorage, SQLiteStorage
+
+
+def make_backend(name: str):
+    return FileStorage('.') if name == 'files' else SQLiteStorage('bench.db')
+
+
+def run(backends, user_counts, text_counts, repeat: int):
+    results = []
+    for backend in backends:
+        for users in user_counts:
+            for texts in text_counts:
+                with temp_workdir():
+                    storage = make_backend(backend)
+                    tokens = [storage.create_user(f"user{i}", "", secrets.token_hex(16))["token"] for i in range(users)]
+                    storage.build()
+                    user_id = storage.find_user_by_token(tokens[0])["id"]
+                    for i in range(texts):
+                        storage.add_text(user_id, PLAIN, f"text {i}")
+                    row = {
+                        "backend": backend, "users": users, "texts": texts,
+                        "token_lookup": summarize(measure(lambda: storage.find_user_by_token(random.choice(tokens)), repeat)),
+                        "last_text": summarize(measure(lambda: storage.last_text_id(user_id, PLAIN), repeat)),
+                        "add_text": summarize(measure(lambda: storage.add_text(user_id, PLAIN, "new text"), repeat)),
+                    }
+                    storage.close()
+                results.append(row)
+                print(backend, users, texts, {k: round(v["p50_ms"], 3) for k, v in row.items() if isinstance(v, dict)})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=["files", "sqlite"])
+    parser.add_argument("--users", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--texts", type=int, nargs="+", default=[100, 1_000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.backends, args.users, args.texts, args.repeat), indent=2))
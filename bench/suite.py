@@ -0,0 +1,293 @@
+# Набор бенчмарков ядра шифра и HTTP-обработчиков с сохранением результатов в JSON
+# и сравнением с прошлым прогоном: замедление медианы больше порога — код выхода 1.
+# Запуск из корня репозитория:
+#   python -m bench.suite [--quick] [--only encrypt token_search] [--output bench.json]
+#   python -m bench.suite --baseline bench.json [--threshold 0.2]
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+import main
+from bench.common import measure, random_key, random_text, seed_users, summarize, temp_workdir
+from cipher_cache import CipherCache
+from codec import ENGLISH_ALPHABET, RUSSIAN_ALPHABET, detect_language
+from hill import hill_cipher_decrypt, hill_cipher_encrypt
+from modmath import _cached_inverse, mod_inverse
+from passwords import PasswordHasher, make_context
+from storage import PLAIN, FileStorage
+
+TEXT_SIZES = (1_000, 100_000, 1_000_000)
+KEY_SIZES = (2, 4, 8)
+USER_COUNTS = (1_000, 10_000)
+QUICK_TEXT_SIZES = (1_000, 100_000)
+QUICK_KEY_SIZES = (2, 4)
+QUICK_USER_COUNTS = (1_000,)
+E2E_USERS = 1_000
+E2E_TEXTS_PER_USER = 20
+STARTUP_RUNS = 10
+QUICK_STARTUP_RUNS = 3
+STARTUP_TIMEOUT = 60.0
+THRESHOLD = 0.2  # Допустимое замедление p50 относительно базового прогона
+
+
+def repeats(size: int, quick: bool) -> int:
+    # Чем крупнее текст, тем меньше повторов: прогон укладывается в секунды
+    runs = max(5, min(200, 20_000_000 // max(size, 1) // 100))
+    return max(3, runs // 4) if quick else runs
+
+
+def micro_cases(quick: bool):
+    # (имя, функция, число повторов); имена стабильны между прогонами — по ним идёт сравнение
+    text_sizes = QUICK_TEXT_SIZES if quick else TEXT_SIZES
+    key_sizes = QUICK_KEY_SIZES if quick else KEY_SIZES
+    for alphabet, language in ((RUSSIAN_ALPHABET, "ru"), (ENGLISH_ALPHABET, "en")):
+        for size in text_sizes:
+            text = random_text(size, alphabet, seed=size)
+            yield f"detect_language/{language}/{size}", lambda text=text: detect_language(text), repeats(size, quick)
+            for n in key_sizes:
+                key_matrix = random_key(n, len(alphabet), seed=n)
+                ciphertext = hill_cipher_encrypt(text, key_matrix, alphabet)
+                yield (f"hill_cipher_encrypt/{language}/{size}/{n}x{n}",
+                       lambda text=text, key=key_matrix, alphabet=alphabet: hill_cipher_encrypt(text, key, alphabet),
+                       repeats(size, quick))
+                yield (f"hill_cipher_decrypt/{language}/{size}/{n}x{n}",
+                       lambda text=ciphertext, key=key_matrix, alphabet=alphabet: hill_cipher_decrypt(text, key, alphabet),
+                       repeats(size, quick))
+    for n in key_sizes + (16,):
+        key_matrix = random_key(n, len(RUSSIAN_ALPHABET), seed=n)
+
+        def cold_inverse(key_matrix=key_matrix):
+            _cached_inverse.cache_clear()  # Без кэша: время самого обращения матрицы
+            mod_inverse(key_matrix, len(RUSSIAN_ALPHABET))
+
+        yield f"mod_inverse/cold/{n}x{n}", cold_inverse, 50 if quick else 200
+        yield (f"mod_inverse/cached/{n}x{n}",
+               lambda key=key_matrix: mod_inverse(key, len(RUSSIAN_ALPHABET)), 200 if quick else 1000)
+
+
+def run_micro(quick: bool, only):
+    results = {}
+    for name, func, repeat in micro_cases(quick):
+        if selected(name, only):
+            func()  # Прогрев: таблицы кодеков, кэш обратных матриц
+            results[name] = summarize(measure(func, repeat))
+            report(name, results[name])
+    return results
+
+
+def run_token_search(quick: bool, only):
+    results = {}
+    old_storage = main.storage
+    try:
+        for count in QUICK_USER_COUNTS if quick else USER_COUNTS:
+            name = f"token_search/{count}"
+            if not selected(name, only):
+                continue
+            with temp_workdir():
+                tokens = seed_users(count)
+                main.storage = FileStorage('.')
+                main.storage.build()
+                rng = random.Random(count)
+                results[name] = summarize(measure(lambda: main.token_search(rng.choice(tokens)), 500 if quick else 2000))
+                main.storage.close()
+            report(name, results[name])
+    finally:
+        main.storage = old_storage
+    return results
+
+
+def seed_texts(storage, user_count: int, per_user: int, seed: int = 0):
+    # Тексты пользователей: вперемешку русские и английские, от 100 байт до 10 КБ
+    rng = random.Random(seed)
+    for user_id in range(1, user_count + 1):
+        items = []
+        for i in range(per_user):
+            alphabet = RUSSIAN_ALPHABET if rng.random() < 0.5 else ENGLISH_ALPHABET
+            items.append((PLAIN, random_text(rng.choice((100, 1_000, 10_000)), alphabet, seed=user_id * per_user + i)))
+        storage.add_texts(user_id, items)
+
+
+def run_e2e(quick: bool, only):
+    # Обработчики FastAPI в том же процессе через TestClient (ASGI без сети)
+    from fastapi.testclient import TestClient
+    e2e_cases = ("encrypt", "decrypt", "encrypt_batch", "view_texts_page", "view_text", "get_user_id", "login")
+    if not any(selected(f"e2e/{case}", only) for case in e2e_cases):
+        return {}
+    results = {}
+    old_storage, old_cache, old_passwords = main.storage, main.cipher_cache, main.passwords
+    user_count = E2E_USERS // 10 if quick else E2E_USERS
+    try:
+        with temp_workdir():
+            tokens = seed_users(user_count)
+            main.storage = FileStorage('.')
+            main.storage.build()
+            seed_texts(main.storage, user_count // 10, E2E_TEXTS_PER_USER)
+            main.cipher_cache = CipherCache(max_bytes=0)  # Иначе повторные запросы меряли бы кэш, а не шифр
+            # Небольшая стоимость хеширования: /login меряет обработчик, а не KDF
+            main.passwords = PasswordHasher(make_context("pbkdf2_sha256", 1000))
+            rng = random.Random(0)
+            key = "3 3 2 5"
+            text_ru = random_text(1_000, RUSSIAN_ALPHABET, seed=1)
+            text_en = random_text(1_000, ENGLISH_ALPHABET, seed=2)
+            with TestClient(main.app) as client:
+                password = "Bench.Password1"
+                assert client.post("/create_user", json={"login": "bench", "password": password, "token": ""}).status_code == 200
+                readers = tokens[:user_count // 10]  # У этих пользователей есть тексты
+                text_ids = main.storage.list_texts(1, PLAIN)
+                ciphertext = client.post("/cipher/encrypt/", json={"token": tokens[0], "text": text_ru, "key": key}).json()["message"]
+                batch = [{"key": key, "text": text_ru if i % 2 else text_en} for i in range(50)]
+
+                def call(method, url, **kwargs):
+                    return lambda: check(getattr(client, method)(url() if callable(url) else url, **kwargs))
+
+                cases = {
+                    "encrypt": call("post", "/cipher/encrypt/", json={"token": tokens[0], "text": text_ru, "key": key}),
+                    "decrypt": call("post", "/cipher/decrypt/", json={"token": tokens[0], "text": ciphertext, "key": key}),
+                    "encrypt_batch": call("post", "/cipher/encrypt/batch", json={"token": tokens[0], "items": batch}),
+                    "view_texts_page": call("get", lambda: f"/view_texts/{rng.choice(readers)}?limit=10&metadata_only=true"),
+                    "view_text": call("get", lambda: f"/view_texts/{tokens[0]}/{rng.choice(text_ids)}"),
+                    "get_user_id": call("get", lambda: f"/get_user_id/{rng.choice(tokens)}"),
+                    "login": call("post", "/login", json={"login": "bench", "password": password, "token": ""}),
+                }
+                for case, func in cases.items():
+                    name = f"e2e/{case}"
+                    if selected(name, only):
+                        func()
+                        results[name] = summarize(measure(func, 20 if quick else 100))
+                        report(name, results[name])
+            main.passwords.shutdown()
+            main.storage.close()
+    finally:
+        main.storage, main.cipher_cache, main.passwords = old_storage, old_cache, old_passwords
+    return results
+
+
+def wait_for(url: str, started: float) -> float:
+    # Миллисекунды от started до первого ответа 200 по url
+    deadline = started + STARTUP_TIMEOUT
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return (time.perf_counter() - started) * 1000
+        except (urllib.error.URLError, ConnectionError):
+            pass  # Ещё не слушает порт или прогревается (503)
+        time.sleep(0.005)
+    raise RuntimeError(f"{url}: сервер не ответил за {STARTUP_TIMEOUT:.0f} с")
+
+
+def run_startup(quick: bool, only):
+    # Запуск с нуля в отдельных процессах: import — python -c "import main" целиком,
+    # first_request — от запуска uvicorn до первого ответа, ready — до 200 от /ready (после прогрева)
+    cases = ("import", "first_request", "ready")
+    if not any(selected(f"startup/{case}", only) for case in cases):
+        return {}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    timings = {case: [] for case in cases}
+    for _ in range(QUICK_STARTUP_RUNS if quick else STARTUP_RUNS):
+        with temp_workdir():
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", "import main"], env=env, check=True, capture_output=True)
+            timings["import"].append((time.perf_counter() - start) * 1000)
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                port = sock.getsockname()[1]
+            start = time.perf_counter()
+            server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                                       "--log-level", "warning"], env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                timings["first_request"].append(wait_for(f"http://127.0.0.1:{port}/", start))
+                timings["ready"].append(wait_for(f"http://127.0.0.1:{port}/ready", start))
+            finally:
+                server.terminate()
+                server.wait()
+    results = {}
+    for case in cases:
+        name = f"startup/{case}"
+        if selected(name, only):
+            results[name] = summarize(timings[case])
+            report(name, results[name])
+    return results
+
+
+def check(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.request.url.path}: {response.status_code} {response.text[:200]}")
+
+
+def selected(name: str, only) -> bool:
+    return not only or any(part in name for part in only)
+
+
+def report(name: str, row: dict):
+    print(f"{name:45} p50={row['p50_ms']:10.3f} мс  p99={row['p99_ms']:10.3f} мс", file=sys.stderr)
+
+
+def environment() -> dict:
+    # Сравнивать имеет смысл прогоны на одной машине; эти поля помогают это проверить
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except OSError:
+        commit = None
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit or None, "python": platform.python_version(),
+            "numpy": np.__version__, "machine": platform.machine(), "cpus": os.cpu_count()}
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    # Список (имя, p50 было, p50 стало, отношение) для замедлившихся сверх порога случаев
+    regressions = []
+    for name, row in sorted(results.items()):
+        old = baseline.get(name)
+        if old is None:
+            continue
+        ratio = row["p50_ms"] / old["p50_ms"] if old["p50_ms"] > 0 else 1.0
+        if ratio > 1 + threshold:
+            regressions.append((name, old["p50_ms"], row["p50_ms"], ratio))
+    return regressions
+
+
+def run(quick: bool = False, only=None) -> dict:
+    results = {}
+    results.update(run_micro(quick, only))
+    results.update(run_token_search(quick, only))
+    results.update(run_e2e(quick, only))
+    results.update(run_startup(quick, only))
+    return {"environment": environment(), "quick": quick, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true", help="меньше размеров и повторов")
+    parser.add_argument("--only", nargs="+", help="только случаи, в имени которых есть одна из подстрок")
+    parser.add_argument("--output", help="куда сохранить результаты (JSON)")
+    parser.add_argument("--baseline", help="результаты прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="допустимое замедление p50, доля")
+    args = parser.parse_args()
+    run_data = run(args.quick, args.only)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(run_data, f, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(run_data, indent=2, ensure_ascii=False))
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(run_data["results"], baseline, args.threshold)
+        for name, old, new, ratio in regressions:
+            print(f"Замедление {name}: {old:.3f} -> {new:.3f} мс (x{ratio:.2f})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"Замедлений больше {args.threshold:.0%} нет", file=sys.stderr)
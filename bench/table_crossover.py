@@ -0,0 +1,74 @@
+# Табличный путь шифра Хилла против умножения матриц (hill.table_transform /
+# hill.matmul_transform) в зависимости от числа блоков: «холодная» таблица
+# строится заново для каждого прогона, «тёплая» уже есть в кэше. Точка перехода —
+# наименьшее число блоков, с которого таблица быстрее умножения.
+# Запуск из корня репозитория: python -m bench.table_crossover [--keys 2 3 4] [--repeat 5]
+import argparse
+import json
+import time
+
+import numpy as np
+
+import hill
+from bench.common import random_key
+from codec import ENGLISH_ALPHABET, RUSSIAN_ALPHABET
+
+BLOCK_COUNTS = [1 << p for p in range(4, 23, 2)]
+
+
+def best_ms(func, repeat: int, before=None) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def crossover(rows, column: str):
+    # Наименьшее число блоков, с которого таблица быстрее умножения и на всех больших
+    point = None
+    for row in reversed(rows):
+        if row[column] >= row["matmul_ms"]:
+            break
+        point = row["blocks"]
+    return point
+
+
+def run(key_sizes, repeat: int):
+    results = []
+    for alphabet in (ENGLISH_ALPHABET, RUSSIAN_ALPHABET):
+        mod = len(alphabet)
+        for n in key_sizes:
+            key_matrix = random_key(n, mod, seed=n)
+            rng = np.random.default_rng(n)
+            rows = []
+            for count in BLOCK_COUNTS:
+                blocks = rng.integers(0, mod, (count, n), dtype=np.uint8)
+                rows.append({
+                    "blocks": count,
+                    "matmul_ms": best_ms(lambda: hill.matmul_transform(blocks, key_matrix, mod), repeat),
+                    "table_cold_ms": best_ms(lambda: hill.table_transform(blocks, key_matrix, mod), repeat,
+                                             before=hill._block_table.cache_clear),
+                    "table_warm_ms": best_ms(lambda: hill.table_transform(blocks, key_matrix, mod), repeat),
+                })
+            result = {"alphabet": mod, "n": n, "entries": mod ** n, "rows": rows,
+                      "crossover_cold": crossover(rows, "table_cold_ms"),
+                      "crossover_warm": crossover(rows, "table_warm_ms")}
+            results.append(result)
+            print(f"алфавит {mod}, ключ {n}x{n}, таблица {mod ** n} блоков: таблица быстрее с "
+                  f"{result['crossover_cold']} блоков (холодная), с {result['crossover_warm']} (тёплая)")
+            for row in rows:
+                print(f"  {row['blocks']:>8} блоков: умножение {row['matmul_ms']:9.3f} мс, таблица "
+                      f"{row['table_cold_ms']:9.3f} / {row['table_warm_ms']:9.3f} мс")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, nargs="+", default=[2, 3, 4], help="размеры ключа n")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.keys, args.repeat), indent=2))
@@ -0,0 +1,66 @@
+# Пропускная способность записи текстов в режимах fsync always / batch / none
+# (durable.py) при нескольких пишущих потоках; group_commits — сколько групповых
+# фиксаций понадобилось в режиме batch.
+# Запуск из корня репозитория: python -m bench.write_durability [--threads 1 8] [--writes 500] [--size 4096]
+import argparse
+import json
+import threading
+import time
+
+from bench.common import random_text, summarize, temp_workdir
+from codec import RUSSIAN_ALPHABET
+from durable import DURABILITY_MODES
+from storage import PLAIN, FileStorage, SQLiteStorage
+
+
+def make_backend(name: str, durability: str):
+    return FileStorage('.', durability=durability) if name == 'files' else SQLiteStorage('bench.db',
+                                                                                         durability=durability)
+
+
+def run(backends, modes, thread_counts, writes: int, size: int):
+    text = random_text(size, RUSSIAN_ALPHABET)
+    results = []
+    for backend in backends:
+        for mode in modes:
+            for threads in thread_counts:
+                with temp_workdir():
+                    storage = make_backend(backend, mode)
+                    user_ids = [storage.create_user(f"user{i}", "", f"token{i}")["id"] for i in range(threads)]
+                    timings = [[] for _ in range(threads)]
+
+                    def writer(i):
+                        # У каждого потока свой пользователь: папки и индексы не общие
+                        for _ in range(writes // threads):
+                            start = time.perf_counter()
+                            storage.add_text(user_ids[i], PLAIN, text)
+                            timings[i].append((time.perf_counter() - start) * 1000)
+
+                    start = time.perf_counter()
+                    pool = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+                    for thread in pool:
+                        thread.start()
+                    for thread in pool:
+                        thread.join()
+                    storage.close()
+                    elapsed = time.perf_counter() - start
+                    done = sum(len(t) for t in timings)
+                    row = {"backend": backend, "mode": mode, "threads": threads, "writes": done,
+                           "writes_per_s": done / elapsed, "latency": summarize([ms for t in timings for ms in t])}
+                    if backend == 'files':
+                        row["group_commits"] = storage.writer.commits
+                results.append(row)
+                print(f"{backend:6} {mode:6} потоков {threads:2}: {row['writes_per_s']:8.0f} записей/с, "
+                      f"p50 {row['latency']['p50_ms']:.3f} мс, p99 {row['latency']['p99_ms']:.3f} мс")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=["files", "sqlite"])
+    parser.add_argument("--modes", nargs="+", default=list(DURABILITY_MODES))
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--writes", type=int, default=500, help="записей на прогон (делятся между потоками)")
+    parser.add_argument("--size", type=int, default=4096, help="байт на текст")
+    args = parser.parse_args()
+    print(json.dumps(run(args.backends, args.modes, args.threads, args.writes, args.size), indent=2))
@@ -0,0 +1,144 @@
+import io
+import json
+import tarfile
+import time
+import zipfile
+
+from storage import PLAIN, KINDS
+
+NDJSON = 'ndjson'
+TAR = 'tar'
+ZIP = 'zip'
+FORMATS = (NDJSON, TAR, ZIP)
+# Ошибки разбора тела импорта: ответ 400, импорт откатывается целиком
+IMPORT_ERRORS = (ValueError, tarfile.TarError, zipfile.BadZipFile)
+MEDIA_TYPES = {NDJSON: "application/x-ndjson", TAR: "application/x-tar", ZIP: "application/zip"}
+
+
+def detect_format(f) -> str:
+    # По первым байтам: zip — "PK\x03\x04", gzip (tar.gz) — "\x1f\x8b", tar — "ustar" на смещении 257
+    head = f.read(512)
+    f.seek(0)
+    if head.startswith(b'PK\x03\x04'):
+        return ZIP
+    if head.startswith(b'\x1f\x8b') or head[257:262] == b'ustar':
+        return TAR
+    return NDJSON
+
+
+def _decode(data: bytes, name: str) -> str:
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        raise ValueError(f"{name}: текст должен быть в UTF-8") from None
+
+
+def iter_ndjson(f):
+    # Строка — объект JSON с полем "text" (или "body", как в requests.jsonl)
+    # и необязательным "kind", либо просто строка JSON. Пустые строки пропускаются
+    for number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Строка {number}: неверный JSON") from None
+        if isinstance(item, str):
+            yield PLAIN, item
+            continue
+        if not isinstance(item, dict):
+            raise ValueError(f"Строка {number}: ожидается объект или строка")
+        text = item.get("text", item.get("body"))
+        kind = item.get("kind", PLAIN)
+        if not isinstance(text, str):
+            raise ValueError(f"Строка {number}: нет поля \"text\" или \"body\"")
+        if kind not in KINDS:
+            raise ValueError(f"Строка {number}: kind должен быть одним из {', '.join(KINDS)}")
+        yield kind, text
+
+
+def _member_kind(name: str) -> str:
+    # encrypted/<файл> — шифртекст (так устроен экспорт), всё остальное — обычный текст
+    top, sep, _ = name.partition('/')
+    return top if sep and top in KINDS else PLAIN
+
+
+def iter_tar(f):
+    with tarfile.open(fileobj=f, mode='r:*') as archive:
+        for member in archive:
+            if member.isfile():
+                yield _member_kind(member.name), _decode(archive.extractfile(member).read(), member.name)
+
+
+def iter_zip(f):
+    with zipfile.ZipFile(f) as archive:
+        for info in archive.infolist():
+            if not info.is_dir():
+                yield _member_kind(info.filename), _decode(archive.read(info), info.filename)
+
+
+def iter_import(f, fmt: str = None):
+    # f — двоичный файл с телом запроса; тексты читаются по одному
+    fmt = fmt or detect_format(f)
+    if fmt == NDJSON:
+        return iter_ndjson(io.TextIOWrapper(f, encoding='utf-8'))
+    if fmt == TAR:
+        return iter_tar(f)
+    if fmt == ZIP:
+        return iter_zip(f)
+    raise ValueError(f"Формат должен быть одним из {', '.join(FORMATS)}")
+
+
+def _iter_stored(storage, user_id: int, kinds):
+    for kind in kinds:
+        for text_id in storage.list_texts(user_id, kind):
+            data = b''.join(storage.iter_text_chunks(user_id, kind, text_id))
+            yield kind, text_id, data
+
+
+class _ChunkBuffer(io.RawIOBase):
+    # Приёмник для tarfile/zipfile: накопленные байты забираются генератором экспорта
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def export_ndjson(storage, user_id: int, kinds=KINDS):
+    for kind, text_id, data in _iter_stored(storage, user_id, kinds):
+        line = {"kind": kind, "id": text_id, "text": _decode(data, text_id)}
+        yield (json.dumps(line, ensure_ascii=False) + "\n").encode('utf-8')
+
+
+def export_tar(storage, user_id: int, kinds=KINDS):
+    buffer = _ChunkBuffer()
+    with tarfile.open(fileobj=buffer, mode='w|') as archive:
+        for kind, text_id, data in _iter_stored(storage, user_id, kinds):
+            info = tarfile.TarInfo(f"{kind}/{text_id}")
+            info.size = len(data)
+            info.mtime = int(time.time())
+            archive.addfile(info, io.BytesIO(data))
+            yield buffer.take()
+    yield buffer.take()
+
+
+def export_zip(storage, user_id: int, kinds=KINDS):
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for kind, text_id, data in _iter_stored(storage, user_id, kinds):
+            archive.writestr(f"{kind}/{text_id}", data)
+            yield buffer.take()
+    yield buffer.take()
+
+
+EXPORTERS = {NDJSON: export_ndjson, TAR: export_tar, ZIP: export_zip}
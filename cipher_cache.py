@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from lazy import LazyModule
+
+np = LazyModule("numpy")  # Нужен только для ключа в cipher_digest: кэш создаётся при импорте main
+
+# Объём шифртекстов в памяти (байт UTF-8); 0 — кэш выключен
+CACHE_BYTES = int(os.environ.get("KURSOVAYA_CIPHER_CACHE_BYTES", str(64 << 20)))
+# Необязательный дисковый уровень: каталог и его предельный объём
+CACHE_DIR = os.environ.get("KURSOVAYA_CIPHER_CACHE_DIR")
+CACHE_DISK_BYTES = int(os.environ.get("KURSOVAYA_CIPHER_CACHE_DISK_BYTES", str(1 << 30)))
+MAX_FILE_ENTRIES = 100_000  # Сколько пар (пользователь, digest) -> файл помнить
+
+
+def cipher_digest(text, key_matrix, alphabet: str) -> str:
+    # Ключ кэша: алфавит, ключ по модулю размера алфавита (ключи "3 3 2 5" и
+    # "35 3 2 5" для 32 букв шифруют одинаково) и открытый текст — строка или
+    # его байты UTF-8 (bytes, mmap): дайджест у них один
+    key = np.ascontiguousarray(key_matrix, dtype=np.int64) % len(alphabet)
+    h = hashlib.blake2b(digest_size=32)
+    h.update(alphabet.encode('utf-8'))
+    h.update(key.shape[0].to_bytes(2, 'little'))
+    h.update(key.tobytes())
+    h.update(text.encode('utf-8') if isinstance(text, str) else text)
+    return h.hexdigest()
+
+
+class CipherCache:
+    # LRU шифртекстов по digest с ограничением по байтам; вытесненные из памяти
+    # записи остаются на диске (если задан disk_dir). Отдельно помнится, в каком
+    # файле пользователя уже лежит шифртекст, чтобы не записывать его повторно
+
+    def __init__(self, max_bytes: int = CACHE_BYTES, disk_dir: str = CACHE_DIR, disk_bytes: int = CACHE_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+        self._entries = OrderedDict()  # digest -> шифртекст
+        self._sizes = {}
+        self._bytes = 0
+        self._files = OrderedDict()  # (user_id, digest) -> text_id
+        self._disk_used = None
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.disk_hits = 0
+        self.bytes_saved = 0  # Шифртекст, который не пришлось вычислять
+        self.files_reused = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or self.disk_dir is not None
+
+    def get(self, digest: str):
+        with self._lock:
+            text = self._entries.get(digest)
+            if text is not None:
+                self._entries.move_to_end(digest)
+                self._hit(self._sizes[digest])
+                return text
+        text = self._disk_get(digest)
+        with self._lock:
+            if text is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._hit(len(text.encode('utf-8')))
+            self._memory_put(digest, text)
+        return text
+
+    def _hit(self, size: int):
+        self.hits += 1
+        self.bytes_saved += size
+
+    def put(self, digest: str, text: str):
+        with self._lock:
+            self._memory_put(digest, text)
+        self._disk_put(digest, text)
+
+    def _memory_put(self, digest: str, text: str):
+        size = len(text.encode('utf-8'))
+        if size > self.max_bytes or digest in self._entries:
+            return
+        self._entries[digest] = text
+        self._sizes[digest] = size
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            old_digest, _ = self._entries.popitem(last=False)
+            self._bytes -= self._sizes.pop(old_digest)
+
+    def file_for(self, user_id: int, digest: str):
+        with self._lock:
+            text_id = self._files.get((user_id, digest))
+            if text_id is not None:
+                self._files.move_to_end((user_id, digest))
+            return text_id
+
+    def remember_file(self, user_id: int, digest: str, text_id: str):
+        with self._lock:
+            self._files[(user_id, digest)] = text_id
+            self._files.move_to_end((user_id, digest))
+            while len(self._files) > MAX_FILE_ENTRIES:
+                self._files.popitem(last=False)
+
+    def forget_file(self, user_id: int, digest: str):
+        with self._lock:
+            self._files.pop((user_id, digest), None)
+
+    def file_reused(self):
+        with self._lock:
+            self.files_reused += 1
+
+    def _disk_path(self, digest: str) -> str:
+        return os.path.join(self.disk_dir, digest[:2], digest)
+
+    def _disk_get(self, digest: str):
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(digest)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            os.utime(path)  # mtime — время последнего обращения, по нему идёт вытеснение
+            return text
+        except FileNotFoundError:
+            return None
+
+    def _disk_put(self, digest: str, text: str):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(digest)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+            with self._lock:
+                if self._disk_used is None:
+                    self._disk_used = sum(size for _, size, _ in self._disk_files())
+                else:
+                    self._disk_used += os.path.getsize(path)
+                if self._disk_used > self.disk_bytes:
+                    self._disk_evict()
+        except OSError as e:
+            logging.warning(f"Не удалось записать шифртекст в дисковый кэш: {e}")
+
+    def _disk_files(self):
+        for folder in os.listdir(self.disk_dir):
+            folder_path = os.path.join(self.disk_dir, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            for name in os.listdir(folder_path):
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(folder_path, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield st.st_mtime_ns, st.st_size, path
+
+    def _disk_evict(self):
+        # Самые давно использованные файлы удаляются, пока не останется 90% лимита
+        files = sorted(self._disk_files())
+        self._disk_used = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if self._disk_used <= self.disk_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._disk_used -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "disk_hits": self.disk_hits,
+                    "hit_ratio": self.hits / lookups if lookups else 0.0,
+                    "bytes_saved": self.bytes_saved, "files_reused": self.files_reused,
+                    "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "disk_dir": self.disk_dir}
@@ -1,9 +1,39 @@
 import os
+import argparse
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Union
 from pydantic import BaseModel
 
 user_token = None
+PAGE_SIZE = 20
+BATCH_SIZE = 1000  # Текстов в одном пакетном запросе: не больше MAX_BATCH_ITEMS сервера
+BASE_URL = os.environ.get("KURSOVAYA_URL", "http://127.0.0.1:8000")
+TIMEOUT = (5, 60)  # Секунды на подключение и на ответ
+STREAM_TIMEOUT = (5, None)  # Потоковое шифрование может идти долго
+RETRIES = 3
+JOB_THRESHOLD = 1 << 20  # С какого размера текста (байт) шифровать фоновой задачей, а не одним запросом
+JOB_POLL_INTERVAL = 0.5  # Как часто спрашивать сервер о состоянии фоновой задачи, с
+
+def make_session(retries: int = RETRIES, pool_size: int = 10):
+    # Одна сессия на всё приложение: соединение с сервером переиспользуется (keep-alive).
+    # Повторяются только ошибки подключения и GET-запросы: повторный POST мог бы,
+    # например, добавить текст дважды
+    retry = Retry(total=retries, connect=retries, read=retries, status=retries, backoff_factor=0.3,
+                  status_forcelist=(502, 503, 504), allowed_methods=frozenset({"GET"}))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    new_session = requests.Session()
+    new_session.mount("http://", adapter)
+    new_session.mount("https://", adapter)
+    return new_session
+
+session = make_session()
+
+def api_url(path: str) -> str:
+    return BASE_URL.rstrip("/") + path
+
 class User(BaseModel):
     login: str
     password: str
@@ -15,32 +45,19 @@ class TextRequest(BaseModel):
     text: str
 
 def send_post(url, data):
-    response = requests.post(url, json=data)
+    response = session.post(url, json=data, timeout=TIMEOUT)
     if response.status_code == 200:
         return response.json()
     else:
         return {"error": "Ошибка на сервере", "status_code": response.status_code}
 
 def send_get(url, data):
-    response = requests.get(url, params=data)
+    response = session.get(url, params=data, timeout=TIMEOUT)
     if response.status_code == 200:
         return response.json()
     else:
         return {"error": "Request failed", "status_code": response.status_code}
 
-def get_user_id_from_token(token: str):
-    try:
-        response = requests.get(f'http://127.0.0.1:8000/get_user_id/{token}')
-        if response.status_code == 200:
-            user_data = response.json()
-            return user_data.get("user_id")
-        else:
-            print("Ошибка при получении user_id: ", response.json())
-            return None
-    except requests.exceptions.RequestException as e:
-        print(f"Ошибка запроса: {e}")
-        return None
-
 def registration():
     global user_token
     login = input("Введите логин: ")
@@ -49,7 +66,7 @@ def registration():
         print("Пароль должен содержать не менее 10 символов.")
         return False
     user_data = User(login=login, password=password, token='token')
-    response = requests.post("http://127.0.0.1:8000/create_user", json=user_data.model_dump())
+    response = session.post(api_url("/create_user"), json=user_data.model_dump(), timeout=TIMEOUT)
     if response.status_code == 200:
         response_data = response.json()
         user_token = response_data["token"]
@@ -63,7 +80,7 @@ def auth():
     login = input("Введите логин: ")
     password = input("Введите пароль: ")
     user_data = User(login=login, password=password, token='').model_dump()
-    response = send_post('http://127.0.0.1:8000/login', data=user_data)
+    response = send_post(api_url('/login'), data=user_data)
     if "token" in response:
         user_token = response["token"]
         return True
@@ -76,27 +93,38 @@ def add_text():
     text = input("Введите текст, который хотите добавить: ")
     text_data = TextRequest(text=text, token=user_token)
     text_data_dict = text_data.model_dump()  # Получаем словарь
-    response = send_post('http://127.0.0.1:8000/add_text', data=text_data_dict)
+    response = send_post(api_url('/add_text'), data=text_data_dict)
     if response.get("error"):
         print("Ошибка: ", response.get("error"))
         return False
     print(response["message"])
 
+def iter_pages(url, params):
+    # Страницы списка текстов по курсору "next"; следующая запрашивается только по требованию
+    params = dict(params, limit=PAGE_SIZE)
+    while True:
+        response = session.get(url, params=params, timeout=TIMEOUT)
+        if response.status_code != 200:
+            print("Ошибка: ", response.json())
+            return
+        page = response.json()
+        yield page["texts"]
+        if not page.get("next"):
+            return
+        params["after"] = page["next"]
+
 def view_all_texts():
     global user_token
-    data = {
-        "token": user_token
-    }
-    response = requests.get(f'http://127.0.0.1:8000/view_texts/{user_token}')  # Отправляем запрос на сервер
-    if response.status_code != 200:
-        print("Ошибка: ", response.json())  # Для отладки
-        return False
-    texts = response.json().get("texts", [])
-    if texts:
-        print("Все тексты пользователя:")
+    shown = 0
+    for texts in iter_pages(api_url(f'/view_texts/{user_token}'), {}):
+        if shown == 0:
+            print("Все тексты пользователя:")
         for item in texts:
-            print(f"{item['index']}. Текст: {item['text']}")
-    else:
+            shown += 1
+            print(f"{shown}. Текст: {item['text']}")
+        if len(texts) == PAGE_SIZE and input("Показать ещё? (д/н): ").strip().lower() != "д":
+            break
+    if shown == 0:
         print("Нет текстов для отображения.")
 
 def edit_last_text():
@@ -106,7 +134,7 @@ def edit_last_text():
         "token": user_token,
         "new_text": new_text
     }
-    response = send_post('http://127.0.0.1:8000/edit_last_text', data=data)
+    response = send_post(api_url('/edit_last_text'), data=data)
     if response.get("error"):
         print("Ошибка: ", response.get("error"))
         return False
@@ -117,109 +145,252 @@ def delete_last_text():
     data = {
         "token": user_token
     }
-    response = send_post('http://127.0.0.1:8000/delete_last_text/', data=data)
+    response = send_post(api_url('/delete_last_text'), data=data)
     if response.get("error"):
         print("Ошибка: ", response.get("error"))
         return False
     print(response["message"])
 
+def process_all_texts(url, text_files, key, label):
+    # Все тексты пользователя пакетами по BATCH_SIZE: сервер читает их по имени файла.
+    # Результаты печатаются после каждого пакета: ошибка в следующем их не теряет
+    for start in range(0, len(text_files), BATCH_SIZE):
+        batch = text_files[start:start + BATCH_SIZE]
+        data = {
+            "token": user_token,
+            "items": [{"text_id": file, "key": key} for file in batch]
+        }
+        response = send_post(url, data=data)
+        if response.get("error"):
+            print(f"Ошибка в текстах {start + 1}-{start + len(batch)} из {len(text_files)}: ", response.get("error"))
+            return False
+        for file, result in zip(batch, response["results"]):
+            if "error" in result:
+                print(f"{file}: ошибка: {result['error']}")
+            else:
+                print(f"{file}: {label}: {result['message']}")
+    return True
+
+def list_texts(url, params):
+    # Сведения о сохранённых текстах ({"id", "size", ...}) со всех страниц, без содержимого
+    return [item for texts in iter_pages(url, dict(params, metadata_only=True)) for item in texts]
+
 def encrypt():
-    global user_token
-    user_id = get_user_id_from_token(user_token)
-    user_folder = os.path.join('user_text', str(user_id))
-    if not os.path.exists(user_folder) or not os.listdir(user_folder):
+    # Тексты выбираются из списка на сервере и передаются по имени: сервер читает файл сам
+    texts = list_texts(api_url(f'/view_texts/{user_token}'), {})
+    text_files = [item["id"] for item in texts]
+    if not text_files:
         print("Нет доступных текстов для шифрования.")
         return False
-    text_files = os.listdir(user_folder)
     print(f"Доступные тексты: {text_files}")
     for idx, file in enumerate(text_files):
         print(f"{idx + 1}. {file}")
     try:
-        file_choice = int(input("Введите номер текста для шифрования: "))
-        if file_choice < 1 or file_choice > len(text_files):
+        file_choice = int(input("Введите номер текста для шифрования (0 — зашифровать все тексты): "))
+        if file_choice < 0 or file_choice > len(text_files):
             print("Неверный выбор.")
             return False
     except ValueError:
         print("Ошибка: Введите число.")
         return False
+    if file_choice == 0:
+        key = input("Введите ключ для шифрования (например '2 3 4 5'): ")
+        return process_all_texts(api_url('/cipher/encrypt/batch'), text_files, key, "Зашифрованный текст")
     selected_file = text_files[file_choice - 1]
-    with open(os.path.join(user_folder, selected_file), 'r', encoding='utf-8') as f:
-        text_to_encrypt = f.read()
     key = input("Введите ключ для шифрования (например '2 3 4 5'): ")
+    if texts[file_choice - 1]["size"] < JOB_THRESHOLD:
+        response = send_post(api_url('/cipher/encrypt/'), data={"token": user_token, "text_id": selected_file, "key": key})
+        if response.get("error"):
+            print("Ошибка: ", response.get("error"))
+            return False
+        print(f"Зашифрованный текст сохранён: {response['file']} ({response['size']} байт)")
+        return True
+    # Длинный текст шифруется фоновой задачей: клиент не держит открытым один долгий запрос
     data = {
         "token": user_token,
-        "text": text_to_encrypt,
+        "type": "encrypt",
+        "text_id": selected_file,
         "key": key
     }
-    response = send_post('http://127.0.0.1:8000/cipher/encrypt/', data=data)
+    status = run_job(data)
+    if status is None:
+        return False
+    print(f"Зашифрованный текст сохранён: {status['result']['file']} ({status['result']['size']} байт)")
+    return True
+
+def wait_job(job_id: str):
+    # Опрос задачи до завершения с выводом прогресса; Ctrl+C отменяет задачу на сервере.
+    # Возвращает итоговое состояние задачи
+    try:
+        while True:
+            status = send_get(api_url(f'/jobs/{job_id}'), {"token": user_token})
+            if status.get("error"):
+                return status
+            if status["state"] in ("done", "failed", "cancelled"):
+                print()
+                return status
+            print(f"\rЗадача {job_id}: {status['state']}, {status['progress']:.0%}", end="", flush=True)
+            time.sleep(JOB_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        session.post(api_url(f'/jobs/{job_id}/cancel'), params={"token": user_token}, timeout=TIMEOUT)
+        print("\nЗадача отменена.")
+        return {"state": "cancelled"}
+
+def run_job(data):
+    # Постановка задачи шифрования / дешифрования и ожидание; итоговое состояние или None при ошибке
+    response = send_post(api_url('/jobs'), data=data)
     if response.get("error"):
         print("Ошибка: ", response.get("error"))
+        return None
+    status = wait_job(response["job_id"])
+    if status.get("state") != "done":
+        if status.get("state") != "cancelled":
+            print("Ошибка: ", status.get("error"))
+        return None
+    return status
+
+def read_file_chunks(path, chunk_size=1 << 20):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+def encrypt_file():
+    # Потоковое шифрование локального файла: файл отправляется кусками,
+    # шифртекст сохраняется на сервере и записывается в <файл>.enc
+    global user_token
+    path = input("Введите путь к файлу: ")
+    if not os.path.isfile(path):
+        print("Файл не найден.")
         return False
-    print("Зашифрованный текст: ", response["message"])
+    key = input("Введите ключ для шифрования (например '2 3 4 5'): ")
+    params = {"token": user_token, "key": key}
+    with session.post(api_url('/cipher/encrypt/stream'), params=params,
+                      data=read_file_chunks(path), stream=True, timeout=STREAM_TIMEOUT) as response:
+        if response.status_code != 200:
+            print("Ошибка: ", response.json())
+            return False
+        output_path = path + ".enc"
+        with open(output_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+    print(f"Зашифрованный текст сохранён в {output_path} и на сервере ({response.headers.get('X-Encrypted-File')})")
+    return True
+
+def import_texts():
+    # Файл NDJSON (строки с полем "text" или "body", например requests.jsonl), tar или zip;
+    # формат сервер определяет сам, все тексты добавляются одной транзакцией.
+    # Файл только загружается, разбирается он фоновой задачей
+    path = input("Введите путь к файлу для импорта: ")
+    if not os.path.isfile(path):
+        print("Файл не найден.")
+        return False
+    response = session.post(api_url('/jobs/import'), params={"token": user_token},
+                            data=read_file_chunks(path), timeout=STREAM_TIMEOUT)
+    if response.status_code != 200:
+        print("Ошибка: ", response.json())
+        return False
+    status = wait_job(response.json()["job_id"])
+    if status.get("state") != "done":
+        if status.get("state") != "cancelled":
+            print("Ошибка: ", status.get("error"))
+        return False
+    print(status["result"]["message"])
+    return True
+
+def export_texts():
+    # Формат по расширению: .zip, .tar, иначе NDJSON
+    path = input("Введите путь к файлу для экспорта (.ndjson, .tar или .zip): ")
+    extension = os.path.splitext(path)[1].lower()
+    export_format = {".zip": "zip", ".tar": "tar"}.get(extension, "ndjson")
+    with session.get(api_url(f'/export/{user_token}'), params={"format": export_format},
+                     stream=True, timeout=STREAM_TIMEOUT) as response:
+        if response.status_code != 200:
+            print("Ошибка: ", response.json())
+            return False
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+    print(f"Тексты сохранены в {path}")
+    return True
 
 def view_encrypted_texts():
-    user_id = get_user_id_from_token(user_token)
-    user_folder = os.path.join('encrypted_text', str(user_id))
-    if not os.path.exists(user_folder) or not os.listdir(user_folder):
+    # Список приходит постранично без содержимого, выбранный текст запрашивается отдельно
+    encrypted_files = []
+    for texts in iter_pages(api_url('/view_encrypted_texts/'), {"token": user_token, "metadata_only": True}):
+        if not encrypted_files:
+            print("Доступные зашифрованные тексты:")
+        for item in texts:
+            encrypted_files.append(item["id"])
+            print(f"{len(encrypted_files)}. {item['id']} ({item['size']} байт)")
+        if len(texts) == PAGE_SIZE and input("Показать ещё? (д/н): ").strip().lower() != "д":
+            break
+    if not encrypted_files:
         print("Нет доступных зашифрованных текстов.")
         return False
-    encrypted_texts = []
-    for file_name in os.listdir(user_folder):
-        file_path = os.path.join(user_folder, file_name)
-        if os.path.isfile(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                encrypted_texts.append({
-                    'file': file_name,
-                    'text': f.read()
-                })
-    print("Доступные зашифрованные тексты:")
-    for idx, encrypted_text in enumerate(encrypted_texts):
-        print(f"{idx + 1}. {encrypted_text['file']}")
     try:
         text_choice = int(input("Введите номер текста для просмотра: "))
-        if text_choice < 1 or text_choice > len(encrypted_texts):
+        if text_choice < 1 or text_choice > len(encrypted_files):
             print("Неверный выбор.")
             return False
     except ValueError:
         print("Ошибка: Введите число.")
         return False
-    selected_text = encrypted_texts[text_choice - 1]
-    print(f"Текст из файла {selected_text['file']}:")
-    print(selected_text['text'])
+    selected_file = encrypted_files[text_choice - 1]
+    response = send_get(api_url(f'/view_encrypted_texts/{selected_file}'), {"token": user_token})
+    if response.get("error"):
+        print("Ошибка: ", response.get("error"))
+        return False
+    print(f"Текст из файла {selected_file}:")
+    print(response['text'])
 
 def decrypt():
-    global user_token
-    user_id = get_user_id_from_token(user_token)
-    user_folder = os.path.join('encrypted_text', str(user_id))
-    if not os.path.exists(user_folder) or not os.listdir(user_folder):
+    texts = list_texts(api_url('/view_encrypted_texts/'), {"token": user_token})
+    encrypted_files = [item["id"] for item in texts]
+    if not encrypted_files:
         print("Нет доступных зашифрованных текстов.")
         return False
-    encrypted_files = os.listdir(user_folder)
     print("Доступные зашифрованные тексты:")
     for idx, file in enumerate(encrypted_files):
         print(f"{idx + 1}. {file}")
     try:
-        file_choice = int(input("Введите номер текста для дешифрования: "))
-        if file_choice < 1 or file_choice > len(encrypted_files):
+        file_choice = int(input("Введите номер текста для дешифрования (0 — дешифровать все тексты): "))
+        if file_choice < 0 or file_choice > len(encrypted_files):
             print("Неверный выбор.")
             return False
     except ValueError:
         print("Ошибка: Введите число.")
         return False
+    if file_choice == 0:
+        key = input("Введите ключ для дешифрования: ")
+        return process_all_texts(api_url('/cipher/decrypt/batch'), encrypted_files, key, "Дешифрованный текст")
     selected_file = encrypted_files[file_choice - 1]
-    with open(os.path.join(user_folder, selected_file), 'r', encoding='utf-8') as f:
-        encrypted_text = f.read()
     key = input("Введите ключ для дешифрования: ")
+    if texts[file_choice - 1]["size"] < JOB_THRESHOLD:
+        response = send_post(api_url('/cipher/decrypt/'), data={"token": user_token, "text_id": selected_file, "key": key})
+        if response.get("error"):
+            print("Ошибка: ", response.get("error"))
+            return False
+        print("Дешифрованный текст: ", response["message"])
+        return True
     data = {
         "token": user_token,
-        "text": encrypted_text,
+        "type": "decrypt",
+        "text_id": selected_file,
         "key": key
     }
-    response = send_post('http://127.0.0.1:8000/cipher/decrypt/', data=data)
-    if response.get("error"):
-        print("Ошибка: ", response.get("error"))
+    status = run_job(data)
+    if status is None:
+        return False
+    response = session.get(api_url(f'/jobs/{status["job_id"]}/result'), params={"token": user_token},
+                           timeout=STREAM_TIMEOUT)
+    if response.status_code != 200:
+        print("Ошибка: ", response.json())
         return False
-    print("Дешифрованный текст: ", response["message"])
+    print("Дешифрованный текст: ", response.content.decode('utf-8'))
+    return True
 
 
 def main_menu():
@@ -260,9 +431,12 @@ def main_menu():
             print("5. Зашифровать добавленный текст")
             print("6. Дешифровать текст")
             print("7. Просмотреть зашифрованные тексты")
-            print("8. Выход")
+            print("8. Зашифровать локальный файл (потоком)")
+            print("9. Импортировать тексты из файла")
+            print("10. Экспортировать тексты в файл")
+            print("11. Выход")
 
-            choice = input("Выберите опцию (1-7): ")
+            choice = input("Выберите опцию (1-11): ")
 
             if choice == "1":
                 add_text()
@@ -279,10 +453,19 @@ def main_menu():
             elif choice == "7":
                 view_encrypted_texts()
             elif choice == "8":
+                encrypt_file()
+            elif choice == "9":
+                import_texts()
+            elif choice == "10":
+                export_texts()
+            elif choice == "11":
                 print("Выход из программы.")
                 break
             else:
                 print("Неверный выбор. Попробуйте снова.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=BASE_URL, help="адрес сервера (или переменная KURSOVAYA_URL)")
+    BASE_URL = parser.parse_args().url
     main_menu()
\ No newline at end of file
@@ -0,0 +1,200 @@
+import codecs
+import os
+
+import numpy as np
+
+ENGLISH_ALPHABET = 'AaBbCcDdEeFfGHIJKLMNOPQRSTUVWXYZ'
+RUSSIAN_ALPHABET = 'АБВГДЕЖЗИЙКЛМНОПРСТУФХЦЧШЩЫЬЭЮЯ'
+ENGLISH_ALPHABET_SIZE = len(ENGLISH_ALPHABET)
+RUSSIAN_ALPHABET_SIZE = len(RUSSIAN_ALPHABET)
+
+# Таблицы строятся для кодовых точек до кириллицы включительно;
+# всё, что выше, символом алфавита не считается
+TABLE_SIZE = 0x460
+# Длинный текст: язык определяется по DETECT_WINDOWS отрезкам общей длиной
+# DETECT_SAMPLE символов, взятым равномерно по тексту. Если букв в выборке мало
+# или перевес одного алфавита меньше DETECT_CONFIDENCE, считается весь текст
+DETECT_SAMPLE = int(os.environ.get("KURSOVAYA_DETECT_SAMPLE", str(1 << 18)))
+DETECT_WINDOWS = 16
+DETECT_CONFIDENCE = 0.2
+DETECT_MIN_LETTERS = 1000
+# Байт UTF-8 на один шаг декодирования текста из файла: кусок помещается в кэш процессора,
+# поэтому по кускам выходит быстрее, чем одной строкой
+UTF8_CHUNK = 1 << 20
+
+
+def text_to_codepoints(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+
+def clamp_codepoints(codepoints: np.ndarray) -> np.ndarray:
+    # Номера строк таблиц: всё выше TABLE_SIZE — в последнюю строку (-1 / 0)
+    return np.minimum(codepoints, TABLE_SIZE, out=np.empty(len(codepoints), dtype=np.uint16), casting='unsafe')
+
+
+class AlphabetCodec:
+    # Перевод текста в индексы алфавита и обратно через заранее
+    # построенные таблицы вместо alphabet.index() для каждого символа
+
+    def __init__(self, alphabet: str, pad_char: str):
+        self.alphabet = alphabet
+        self.size = len(alphabet)
+        self.pad_index = alphabet.index(pad_char)
+        # upper_table повторяет прежнее поведение text.upper() + alphabet.index();
+        # exact_table сохраняет регистр символов самого алфавита (a-f в английском),
+        # иначе шифртекст нельзя разобрать обратно
+        self.upper_table = np.full(TABLE_SIZE + 1, -1, dtype=np.int16)
+        self.exact_table = np.full(TABLE_SIZE + 1, -1, dtype=np.int16)
+        for cp in range(TABLE_SIZE):
+            upper = chr(cp).upper()
+            if len(upper) == 1 and upper in alphabet:
+                self.upper_table[cp] = alphabet.index(upper)
+                self.exact_table[cp] = alphabet.index(upper)
+        for index, char in enumerate(alphabet):
+            self.exact_table[ord(char)] = index
+        if max(map(ord, alphabet)) < 128:
+            self._encoding, symbol_dtype = 'ascii', np.uint8
+        else:
+            self._encoding, symbol_dtype = 'utf-16-le', np.uint16
+        self.symbols = np.array([ord(char) for char in alphabet], dtype=symbol_dtype)
+        # Символы в UTF-8 одной длины (1 байт у английского, 2 у русского): строка таблицы на символ
+        self.utf8_symbols = np.array([list(char.encode('utf-8')) for char in alphabet], dtype=np.uint8)
+
+    def lookup(self, codepoints: np.ndarray, keep_case: bool = False) -> np.ndarray:
+        table = self.exact_table if keep_case else self.upper_table
+        return table[clamp_codepoints(codepoints)]
+
+    def encode(self, text, keep_case: bool = False) -> np.ndarray:
+        # text — строка или уже готовые индексы алфавита (uint8, см. scan_text)
+        if isinstance(text, np.ndarray):
+            return text
+        return self.encode_clamped(clamp_codepoints(text_to_codepoints(text)), keep_case)
+
+    def encode_clamped(self, clamped: np.ndarray, keep_case: bool = False) -> np.ndarray:
+        table = self.exact_table if keep_case else self.upper_table
+        indices = table[clamped]
+        return indices[indices >= 0].astype(np.uint8)
+
+    def pad(self, indices: np.ndarray, n: int) -> np.ndarray:
+        remainder = len(indices) % n
+        if remainder == 0:
+            return indices
+        return np.concatenate([indices, np.full(n - remainder, self.pad_index, dtype=indices.dtype)])
+
+    def encode_blocks(self, text: str, n: int, keep_case: bool = False) -> np.ndarray:
+        # Матрица блоков формы (число блоков, n)
+        return self.pad(self.encode(text, keep_case), n).reshape(-1, n)
+
+    def decode(self, indices: np.ndarray) -> str:
+        return np.take(self.symbols, indices.ravel()).tobytes().decode(self._encoding)
+
+    def decode_utf8(self, indices: np.ndarray) -> bytes:
+        # Сразу байты UTF-8 для записи в файл, без строки Python
+        return np.take(self.utf8_symbols, indices.ravel(), axis=0).tobytes()
+
+
+ENGLISH_CODEC = AlphabetCodec(ENGLISH_ALPHABET, 'X')
+RUSSIAN_CODEC = AlphabetCodec(RUSSIAN_ALPHABET, 'Е')
+_codecs = {ENGLISH_ALPHABET: ENGLISH_CODEC, RUSSIAN_ALPHABET: RUSSIAN_CODEC}
+LANGUAGE_ALPHABETS = {'english': ENGLISH_ALPHABET, 'russian': RUSSIAN_ALPHABET}
+
+# 1 — символ русского алфавита, 2 — английского (после перевода в верхний регистр)
+_language_table = np.zeros(TABLE_SIZE + 1, dtype=np.uint8)
+_language_table[RUSSIAN_CODEC.upper_table >= 0] = 1
+_language_table[ENGLISH_CODEC.upper_table >= 0] = 2
+
+
+def get_codec(alphabet: str) -> AlphabetCodec:
+    codec = _codecs.get(alphabet)
+    if codec is None:
+        raise ValueError("Поддерживаются только английский и русский языки")
+    return codec
+
+
+def _count_letters(clamped: np.ndarray):
+    # (букв русского алфавита, букв английского); count_nonzero быстрее bincount на uint8
+    languages = _language_table[clamped]
+    return np.count_nonzero(languages == 1), np.count_nonzero(languages == 2)
+
+
+def _choose_language(russian_count: int, english_count: int) -> str:
+    if russian_count > english_count:
+        return 'russian'
+    elif english_count > russian_count:
+        return 'english'
+    else:
+        raise ValueError("Не удалось определить язык текста")
+
+
+def _sample_windows(length: int, sample: int):
+    # (начало, конец) отрезков выборки, равномерно от начала до конца текста
+    window = max(1, sample // DETECT_WINDOWS)
+    starts = np.linspace(0, length - window, DETECT_WINDOWS, dtype=np.int64)
+    return [(int(start), int(start) + window) for start in starts]
+
+
+def _sampled_language(length: int, count_window, sample: int):
+    # Язык по выборке или None, если выборка не даёт уверенного ответа
+    if length <= sample:
+        return None
+    russian_count = english_count = 0
+    for start, stop in _sample_windows(length, sample):
+        russian, english = count_window(start, stop)
+        russian_count += russian
+        english_count += english
+    letters = russian_count + english_count
+    if letters < DETECT_MIN_LETTERS or abs(russian_count - english_count) < DETECT_CONFIDENCE * letters:
+        return None
+    return _choose_language(russian_count, english_count)
+
+
+def detect_language(text: str, sample: int = DETECT_SAMPLE) -> str:
+    language = _sampled_language(
+        len(text), lambda start, stop: _count_letters(clamp_codepoints(text_to_codepoints(text[start:stop]))), sample)
+    if language is not None:
+        return language
+    return _choose_language(*_count_letters(clamp_codepoints(text_to_codepoints(text))))
+
+
+def scan_text(text: str, language: str = None, keep_case: bool = False, sample: int = DETECT_SAMPLE):
+    # Определение языка и перевод в индексы алфавита за один перевод текста
+    # в кодовые точки: (алфавит, индексы). language — 'english' / 'russian' или None.
+    # ValueError, если язык не определён или не поддерживается
+    clamped = clamp_codepoints(text_to_codepoints(text))
+    if language is None:
+        language = _sampled_language(len(clamped), lambda start, stop: _count_letters(clamped[start:stop]), sample)
+        if language is None:
+            language = _choose_language(*_count_letters(clamped))
+    alphabet = LANGUAGE_ALPHABETS.get(language)
+    if alphabet is None:
+        raise ValueError("Поддерживаются только английский и русский языки")
+    return alphabet, get_codec(alphabet).encode_clamped(clamped, keep_case)
+
+
+def iter_utf8(data, chunk_size: int = UTF8_CHUNK):
+    # Куски строки из текста в UTF-8 (bytes, mmap); символ на границе куска не рвётся
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    view = memoryview(data)
+    try:
+        for start in range(0, len(view), chunk_size):
+            yield decoder.decode(view[start:start + chunk_size], start + chunk_size >= len(view))
+    finally:
+        view.release()  # Иначе отображённый файл нельзя закрыть
+
+
+def scan_bytes(data, language: str = None, keep_case: bool = False, sample: int = DETECT_SAMPLE):
+    # То же, что scan_text, для текста в UTF-8 (bytes, mmap) без строки на весь текст.
+    # Окно выборки может начаться посреди символа — неполный символ отбрасывается
+    if language is None:
+        language = _sampled_language(
+            len(data), lambda start, stop: _count_letters(
+                clamp_codepoints(text_to_codepoints(bytes(data[start:stop]).decode('utf-8', 'ignore')))), sample)
+        if language is None:
+            counts = [_count_letters(clamp_codepoints(text_to_codepoints(piece))) for piece in iter_utf8(data)]
+            language = _choose_language(sum(c[0] for c in counts), sum(c[1] for c in counts))
+    alphabet = LANGUAGE_ALPHABETS.get(language)
+    if alphabet is None:
+        raise ValueError("Поддерживаются только английский и русский языки")
+    codec = get_codec(alphabet)
+    parts = [codec.encode(piece, keep_case) for piece in iter_utf8(data)]
+    return alphabet, np.concatenate(parts) if parts else np.empty(0, dtype=np.uint8)
@@ -0,0 +1,174 @@
+import logging
+import os
+import secrets
+import threading
+import time
+
+# Атомарная запись файлов: данные пишутся во временный файл, который затем
+# переименовывается в целевой, поэтому файл никогда не виден записанным наполовину.
+# Устойчивость к отключению питания — KURSOVAYA_FSYNC:
+#   always — fsync файла до переименования и каталога после, на каждую запись;
+#   batch  — групповая фиксация: записи, пришедшие из разных потоков, пока идёт
+#            предыдущая фиксация, фиксируются вместе — fsync всех временных файлов,
+#            затем их переименование и по одному fsync на каталог. Запись возвращается
+#            после фиксации, как в always, поэтому на место никогда не встаёт файл,
+#            данные которого не на диске; экономятся fsync каталогов и ожидание.
+#            KURSOVAYA_FSYNC_INTERVAL_MS > 0 — сколько ещё ждать записей в группу;
+#   none   — только переименование (падение процесса не страшно, отключение питания — да)
+ALWAYS, BATCH, NONE = 'always', 'batch', 'none'
+DURABILITY_MODES = (ALWAYS, BATCH, NONE)
+DURABILITY = os.environ.get("KURSOVAYA_FSYNC", BATCH)
+FSYNC_INTERVAL_MS = int(os.environ.get("KURSOVAYA_FSYNC_INTERVAL_MS", "0"))
+TEMP_SUFFIX = '.tmp'
+STALE_TEMP_AGE = 3600  # Временный файл старше, с, остался от упавшего процесса, а не от идущей записи
+
+
+def fsync_path(path: str):
+    # В Windows FlushFileBuffers требует доступа на запись
+    fd = os.open(path, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_dir(path: str):
+    # Фиксация записи каталога (созданные и переименованные файлы); в Windows каталог не открыть
+    if os.name == 'nt':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def remove_stale_temp(folder: str, max_age: float = STALE_TEMP_AGE) -> int:
+    # Удаление временных файлов AtomicWriter, брошенных между записью и переименованием.
+    # Возвращает число удалённых
+    removed = 0
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(folder))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if not (entry.name.startswith('.') and entry.name.endswith(TEMP_SUFFIX)):
+            continue
+        try:
+            if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass  # Запись закончилась, файл уже переименован
+    return removed
+
+
+class AtomicWriter:
+    # stage() пишет данные во временный файл, publish() переносит его на место;
+    # write() — оба шага. Временный файл создаётся в папке назначения: переименование
+    # не выходит за её пределы, а брошенный файл находит remove_stale_temp()
+
+    def __init__(self, durability: str = DURABILITY, interval_ms: int = FSYNC_INTERVAL_MS):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Режим fsync должен быть одним из {', '.join(DURABILITY_MODES)}")
+        self.durability = durability
+        self.interval = interval_ms / 1000
+        self._group = threading.Condition()
+        self._pending = []  # Ждущие фиксации записи: [временный файл, путь, готово, ошибка]
+        self._committing = False
+        self.commits = 0  # Групповых фиксаций в режиме batch
+
+    def stage(self, folder: str, data: bytes) -> str:
+        # Временный файл в folder — папке, куда его потом перенесёт publish()
+        tmp_path = os.path.join(folder, f".{secrets.token_hex(8)}{TEMP_SUFFIX}")
+        # Не mkstemp: у него права 0600, а файлы текстов создаются с обычными
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL
+        try:
+            fd = os.open(tmp_path, flags, 0o666)
+        except FileNotFoundError:  # Каталог создаётся только при первой записи
+            os.makedirs(folder, exist_ok=True)
+            fd = os.open(tmp_path, flags, 0o666)
+        with open(fd, 'wb') as f:
+            f.write(data)
+        return tmp_path
+
+    def publish(self, tmp_path: str, path: str):
+        # Готовый файл (в том числе записанный не stage()) занимает место path
+        if self.durability == BATCH:
+            self._publish_group(tmp_path, path)
+            return
+        if self.durability == ALWAYS:
+            fsync_path(tmp_path)
+        os.replace(tmp_path, path)
+        if self.durability == ALWAYS:
+            fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+    def _publish_group(self, tmp_path: str, path: str):
+        # Первый пришедший поток становится ведущим и фиксирует всё, что накопилось,
+        # остальные ждут; пришедшие во время фиксации попадают в следующую группу
+        entry = [tmp_path, path, False, None]
+        with self._group:
+            self._pending.append(entry)
+            while self._committing and not entry[2]:
+                self._group.wait()
+            if not entry[2]:
+                self._committing = True
+        if not entry[2]:
+            group = []
+            try:
+                if self.interval:
+                    time.sleep(self.interval)
+                with self._group:
+                    group, self._pending = self._pending, []
+                self._commit(group)
+            except BaseException as e:
+                for other in group:  # Ждущие этой группы не должны остаться без ответа
+                    if not other[2]:
+                        other[2], other[3] = True, e
+                raise
+            finally:
+                with self._group:
+                    self._committing = False
+                    self._group.notify_all()
+        if entry[3] is not None:
+            raise entry[3]
+
+    def _commit(self, group):
+        # Данные на диск до переименования: после сбоя на месте текста старая или новая версия
+        for entry in group:
+            try:
+                fsync_path(entry[0])
+            except OSError as e:
+                entry[3] = e
+        folders = {}
+        for entry in group:
+            if entry[3] is None:
+                try:
+                    os.replace(entry[0], entry[1])
+                except OSError as e:
+                    entry[3] = e
+                else:
+                    folders.setdefault(os.path.dirname(os.path.abspath(entry[1])), []).append(entry)
+        for folder, entries in folders.items():
+            try:
+                fsync_dir(folder)
+            except OSError as e:
+                logging.warning(f"Не удалось зафиксировать каталог {folder}: {e}")
+                for entry in entries:
+                    entry[3] = e
+        for entry in group:
+            entry[2] = True
+        self.commits += 1
+
+    def write(self, path: str, data: bytes):
+        tmp_path = self.stage(os.path.dirname(os.path.abspath(path)), data)
+        try:
+            self.publish(tmp_path, path)
+        except BaseException:
+            self.discard(tmp_path)
+            raise
+
+    def discard(self, tmp_path: str):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
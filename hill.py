@@ -0,0 +1,135 @@
+import math
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from codec import get_codec
+from metrics import stage
+from modmath import mod_inverse
+
+MAX_KEY_SIZE = 16
+# Сколько блоков умножается за один проход: промежуточная матрица int64
+# не превышает CHUNK_BLOCKS * n элементов
+CHUNK_BLOCKS = 1 << 18
+# Малые ключи (m**n блоков не больше TABLE_MAX_ENTRIES: 2x2 и 3x3 для обоих
+# алфавитов) шифруются по таблице «блок -> зашифрованный блок» без умножения;
+# 0 — табличный путь выключен. Таблица строится из m**n блоков, поэтому на
+# текстах короче TABLE_MIN_RATIO * m**n блоков её построение дороже умножения
+TABLE_MAX_ENTRIES = int(os.environ.get("KURSOVAYA_TABLE_MAX_ENTRIES", str(1 << 15)))
+TABLE_MIN_RATIO = 2  # Точка перехода по bench/table_crossover.py: 1-4 размера таблицы
+TABLE_CACHE_SIZE = 128  # Таблица 3x3 — около 100 КБ
+
+
+def parse_key(key: str, alphabet_size: int) -> np.ndarray:
+    # Ключ — n*n чисел через пробел, матрица заполняется по строкам
+    key_values = list(map(int, key.split()))
+    n = math.isqrt(len(key_values))
+    if n < 2 or n * n != len(key_values):
+        raise ValueError("Ключ должен содержать n*n чисел (4, 9, 16, ...)")
+    if n > MAX_KEY_SIZE:
+        raise ValueError(f"Размер ключа не должен превышать {MAX_KEY_SIZE}x{MAX_KEY_SIZE}")
+    # Остатки берутся над целыми Python: элементы ключа вне int64 не должны давать OverflowError
+    key_matrix = np.array([value % alphabet_size for value in key_values], dtype=np.int64).reshape(n, n)
+    mod_inverse(key_matrix, alphabet_size)  # ValueError, если ключ необратим
+    return key_matrix
+
+
+def matmul_transform(blocks: np.ndarray, key_matrix: np.ndarray, mod: int) -> np.ndarray:
+    key_t = (np.asarray(key_matrix, dtype=np.int64) % mod).T
+    out = np.empty(blocks.shape, dtype=np.uint8)
+    for start in range(0, len(blocks), CHUNK_BLOCKS):
+        chunk = blocks[start:start + CHUNK_BLOCKS].astype(np.int64)
+        out[start:start + CHUNK_BLOCKS] = (chunk @ key_t) % mod
+    return out
+
+
+@lru_cache(maxsize=TABLE_CACHE_SIZE)
+def _block_table(key_bytes: bytes, n: int, mod: int) -> np.ndarray:
+    # Строка i — зашифрованный блок с номером i (цифры блока в системе по основанию mod)
+    key_matrix = np.frombuffer(key_bytes, dtype=np.int64).reshape(n, n)
+    blocks = np.indices((mod,) * n, dtype=np.uint8).reshape(n, -1).T
+    table = matmul_transform(blocks, key_matrix, mod)
+    table.flags.writeable = False  # Значение из кэша общее для всех запросов
+    return table
+
+
+def table_transform(blocks: np.ndarray, key_matrix: np.ndarray, mod: int) -> np.ndarray:
+    n = blocks.shape[1]
+    key_bytes = (np.ascontiguousarray(key_matrix, dtype=np.int64) % mod).tobytes()
+    table = _block_table(key_bytes, n, mod)
+    out = np.empty(blocks.shape, dtype=np.uint8)
+    for start in range(0, len(blocks), CHUNK_BLOCKS):
+        chunk = blocks[start:start + CHUNK_BLOCKS]
+        index = chunk[:, 0].astype(np.intp)
+        for j in range(1, n):
+            index *= mod
+            index += chunk[:, j]
+        np.take(table, index, axis=0, out=out[start:start + CHUNK_BLOCKS])
+    return out
+
+
+def uses_table(blocks: int, n: int, mod: int) -> bool:
+    entries = mod ** n
+    return entries <= TABLE_MAX_ENTRIES and blocks >= TABLE_MIN_RATIO * entries
+
+
+def hill_transform(blocks: np.ndarray, key_matrix: np.ndarray, mod: int) -> np.ndarray:
+    # blocks — матрица (число блоков, n) индексов алфавита; каждый блок
+    # умножается на ключ: out[i] = key_matrix @ blocks[i] (mod m). Путь
+    # (таблица или умножение) выбирается сам, результат одинаков
+    if uses_table(len(blocks), blocks.shape[1], mod):
+        return table_transform(blocks, key_matrix, mod)
+    return matmul_transform(blocks, key_matrix, mod)
+
+
+def table_cache_stats() -> dict:
+    info = _block_table.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+
+def text_to_matrix(text: str, n: int, alphabet: str, keep_case: bool = False):
+    # Столбцы матрицы — блоки текста длины n
+    return get_codec(alphabet).encode_blocks(text, n, keep_case).T
+
+
+def matrix_to_text(matrix: np.ndarray, alphabet: str):
+    return get_codec(alphabet).decode(matrix.T)
+
+
+def hill_cipher_encrypt(text: str, key_matrix: np.ndarray, alphabet: str, utf8: bool = False):
+    # utf8=True — результат байтами UTF-8 (для записи в файл), а не строкой
+    codec = get_codec(alphabet)
+    with stage("encode"):
+        blocks = codec.encode_blocks(text, key_matrix.shape[0])
+    with stage("matmul"):
+        out = hill_transform(blocks, key_matrix, codec.size)
+    with stage("decode"):
+        return codec.decode_utf8(out) if utf8 else codec.decode(out)
+
+
+def hill_cipher_decrypt(text: str, key_matrix: np.ndarray, alphabet: str, utf8: bool = False):
+    codec = get_codec(alphabet)
+    with stage("encode"):
+        blocks = codec.encode_blocks(text, key_matrix.shape[0], keep_case=True)  # Шифртекст может содержать a-f
+    inverse_key_matrix = mod_inverse(key_matrix, codec.size)
+    with stage("matmul"):
+        out = hill_transform(blocks, inverse_key_matrix, codec.size)
+    with stage("decode"):
+        return codec.decode_utf8(out) if utf8 else codec.decode(out)
+
+
+def hill_cipher_batch(texts, key_matrix: np.ndarray, alphabet: str, decrypt: bool = False):
+    # Тексты с общим ключом и алфавитом обрабатываются одним умножением,
+    # результат возвращается в исходном порядке
+    codec = get_codec(alphabet)
+    n = key_matrix.shape[0]
+    with stage("encode"):
+        parts = [codec.encode_blocks(text, n, keep_case=decrypt) for text in texts]
+    if decrypt:
+        key_matrix = mod_inverse(key_matrix, codec.size)
+    with stage("matmul"):
+        out = hill_transform(np.concatenate(parts), key_matrix, codec.size)
+    bounds = np.cumsum([len(part) for part in parts])[:-1]
+    with stage("decode"):
+        return [codec.decode(chunk) for chunk in np.split(out, bounds)]
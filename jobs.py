@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+
+# Фоновые задачи (шифрование больших текстов, импорт): очередь в SQLite переживает
+# перезапуск сервера, задачи выполняют рабочие потоки. Тип задачи — имя обработчика
+# из register(); обработчик получает Job и возвращает результат (dict, хранится как JSON)
+JOB_WORKERS = int(os.environ.get("KURSOVAYA_JOB_WORKERS", "2"))
+JOB_TTL = float(os.environ.get("KURSOVAYA_JOB_TTL", str(7 * 24 * 3600)))  # Сколько хранить завершённые задачи, с
+POLL_INTERVAL = 1.0  # Запасной опрос очереди, если уведомление о новой задаче потерялось
+PROGRESS_INTERVAL = 0.2  # Прогресс пишется в базу не чаще, с: импорт сообщает его после каждого текста
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    params TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    cancel INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (state, priority DESC, created_at);
+"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, queue, job_id: str, user_id: int, job_type: str, params: dict):
+        self.queue, self.id, self.user_id, self.type, self.params = queue, job_id, user_id, job_type, params
+        self._reported = 0.0
+
+    def progress(self, fraction: float):
+        # Обработчик сообщает долю выполненного; здесь же проверяется отмена
+        now = time.monotonic()
+        if now - self._reported < PROGRESS_INTERVAL:
+            return
+        self._reported = now
+        if self.queue._update_progress(self.id, fraction):
+            raise JobCancelled()
+
+
+class JobQueue:
+    # База и папка с файлами задач создаются при первом обращении, а не при импорте
+
+    def __init__(self, folder: str, workers: int = JOB_WORKERS):
+        self.folder = folder
+        self.path = os.path.join(folder, "jobs.db")
+        self.workers = workers
+        self._handlers = {}
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._stopping = False
+
+    def register(self, job_type: str, handler, cleanup=None):
+        # cleanup(params) — освободить ресурсы задачи, отменённой до запуска (например, загруженный файл)
+        self._handlers[job_type] = (handler, cleanup)
+
+    def file_path(self, job_id: str, suffix: str) -> str:
+        # Файлы задачи (загрузка, результат) лежат рядом с базой
+        os.makedirs(self.folder, exist_ok=True)
+        return os.path.join(self.folder, f"{job_id}{suffix}")
+
+    def temp_file(self, suffix: str):
+        # (fd, путь) для данных, которые нужны задаче до её постановки (тело запроса импорта)
+        os.makedirs(self.folder, exist_ok=True)
+        return tempfile.mkstemp(dir=self.folder, suffix=suffix)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(self.folder, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(JOBS_SCHEMA)
+                    self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    def start(self):
+        conn = self._connection()
+        # Задачи, которые выполнялись при остановке сервера, начинаются заново
+        conn.execute("UPDATE jobs SET state = ?, progress = 0, started_at = NULL WHERE state = ?", (QUEUED, RUNNING))
+        self.purge(time.time() - JOB_TTL)
+        self._stopping = False
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        # Выполняемые задачи доделываются до следующего progress(); незавершённые
+        # останутся в состоянии running и при следующем start() вернутся в очередь
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, user_id: int, job_type: str, params: dict, priority: int = 0) -> str:
+        if job_type not in self._handlers:
+            raise ValueError(f"Неизвестный тип задачи: {job_type}")
+        job_id = secrets.token_hex(8)
+        self._connection().execute(
+            "INSERT INTO jobs (id, user_id, type, params, priority, state, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, user_id, job_type, json.dumps(params), priority, QUEUED, time.time()))
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id: str):
+        # {"id", "user_id", "type", "state", "priority", "progress", "result", "error", ...} или None
+        row = self._connection().execute(
+            "SELECT id, user_id, type, state, priority, progress, result, error, created_at, started_at, finished_at "
+            "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "user_id", "type", "state", "priority", "progress", "result", "error",
+                "created_at", "started_at", "finished_at")
+        job = dict(zip(keys, row))
+        job["result"] = None if job["result"] is None else json.loads(job["result"])
+        return job
+
+    def cancel(self, job_id: str):
+        # Задача в очереди отменяется сразу, выполняемая — при следующем progress().
+        # Возвращает состояние после отмены или None, если задачи нет
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT state, type, params FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is not None and row[0] == QUEUED:
+                conn.execute("UPDATE jobs SET state = ?, finished_at = ? WHERE id = ?", (CANCELLED, time.time(), job_id))
+            elif row is not None and row[0] == RUNNING:
+                conn.execute("UPDATE jobs SET cancel = 1 WHERE id = ?", (job_id,))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        if row is None:
+            return None
+        if row[0] == QUEUED:
+            self._cleanup(row[1], json.loads(row[2]))
+            return CANCELLED
+        return row[0]
+
+    def queued(self) -> int:
+        if not self._initialized and not os.path.exists(self.path):
+            return 0  # Метрика не должна создавать базу
+        return self._connection().execute("SELECT COUNT(*) FROM jobs WHERE state = ?", (QUEUED,)).fetchone()[0]
+
+    def purge(self, before: float):
+        # Удаление задач, завершённых раньше before, вместе с их файлами
+        conn = self._connection()
+        rows = conn.execute("SELECT id FROM jobs WHERE finished_at < ?", (before,)).fetchall()
+        for (job_id,) in rows:
+            for name in os.listdir(self.folder):
+                if name.startswith(job_id + "."):
+                    os.remove(os.path.join(self.folder, name))
+        conn.execute("DELETE FROM jobs WHERE finished_at < ?", (before,))
+
+    def _cleanup(self, job_type: str, params: dict):
+        cleanup = self._handlers.get(job_type, (None, None))[1]
+        if cleanup is not None:
+            try:
+                cleanup(params)
+            except OSError as e:
+                logging.warning(f"Не удалось освободить ресурсы задачи: {e}")
+
+    def _claim(self):
+        # Следующая задача по приоритету, затем по времени постановки; захват — в одной транзакции
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT id, user_id, type, params FROM jobs WHERE state = ? "
+                               "ORDER BY priority DESC, created_at, id LIMIT 1", (QUEUED,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET state = ?, started_at = ? WHERE id = ?", (RUNNING, time.time(), row[0]))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return None if row is None else Job(self, row[0], row[1], row[2], json.loads(row[3]))
+
+    def _update_progress(self, job_id: str, fraction: float) -> bool:
+        # True, если задачу попросили отменить
+        conn = self._connection()
+        conn.execute("UPDATE jobs SET progress = ? WHERE id = ?", (max(0.0, min(1.0, fraction)), job_id))
+        return bool(conn.execute("SELECT cancel FROM jobs WHERE id = ?", (job_id,)).fetchone()[0])
+
+    def _finish(self, job_id: str, state: str, result=None, error=None):
+        self._connection().execute(
+            "UPDATE jobs SET state = ?, progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END, result = ?, "
+            "error = ?, finished_at = ? WHERE id = ?",
+            (state, state, None if result is None else json.dumps(result), error, time.time(), job_id))
+
+    def run_next(self) -> bool:
+        # Выполнить одну задачу из очереди в текущем потоке; False, если очередь пуста
+        job = self._claim()
+        if job is None:
+            return False
+        handler = self._handlers[job.type][0]
+        try:
+            result = handler(job)
+        except JobCancelled:
+            self._finish(job.id, CANCELLED)
+        except ValueError as e:  # Ошибка в данных задачи (текст, ключ, файл импорта) — без трассировки
+            logging.warning(f"Задача {job.id} ({job.type}) не выполнена: {e}")
+            self._finish(job.id, FAILED, error=str(e))
+        except Exception as e:
+            logging.exception(f"Задача {job.id} ({job.type}) завершилась с ошибкой")
+            self._finish(job.id, FAILED, error=str(e))
+        else:
+            self._finish(job.id, DONE, result)
+        return True
+
+    def _worker(self):
+        while not self._stopping:
+            try:
+                if self.run_next():
+                    continue
+            except sqlite3.Error as e:
+                logging.warning(f"Очередь задач недоступна: {e}")
+            with self._wakeup:
+                if not self._stopping:
+                    self._wakeup.wait(POLL_INTERVAL)
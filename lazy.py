@@ -0,0 +1,43 @@
+import importlib
+import sys
+import time
+
+# Отложенный импорт тяжёлых модулей (NumPy и всё, что на нём построено):
+# процесс сервера стартует без них, модуль загружается при первом обращении
+# к атрибуту или заранее, при прогреве (main.warm_up). Время каждой загрузки
+# сохраняется в load_seconds — для метрик запуска
+load_seconds = {}
+
+
+class LazyModule:
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = sys.modules.get(name)
+
+    # Свои имена с подчёркиванием: не должны заслонять атрибуты модуля (numpy.load)
+    @property
+    def _loaded(self) -> bool:
+        return self._module is not None
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            # Блокировка импорта в importlib общая: параллельные загрузки одного модуля безопасны
+            start = time.perf_counter()
+            module = importlib.import_module(self._name)
+            load_seconds.setdefault(self._name, time.perf_counter() - start)
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        # Вызывается только для атрибутов, которых нет у самой обёртки
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value):
+        setattr(self._load(), attr, value)  # Для тестов, подменяющих атрибуты модуля
+
+
+def preload(*modules: LazyModule):
+    # Загрузить заранее (прогрев), чтобы первый запрос не ждал импорта
+    for module in modules:
+        module._load()
@@ -1,23 +1,103 @@
-import hashlib
+import time
+IMPORT_STARTED = time.perf_counter()  # Отсчёт времени запуска: импорт main, прогрев, готовность
+import asyncio
 import logging
-import numpy as np
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from passlib.context import CryptContext
-from typing import Union
+from typing import List, Union
 import os
-import json
-import time
 import secrets
+import tempfile
 import re
+from contextlib import asynccontextmanager
+from storage import PLAIN, ENCRYPTED, KINDS, make_storage
+from bulk import FORMATS, NDJSON, EXPORTERS, MEDIA_TYPES, IMPORT_ERRORS, iter_import
+import workers
+from workers import run_io, run_cipher
+from passwords import PasswordHasher
+from cipher_cache import CipherCache, cipher_digest
+from metrics import REGISTRY, Gauge, MetricsMiddleware, stage, timed
+from jobs import DONE, JobQueue
+import lazy
+from lazy import LazyModule, preload
+from packed import symbol_tables
+
+# Шифр построен на NumPy: модули загружаются при прогреве (warm_up) или первом
+# запросе к шифру, а не при импорте — регистрация и вход их не ждут
+codec = LazyModule("codec")
+modmath = LazyModule("modmath")
+hill = LazyModule("hill")
+parallel = LazyModule("parallel")
+streaming = LazyModule("streaming")
+analysis = LazyModule("analysis")
+
+# Уровень журнала — KURSOVAYA_LOG_LEVEL (DEBUG, INFO, ...); тексты запросов в журнал не пишутся, только размеры
+logging.basicConfig(level=os.environ.get("KURSOVAYA_LOG_LEVEL", "WARNING").upper())
+logger = logging.getLogger("kursovaya")
+
+passwords = PasswordHasher()  # Схема и стоимость — KURSOVAYA_PASSWORD_SCHEME / KURSOVAYA_PASSWORD_ROUNDS
+# "files" — каталоги users/, user_text/, encrypted_text/; "sqlite:<путь>" — база SQLite
+storage = make_storage(os.environ.get("KURSOVAYA_STORAGE", "files"))
+cipher_cache = CipherCache()  # Размер — KURSOVAYA_CIPHER_CACHE_BYTES, дисковый уровень — KURSOVAYA_CIPHER_CACHE_DIR
+# Фоновые задачи: база и файлы — KURSOVAYA_JOBS_DIR, число рабочих потоков — KURSOVAYA_JOB_WORKERS
+job_queue = JobQueue(os.environ.get("KURSOVAYA_JOBS_DIR", "jobs"))
+
+# Этапы запуска, с: import — импорт main, warm_up — прогрев, ready — от начала импорта до готовности
+startup = {}
+WARM_UP_KEY = "3 3 2 5"
+WARM_UP_TEXTS = ("Прогрев шифра Хилла", "Hill cipher warm-up")
+
+def warm_cipher():
+    # Модули шифра и таблицы кодеков загружаются заранее, пробное шифрование
+    # и дешифрование обоими алфавитами заполняет кэш обратных матриц
+    preload(codec, modmath, hill, parallel, streaming, analysis)
+    symbol_tables()
+    for text in WARM_UP_TEXTS:
+        alphabet, key_matrix, indices = scan_params(text, WARM_UP_KEY)
+        encrypted = parallel.cipher_text(indices, key_matrix, alphabet)
+        hill.hill_cipher_decrypt(encrypted, key_matrix, alphabet)
+
+async def warm_up():
+    # После старта, в фоне: индекс пользователей, шифр, контекст паролей. Запросы
+    # обслуживаются и во время прогрева (нужное догружается по требованию), но /ready
+    # до его конца отвечает 503, чтобы балансировщик не слал трафик на холодный процесс
+    started = time.perf_counter()
+    try:
+        await run_io(storage.build)
+        await workers.cipher_executor.run(warm_cipher)
+        await passwords.warm_up()
+    except Exception:
+        logger.exception("Прогрев не удался: сервер не будет отмечен готовым")
+        return
+    startup["warm_up"] = time.perf_counter() - started
+    startup["ready"] = time.perf_counter() - IMPORT_STARTED
+    logger.info("Сервер готов: импорт %.3f с, прогрев %.3f с", startup["import"], startup["warm_up"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-app = FastAPI()
-user_folder_path = 'user_text'
-ENGLISH_ALPHABET = 'AaBbCcDdEeFfGHIJKLMNOPQRSTUVWXYZ'
-RUSSIAN_ALPHABET = 'АБВГДЕЖЗИЙКЛМНОПРСТУФХЦЧШЩЫЬЭЮЯ'
-ENGLISH_ALPHABET_SIZE = len(ENGLISH_ALPHABET)
-RUSSIAN_ALPHABET_SIZE = len(RUSSIAN_ALPHABET)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    removed = await run_io(storage.remove_temp_files)
+    if removed:
+        logger.info("Удалено брошенных временных файлов: %d", removed)
+    job_queue.start()
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    warm_up_task.cancel()
+    job_queue.stop()
+    storage.close()
+    workers.shutdown()
+    passwords.shutdown()
+    if parallel._loaded:  # Пул процессов мог быть создан, только если модуль загружен
+        parallel.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+MAX_BATCH_ITEMS = 1000
+MAX_PAGE_SIZE = 1000
+STREAM_DETECT_LIMIT = 1 << 16  # Сколько байт потока читать для определения языка
+JOB_SEGMENT = 1 << 20  # Символов текста на один шаг фоновой задачи: после каждого — прогресс и проверка отмены
+JOB_TYPES = ("encrypt", "decrypt")
 
 @app.post("/")
 def read_root():
@@ -39,290 +119,791 @@ class TextRequest(BaseModel):
 
 class Cipher_Request(BaseModel):
     token: str
-    text: str
+    text: Union[str, None] = None
     key: str
+    text_id: Union[str, None] = None  # Вместо text: сохранённый текст, сервер читает его сам
 
 class EditTextRequest(BaseModel):
     token: str
     new_text: str
 
-def find_user_by_login(login: str, user_folder: str):
-    try:
-        for filename in os.listdir(user_folder):
-            with open(os.path.join(user_folder, filename), 'r', encoding='utf-8') as f:
-                user_data = json.load(f)
-                if user_data["login"] == login:
-                    return user_data
-    except Exception as e:
-        logging.error(f"Ошибка при поиске пользователя: {e}")
-    return None
+class CipherBatchItem(BaseModel):
+    key: str
+    text: Union[str, None] = None
+    text_id: Union[str, None] = None  # Имя сохранённого файла вместо текста
+
+class CipherBatchRequest(BaseModel):
+    token: str
+    items: List[CipherBatchItem]
+
+class JobRequest(BaseModel):
+    token: str
+    type: str  # "encrypt" / "decrypt"
+    text_id: str
+    key: str
+    priority: int = 0  # Больше — раньше
+
+class KnownPlaintextRequest(BaseModel):
+    token: str
+    plaintext: str
+    ciphertext: Union[str, None] = None
+    text_id: Union[str, None] = None  # Сохранённый шифртекст вместо ciphertext
+    n: Union[int, None] = None  # Размер ключа; без него перебираются 2..16
+    offset: int = 0  # С какой буквы шифртекста начинается известный открытый текст
+    language: Union[str, None] = None
+
+class BruteForceRequest(BaseModel):
+    token: str
+    ciphertext: Union[str, None] = None
+    text_id: Union[str, None] = None
+    language: Union[str, None] = None
+    top: int = 5
+    reference: Union[str, None] = None  # Образец текста того же языка для частот пар букв
 
 def token_search(token: str):
-    for filename in os.listdir('users'):
-        if filename.endswith(".json"):
-            with open(os.path.join('users', filename), 'r') as file:
-                user_data = json.load(file)
-                if user_data["token"] == token:
-                    return user_data["id"], user_data["login"]
-    return None, None
-
-def get_user_id_from_token(token: str):
-    user_id, user_login = token_search(token)
+    user_data = storage.find_user_by_token(token)
+    if user_data is None:
+        return None, None
+    return user_data["id"], user_data["login"]
+
+async def find_user(token: str):
+    # Обработчики асинхронные: поиск в хранилище идёт в пуле ввода-вывода
+    return await run_io(timed("auth", token_search), token)
+
+async def get_user_id_from_token(token: str):
+    user_id, user_login = await find_user(token)
     if user_id is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     return user_id
 
 def check_password_strength(password: str) -> bool:
     if len(password) < 10:
-        print("Пароль должен содержать минимум 10 символов.")
+        logger.debug("Пароль должен содержать минимум 10 символов.")
         return False
     if not re.search(r'[A-Z]', password):
-        print("Пароль должен содержать хотя бы одну заглавную букву.")
+        logger.debug("Пароль должен содержать хотя бы одну заглавную букву.")
         return False
     if not re.search(r'\d', password):
-        print("Пароль должен содержать хотя бы одну цифру.")
+        logger.debug("Пароль должен содержать хотя бы одну цифру.")
         return False
     if not re.search(r'[!@#$%^&*()_+={}\[\]:;"\'<>,.?/\\|`~]', password):
-        print("Пароль должен содержать хотя бы один специальный символ.")
+        logger.debug("Пароль должен содержать хотя бы один специальный символ.")
         return False
-    print("Пароль достаточно сложный.")
+    logger.debug("Пароль достаточно сложный.")
     return True
 
-def detect_language(text: str) -> str:
-    text = text.upper()
-    russian_count = sum(1 for char in text if char in RUSSIAN_ALPHABET)
-    english_count = sum(1 for char in text if char in ENGLISH_ALPHABET)
-    if russian_count > english_count:
-        return 'russian'
-    elif english_count > russian_count:
-        return 'english'
+def text_alphabet(text: str, language: Union[str, None] = None) -> str:
+    # Алфавит по языку текста (или явно указанному языку); ошибки — 400
+    if language is None:
+        try:
+            with stage("detect_language"):
+                language = codec.detect_language(text)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Не удалось определить язык текста: {str(e)}")
+    if language == 'english':
+        alphabet = codec.ENGLISH_ALPHABET
+    elif language == 'russian':
+        alphabet = codec.RUSSIAN_ALPHABET
     else:
-        raise ValueError("Не удалось определить язык текста")
-
-def text_to_matrix(text: str, n: int, alphabet: str):
-    text = text.replace(" ", "").upper()
-    text_numbers = [alphabet.index(char) for char in text if char in alphabet]
-    while len(text_numbers) % n != 0:
-        text_numbers.append(alphabet.index('X' if alphabet == ENGLISH_ALPHABET else 'Е'))
-    matrix = np.array(text_numbers).reshape(-1, n).T
-    return matrix
-
-def matrix_to_text(matrix: np.ndarray, alphabet: str):
-    flat_matrix = matrix.flatten()
-    text = ''.join(alphabet[i] for i in flat_matrix)
-    return text
+        raise HTTPException(status_code=400, detail="Поддерживаются только английский и русский языки")
+    return alphabet
 
-def hill_cipher_encrypt(text: str, key_matrix: np.ndarray, alphabet: str):
-    n = key_matrix.shape[0]
-    text_matrix = text_to_matrix(text, n, alphabet)
-    encrypted_matrix = np.dot(key_matrix, text_matrix) % len(alphabet)
-    return matrix_to_text(encrypted_matrix, alphabet)
+def alphabet_key(alphabet: str, key: str):
+    try:
+        with stage("key_parse"):
+            return hill.parse_key(key, len(alphabet))  # Ключ n*n, обратимый по модулю размера алфавита
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Неверный формат ключа: {str(e)}")
 
-def mod_inverse(matrix: np.ndarray, mod: int) -> np.ndarray:
-    det = int(np.round(np.linalg.det(matrix)))
-    det_inv = pow(det, -1, mod)
-    adjugate = np.round(np.linalg.inv(matrix) * det).astype(int) % mod
-    return (det_inv * adjugate) % mod
+def cipher_params(text: str, key: str, language: Union[str, None] = None):
+    # Алфавит и матрица ключа; ошибки — 400
+    alphabet = text_alphabet(text, language)
+    return alphabet, alphabet_key(alphabet, key)
 
-def hill_cipher_decrypt(text: str, key_matrix: np.ndarray, alphabet: str):
-    n = key_matrix.shape[0]
-    text_matrix = text_to_matrix(text, n, alphabet)
-    inverse_key_matrix = mod_inverse(key_matrix, len(alphabet))
-    decrypted_matrix = np.dot(inverse_key_matrix, text_matrix) % len(alphabet)
-    return matrix_to_text(decrypted_matrix, alphabet)
+def scan_params(text: str, key: str, keep_case: bool = False):
+    # Как cipher_params, но текст сразу переводится в индексы алфавита: язык
+    # определяется по тем же кодовым точкам, и шифр не разбирает текст второй раз
+    try:
+        with stage("detect_language"):
+            alphabet, indices = codec.scan_text(text, keep_case=keep_case)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Не удалось определить язык текста: {str(e)}")
+    return alphabet, alphabet_key(alphabet, key), indices
+
+def scan_batch(texts, keys, keep_case: bool):
+    # scan_params для каждого текста пакета; вместо параметров текста с ошибкой — HTTPException
+    scanned = []
+    for text, key in zip(texts, keys):
+        try:
+            scanned.append(scan_params(text, key, keep_case=keep_case))
+        except HTTPException as e:
+            scanned.append(e)
+    return scanned
+
+def stored_params(buffer, key: str, keep_case: bool = False):
+    # Как scan_params для текста из хранилища: байты UTF-8 переводятся в индексы без строки на весь текст
+    try:
+        with stage("detect_language"):
+            alphabet, indices = codec.scan_bytes(buffer, keep_case=keep_case)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Не удалось определить язык текста: {str(e)}")
+    return alphabet, alphabet_key(alphabet, key), indices
+
+def stored_text_size(user_id: int, kind: str, text_id: str) -> int:
+    try:
+        info = storage.text_info(user_id, kind, text_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный идентификатор текста")
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"Текст {text_id} не найден")
+    return info["size"]
+
+def write_encrypted_file(user_id: int, data: bytes) -> str:
+    # Шифртекст байтами UTF-8 — во временный файл, затем в хранилище
+    fd, tmp_path = tempfile.mkstemp(dir=storage.temp_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return storage.add_text_file(user_id, ENCRYPTED, tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def encrypted_size(indices, n: int, alphabet: str) -> int:
+    # Размер шифртекста в UTF-8: текст дополняется до целых блоков
+    return -(-len(indices) // n) * n * codec.get_codec(alphabet).utf8_symbols.shape[1]
+
+def saved_encrypted_file(user_id: int, digest: str, size: int):
+    # Уже сохранённый шифртекст того же текста тем же ключом (по кэшу результатов) или None
+    existing = cipher_cache.file_for(user_id, digest)
+    if existing is not None:
+        info = storage.text_info(user_id, ENCRYPTED, existing)
+        if info is not None and info["size"] == size:
+            cipher_cache.file_reused()
+            return existing
+        cipher_cache.forget_file(user_id, digest)
+    return None
+
+def encrypt_stored(user_id: int, text_id: str, key: str):
+    # Шифрование сохранённого текста по ссылке: файл отображается в память, шифртекст
+    # пишется в новый файл байтами — ни текст, ни шифртекст не становятся строками.
+    # (имя файла шифртекста, размер в байтах); блокирующая, вызывается через run_cipher
+    with storage.text_buffer(user_id, PLAIN, text_id) as buffer:
+        alphabet, key_matrix, indices = stored_params(buffer, key)
+        digest = cipher_digest(buffer, key_matrix, alphabet) if cipher_cache.enabled else None
+    size = encrypted_size(indices, key_matrix.shape[0], alphabet)
+    if digest is not None:
+        # Шифртекст в памяти не кэшируется (ответ его не содержит), но уже сохранённый файл переиспользуется
+        existing = saved_encrypted_file(user_id, digest, size)
+        if existing is not None:
+            return existing, size
+    encrypted = parallel.cipher_text(indices, key_matrix, alphabet, utf8=True)
+    with stage("storage_write"):
+        encrypted_id = write_encrypted_file(user_id, encrypted)
+    if digest is not None:
+        cipher_cache.remember_file(user_id, digest, encrypted_id)
+    return encrypted_id, len(encrypted)
+
+def decrypt_stored(user_id: int, text_id: str, key: str) -> str:
+    with storage.text_buffer(user_id, ENCRYPTED, text_id) as buffer:
+        alphabet, key_matrix, indices = stored_params(buffer, key, keep_case=True)
+    return parallel.cipher_text(indices, key_matrix, alphabet, decrypt=True)
+
+def read_stored_text(kind: str, user_id: int, text_id: str) -> str:
+    # text_id — идентификатор сохранённого текста, например text_1700000000.txt
+    try:
+        text = storage.read_text(user_id, kind, text_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный идентификатор текста")
+    if text is None:
+        raise HTTPException(status_code=404, detail=f"Текст {text_id} не найден")
+    return text
+
+async def store_encrypted(user_id: int, digest: str, encrypted_text: str) -> str:
+    # Если такой же шифртекст у пользователя уже сохранён, новый файл не создаётся
+    text_id = cipher_cache.file_for(user_id, digest)
+    if text_id is not None:
+        info = await run_io(storage.text_info, user_id, ENCRYPTED, text_id)
+        if info is not None and info["size"] == len(encrypted_text.encode('utf-8')):
+            cipher_cache.file_reused()
+            return text_id
+        cipher_cache.forget_file(user_id, digest)
+    text_id = await run_io(timed("storage_write", storage.add_text), user_id, ENCRYPTED, encrypted_text)
+    cipher_cache.remember_file(user_id, digest, text_id)
+    return text_id
+
+async def encrypt_and_store(user_id: int, text: str, key_matrix, alphabet: str, indices=None):
+    # (шифртекст, имя файла); повторное шифрование того же текста тем же ключом берётся из кэша.
+    # indices — текст, уже переведённый в индексы алфавита (scan_params)
+    source = text if indices is None else indices
+    if not cipher_cache.enabled:
+        # Короткий текст шифруется сразу, длинный — в пуле потоков, очень длинный — ещё и в пуле процессов
+        encrypted_text = await run_cipher(len(text), parallel.cipher_text, source, key_matrix, alphabet)
+        return encrypted_text, await run_io(timed("storage_write", storage.add_text), user_id, ENCRYPTED, encrypted_text)
+    digest = await run_cipher(len(text), cipher_digest, text, key_matrix, alphabet)
+    encrypted_text = await run_io(cipher_cache.get, digest)
+    if encrypted_text is None:
+        encrypted_text = await run_cipher(len(text), parallel.cipher_text, source, key_matrix, alphabet)
+        await run_io(cipher_cache.put, digest, encrypted_text)
+    return encrypted_text, await store_encrypted(user_id, digest, encrypted_text)
 
 @app.post("/create_user")
-def register_user(user: User):
+async def register_user(user: User):
     if not check_password_strength(user.password):
         raise HTTPException(status_code=400, detail="Пароль слишком слабый, должен содержать хотя бы 10 символов.")
-    user_folder = 'users'
-    os.makedirs(user_folder, exist_ok=True)
-    if find_user_by_login(user.login, user_folder):
+    if await run_io(storage.find_user_by_login, user.login):
         raise HTTPException(status_code=409, detail="Пользователь с таким логином уже существует.")
-    user_id = int(time.time())
     user_token = secrets.token_hex(16)
-    hashed_password = hashlib.sha256(user.password.encode()).hexdigest()
-    user_data = {
-        "id": user_id,
-        "login": user.login,
-        "password": hashed_password,
-        "token": user_token,
-    }
-    user_filename = f"{user_folder}/user_{user_id}.json"
-    with open(user_filename, 'w') as user_file:
-        json.dump(user_data, user_file)
+    hashed_password = await passwords.hash(user.password)
+    if await run_io(storage.create_user, user.login, hashed_password, user_token) is None:
+        raise HTTPException(status_code=409, detail="Пользователь с таким логином уже существует.")
     return {"message": "Регистрация прошла успешно!", "token": user_token}
 
 @app.post("/login")
-def login(user: User):
-    user_folder = 'users'
+async def login(user: User):
     try:
-        user_data = find_user_by_login(user.login, user_folder)
+        user_data = await run_io(storage.find_user_by_login, user.login)
         if user_data is None:
             raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-        hashed_password = hashlib.sha256(user.password.encode()).hexdigest()
-        if hashed_password != user_data["password"]:
+        is_valid, new_hash = await passwords.verify(user.password, user_data["password"])
+        if not is_valid:
             raise HTTPException(status_code=401, detail="Неверный пароль")
+        if new_hash is not None:  # Старый формат (sha256) или прежняя стоимость — пересчитываем при входе
+            await run_io(storage.update_password, user_data["id"], new_hash)
 
         return {"message": "Авторизация прошла успешно", "token": user_data["token"]}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Ошибка при авторизации: {e}")
         raise HTTPException(status_code=500, detail="Ошибка на сервере")
 
 @app.post("/add_text")  # Добавление текста
-def add_text(text: TextRequest):
-    user_id, user_login = token_search(text.token)
+async def add_text(text: TextRequest):
+    user_id, user_login = await find_user(text.token)
     if user_id is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
-    user_folder = os.path.join(user_folder_path, str(user_id))
-    os.makedirs(user_folder, exist_ok=True)
-    current_time = int(time.time())
-    file_name = f"text_{current_time}.txt"
-    file_path = os.path.join(user_folder, file_name)
-    with open(file_path, "w", encoding="utf-8") as file:
-        file.write(text.text)
+    await run_io(timed("storage_write", storage.add_text), user_id, PLAIN, text.text)
     return {"message": "Текст успешно добавлен!"}
 
 @app.post("/delete_last_text")  # Удаление последнего добавленного текста
-def delete_last_text(text: TextRequest):
-    user_id, user_login = token_search(text.token)
+async def delete_last_text(text: TextRequest):
+    user_id, user_login = await find_user(text.token)
     if user_id is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
-    user_folder = os.path.join(user_folder_path, str(user_id))
-    if not os.path.exists(user_folder) or not os.listdir(user_folder):
+    last_text_id = await run_io(storage.last_text_id, user_id, PLAIN)
+    if last_text_id is None:
         raise HTTPException(status_code=404, detail="Нет текстов для удаления")
-    last_text_file = sorted(os.listdir(user_folder))[-1]
-    last_text_path = os.path.join(user_folder, last_text_file)
-    os.remove(last_text_path)
+    await run_io(storage.delete_text, user_id, PLAIN, last_text_id)
     return {"message": "Последний текст успешно удален!"}
 
 @app.post("/edit_last_text")  # Редактирование последнего добавленного текста
-def edit_last_text(request: EditTextRequest):
-    user_id, user_login = token_search(request.token)
+async def edit_last_text(request: EditTextRequest):
+    user_id, user_login = await find_user(request.token)
     if user_id is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
-    user_folder = os.path.join(user_folder_path, str(user_id))
-    if not os.path.exists(user_folder) or not os.listdir(user_folder):
+    last_text_id = await run_io(storage.last_text_id, user_id, PLAIN)
+    if last_text_id is None:
         raise HTTPException(status_code=404, detail="Нет текстов для редактирования")
-    last_text_file = sorted(os.listdir(user_folder))[-1]
-    last_text_path = os.path.join(user_folder, last_text_file)
-    with open(last_text_path, "w", encoding="utf-8") as file:
-        file.write(request.new_text)
+    await run_io(storage.update_text, user_id, PLAIN, last_text_id, request.new_text)
     return {"message": "Последний текст успешно отредактирован!"}
 
-@app.get("/view_texts/{token}")  # Просмотр всех текстов
-def view_all_texts(token: str):
-    user_id, user_login = token_search(token)
+def page_texts(user_id: int, kind: str, limit: int, after: Union[str, None], metadata_only: bool, empty_detail: str):
+    # Страница текстов по курсору: {"texts": [...], "next": курсор или None}.
+    # Блокирующая функция, вызывается через run_io
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit должен быть от 1 до {MAX_PAGE_SIZE}")
+    try:
+        items, next_cursor = storage.page_texts(user_id, kind, after, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not items and after is None:
+        raise HTTPException(status_code=404, detail=empty_detail)
+    if not metadata_only:
+        for item in items:
+            item["text"] = storage.read_text(user_id, kind, item["id"])
+    return {"texts": items, "next": next_cursor}
+
+def read_one_text(user_id: int, kind: str, text_id: str):
+    try:
+        info = storage.text_info(user_id, kind, text_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный идентификатор текста")
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"Текст {text_id} не найден")
+    info["text"] = storage.read_text(user_id, kind, text_id)
+    return info
+
+async def view_one_text(token: str, kind: str, text_id: str):
+    user_id, user_login = await find_user(token)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    return await run_io(read_one_text, user_id, kind, text_id)
+
+def read_all_texts(user_id: int, kind: str):
+    # Прежний ответ без limit: все тексты пользователя целиком
+    return [(text_id, storage.read_text(user_id, kind, text_id)) for text_id in storage.list_texts(user_id, kind)]
+
+@app.get("/view_texts/{token}")  # Просмотр текстов; с limit — постранично, after — курсор из "next"
+async def view_all_texts(token: str, limit: Union[int, None] = None, after: Union[str, None] = None,
+                         metadata_only: bool = False):
+    user_id, user_login = await find_user(token)
     if user_id is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
-    user_folder = os.path.join(user_folder_path, str(user_id))
-    if not os.path.exists(user_folder) or not os.listdir(user_folder):
+    if limit is not None:
+        return await run_io(page_texts, user_id, PLAIN, limit, after, metadata_only, "Нет текстов для просмотра")
+    stored = await run_io(read_all_texts, user_id, PLAIN)
+    if not stored:
         raise HTTPException(status_code=404, detail="Нет текстов для просмотра")
     texts = []
-    for index, text_file in enumerate(sorted(os.listdir(user_folder))):
-        file_path = os.path.join(user_folder, text_file)
-        with open(file_path, "r", encoding="utf-8") as file:
-            text_content = file.read()
-            texts.append({"index": index + 1, "text": text_content})
+    for index, (text_id, text) in enumerate(stored):
+        texts.append({"index": index + 1, "text": text})
     return {"texts": texts}
 
 @app.post("/cipher/encrypt/")  # Запрос на шифрование
-def encrypt(data: Cipher_Request):
-    print(f"Полученные данные: {data}")
-    user_id, user_login = token_search(data.token)
+async def encrypt(data: Cipher_Request):
+    user_id, user_login = await find_user(data.token)
     if user_id is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
-    user_folder = os.path.join('user_text', str(user_id))
-    print(f"Папка пользователя: {user_folder}")
-    if not os.path.exists(user_folder):
-        raise HTTPException(status_code=404, detail="Папка пользователя не существует")
+    if data.text_id is not None:
+        size = await run_io(stored_text_size, user_id, PLAIN, data.text_id)
+        logger.debug("Шифрование сохранённого текста: %d байт", size)
+        encrypted_id, encrypted_size = await run_cipher(size, encrypt_stored, user_id, data.text_id, data.key)
+        return {"message": f"Текст {data.text_id} зашифрован", "file": encrypted_id, "size": encrypted_size}
     if not data.text:
-        if not os.path.exists(user_folder) or not os.listdir(user_folder):
+        if not await run_io(storage.has_texts, user_id, PLAIN):
             raise HTTPException(status_code=404, detail="Нет доступных текстов для пользователя")
         raise HTTPException(status_code=404, detail="Текст для шифрования не передан")
-    try:
-        language = detect_language(data.text)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=f"Не удалось определить язык текста: {str(e)}")
-    try:
-        key_values = list(map(int, data.key.split()))  # Разделяем строку на числа
-        if len(key_values) != 4:  # Проверка, что ключ состоит из 4 чисел
-            raise ValueError("Ключ должен содержать 4 числа")
-        key_matrix = np.array(key_values).reshape(2, 2)
-        print(f"Полученная матрица ключа: \n{key_matrix}")  # Для отладки
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=f"Неверный формат ключа: {str(e)}")
-    if language == 'english':
-        alphabet = ENGLISH_ALPHABET
-    elif language == 'russian':
-        alphabet = RUSSIAN_ALPHABET
-    else:
-        raise HTTPException(status_code=400, detail="Поддерживаются только английский и русский языки")
-    encrypted_text = hill_cipher_encrypt(data.text, key_matrix, alphabet)
-    folder_path = "encrypted_text"
-    os.makedirs(folder_path, exist_ok=True)
-    user_folder = os.path.join(folder_path, str(user_id))
-    os.makedirs(user_folder, exist_ok=True)
-    text_id = int(time.time())
-    file_path = os.path.join(user_folder, f"text_{text_id}.txt")
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(encrypted_text)
-    return {"message": encrypted_text}
-
-@app.get("/view_encrypted_texts/")  # Просмотр всех зашифрованных текстов
-def view_encrypted_texts(token: str):
-    user_id, user_login = token_search(token)
+    alphabet, key_matrix, indices = await run_cipher(len(data.text), scan_params, data.text, data.key)
+    logger.debug("Шифрование: %d символов, ключ %dx%d, алфавит из %d букв",
+                 len(data.text), *key_matrix.shape, len(alphabet))
+    encrypted_text, text_id = await encrypt_and_store(user_id, data.text, key_matrix, alphabet, indices)
+    return {"message": encrypted_text, "file": text_id}
+
+@app.get("/view_texts/{token}/{text_id}")  # Один текст по идентификатору
+async def view_text(token: str, text_id: str):
+    return await view_one_text(token, PLAIN, text_id)
+
+@app.get("/view_encrypted_texts/")  # Просмотр зашифрованных текстов; с limit — постранично
+async def view_encrypted_texts(token: str, limit: Union[int, None] = None, after: Union[str, None] = None,
+                               metadata_only: bool = False):
+    user_id, user_login = await find_user(token)
     if user_id is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
-    encrypted_folder_path = os.path.join("encrypted_text", str(user_id))
-    if not os.path.exists(encrypted_folder_path) or not os.listdir(encrypted_folder_path):
+    if limit is not None:
+        page = await run_io(page_texts, user_id, ENCRYPTED, limit, after, metadata_only,
+                            "Нет зашифрованных текстов для просмотра")
+        for item in page["texts"]:
+            item["file"] = item["id"]
+        return page
+    stored = await run_io(read_all_texts, user_id, ENCRYPTED)
+    if not stored:
         raise HTTPException(status_code=404, detail="Нет зашифрованных текстов для просмотра")
     encrypted_texts = []
-    for text_file in sorted(os.listdir(encrypted_folder_path)):
-        file_path = os.path.join(encrypted_folder_path, text_file)
-        with open(file_path, "r", encoding="utf-8") as file:
-            encrypted_texts.append({"file": text_file, "text": file.read()})
+    for text_id, text in stored:
+        encrypted_texts.append({"file": text_id, "text": text})
     return {"texts": encrypted_texts}
 
+@app.get("/view_encrypted_texts/{text_id}")  # Один зашифрованный текст по идентификатору
+async def view_encrypted_text(token: str, text_id: str):
+    info = await view_one_text(token, ENCRYPTED, text_id)
+    info["file"] = text_id
+    return info
+
 @app.post("/cipher/decrypt/")  # Запрос на дешифрование
-def decrypt(data: Cipher_Request):
-    print(f"Полученные данные: {data}")
-    user_id, user_login = token_search(data.token)
+async def decrypt(data: Cipher_Request):
+    user_id, user_login = await find_user(data.token)
     if user_id is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
-    user_folder = os.path.join('encrypted_text', str(user_id))
-    print(f"Папка пользователя: {user_folder}")
-    if not os.path.exists(user_folder):
-        raise HTTPException(status_code=404, detail="Папка пользователя не существует")
+    if data.text_id is not None:
+        size = await run_io(stored_text_size, user_id, ENCRYPTED, data.text_id)
+        return {"message": await run_cipher(size, decrypt_stored, user_id, data.text_id, data.key)}
     if not data.text:
-        if not os.listdir(user_folder):
+        if not await run_io(storage.has_texts, user_id, ENCRYPTED):
             raise HTTPException(status_code=404, detail="Нет доступных зашифрованных текстов для пользователя")
         raise HTTPException(status_code=400, detail="Текст для дешифрования не передан")
+    # Шифртекст английского алфавита содержит строчные a-f: регистр сохраняется
+    alphabet, key_matrix, indices = await run_cipher(len(data.text), scan_params, data.text, data.key, keep_case=True)
+    logger.debug("Дешифрование: %d символов, ключ %dx%d, алфавит из %d букв",
+                 len(data.text), *key_matrix.shape, len(alphabet))
+    decrypted_text = await run_cipher(len(data.text), parallel.cipher_text, indices, key_matrix, alphabet, decrypt=True)
+    return {"message": decrypted_text}
+
+async def process_cipher_batch(data: CipherBatchRequest, decrypt: bool):
+    user_id, user_login = await find_user(data.token)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    if len(data.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Не более {MAX_BATCH_ITEMS} текстов за один запрос")
+    source_kind = ENCRYPTED if decrypt else PLAIN
+    results = [None] * len(data.items)
+    texts = [None] * len(data.items)
+    encoded = [None] * len(data.items)  # Тексты в индексах алфавита
+    params = {}  # номер элемента -> (алфавит, матрица ключа)
+    for index, item in enumerate(data.items):
+        try:
+            if item.text:
+                texts[index] = item.text
+            elif item.text_id:
+                texts[index] = await run_io(read_stored_text, source_kind, user_id, item.text_id)
+            else:
+                raise HTTPException(status_code=400, detail="Не передан ни текст, ни его идентификатор")
+        except HTTPException as e:
+            results[index] = {"index": index, "error": e.detail}
+    pending = [index for index, text in enumerate(texts) if text is not None]
+    # Разбор всех текстов пакета — одним вызовом вне цикла событий, как и у одиночных запросов
+    scanned = await run_cipher(sum(len(texts[index]) for index in pending), scan_batch,
+                               [texts[index] for index in pending], [data.items[index].key for index in pending],
+                               decrypt)
+    for index, result in zip(pending, scanned):
+        if isinstance(result, HTTPException):
+            results[index] = {"index": index, "error": result.detail}
+            continue
+        alphabet, key_matrix, encoded[index] = result
+        params[index] = (alphabet, key_matrix)
+    outputs = {}
+    digests = {}
+    use_cache = not decrypt and cipher_cache.enabled
+    if use_cache:
+        size = sum(len(texts[index]) for index in params)
+        digests = await run_cipher(size, lambda: {index: cipher_digest(texts[index], key_matrix, alphabet)
+                                                  for index, (alphabet, key_matrix) in params.items()})
+        cached = await run_io(lambda: {index: cipher_cache.get(digest) for index, digest in digests.items()})
+        outputs = {index: output for index, output in cached.items() if output is not None}
+    groups = {}  # (алфавит, ключ) -> (матрица ключа, номера элементов, которых нет в кэше)
+    for index, (alphabet, key_matrix) in params.items():
+        if index not in outputs:
+            group_key = (alphabet, key_matrix.shape[0], key_matrix.tobytes())
+            groups.setdefault(group_key, (key_matrix, []))[1].append(index)
+    for (alphabet, _, _), (key_matrix, indices) in groups.items():
+        group_texts = [encoded[i] for i in indices]
+        group_outputs = await run_cipher(sum(len(texts[i]) for i in indices), hill.hill_cipher_batch, group_texts, key_matrix, alphabet, decrypt)
+        for index, output in zip(indices, group_outputs):
+            outputs[index] = output
+            if use_cache:
+                await run_io(cipher_cache.put, digests[index], output)
+    for index in sorted(outputs):
+        results[index] = {"index": index, "message": outputs[index]}
+        if use_cache:
+            results[index]["file"] = await store_encrypted(user_id, digests[index], outputs[index])
+        elif not decrypt:
+            results[index]["file"] = await run_io(timed("storage_write", storage.add_text), user_id, ENCRYPTED, outputs[index])
+    return {"results": results}
+
+@app.post("/cipher/encrypt/batch")  # Шифрование нескольких текстов за один запрос
+async def encrypt_batch(data: CipherBatchRequest):
+    return await process_cipher_batch(data, decrypt=False)
+
+@app.post("/cipher/decrypt/batch")  # Дешифрование нескольких текстов за один запрос
+async def decrypt_batch(data: CipherBatchRequest):
+    return await process_cipher_batch(data, decrypt=True)
+
+async def process_cipher_stream(request: Request, token: str, key: str, language: Union[str, None], decrypt: bool):
+    user_id, user_login = await find_user(token)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    body = request.stream()
+    head = b''
+    if language is None:
+        # Язык определяется по началу потока, остальное тело ещё не прочитано
+        async for chunk in body:
+            head += chunk
+            try:
+                codec.detect_language(head.decode('utf-8', errors='ignore'))
+                break
+            except ValueError:
+                if len(head) >= STREAM_DETECT_LIMIT:
+                    break
+    alphabet, key_matrix = cipher_params(head.decode('utf-8', errors='ignore'), key, language)
+    cipher = streaming.HillStreamCipher(key_matrix, alphabet, decrypt)
+    # Тело читается кусками и сразу шифруется во временный файл, затем файл
+    # отдаётся потоком: в памяти держится только текущий кусок. Ответ не
+    # начинается раньше конца загрузки — StreamingResponse читает receive()
+    # параллельно и забрал бы у нас часть тела
+    fd, tmp_path = tempfile.mkstemp(dir=storage.temp_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            async def write_chunk(chunk: bytes):
+                # В цикле событий остаётся только преобразование небольших кусков,
+                # запись в файл всегда идёт через run_io — одна на кусок тела
+                if not chunk:
+                    return
+                parts = [await run_cipher(len(piece), cipher.feed, piece) for piece in streaming.split_chunks(chunk)]
+                await run_io(f.write, ''.join(parts))
+
+            # Куски идут по порядку: следующий ждёт, пока предыдущий записан
+            await write_chunk(head)
+            async for chunk in body:
+                await write_chunk(chunk)
+            await run_io(lambda: f.write(cipher.finish()))
+        if decrypt:
+            return FileResponse(tmp_path, media_type="text/plain; charset=utf-8",
+                                background=BackgroundTask(os.remove, tmp_path))
+        text_id = await run_io(storage.add_text_file, user_id, ENCRYPTED, tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return StreamingResponse(storage.iter_text_chunks(user_id, ENCRYPTED, text_id),
+                             media_type="text/plain; charset=utf-8", headers={"X-Encrypted-File": text_id})
+
+@app.post("/cipher/encrypt/stream")  # Потоковое шифрование: текст в теле запроса, результат потоком
+async def encrypt_stream(request: Request, token: str, key: str, language: Union[str, None] = None):
+    return await process_cipher_stream(request, token, key, language, decrypt=False)
+
+@app.post("/cipher/decrypt/stream")  # Потоковое дешифрование
+async def decrypt_stream(request: Request, token: str, key: str, language: Union[str, None] = None):
+    return await process_cipher_stream(request, token, key, language, decrypt=True)
+
+@app.post("/import")  # Массовый импорт: NDJSON, tar или zip в теле запроса; все тексты или ни одного
+async def import_texts(request: Request, token: str, format: Union[str, None] = None):
+    user_id = await get_user_id_from_token(token)
+    if format is not None and format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Формат должен быть одним из {', '.join(FORMATS)}")
+    # Тело сначала сохраняется во временный файл: архив нельзя разобрать,
+    # не дочитав его до конца, а NDJSON так читается одинаково
+    fd, tmp_path = tempfile.mkstemp(dir=storage.temp_dir, suffix=".import")
+    try:
+        with os.fdopen(fd, 'w+b') as f:
+            async for chunk in request.stream():
+                await run_io(f.write, chunk)
+            f.seek(0)
+            try:
+                added = await run_io(lambda: storage.add_texts(user_id, iter_import(f, format)))
+            except IMPORT_ERRORS as e:
+                raise HTTPException(status_code=400, detail=f"Ошибка импорта: {str(e)}")
+    finally:
+        os.remove(tmp_path)
+    counts = {kind: sum(1 for added_kind, _ in added if added_kind == kind) for kind in KINDS}
+    return {"message": f"Импортировано текстов: {len(added)}", "count": len(added), **counts}
+
+@app.get("/export/{token}")  # Выгрузка текстов потоком: NDJSON, tar или zip
+async def export_texts(token: str, format: str = NDJSON, kind: Union[str, None] = None):
+    user_id = await get_user_id_from_token(token)
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Формат должен быть одним из {', '.join(FORMATS)}")
+    if kind is not None and kind not in KINDS:
+        raise HTTPException(status_code=400, detail=f"kind должен быть одним из {', '.join(KINDS)}")
+    kinds = KINDS if kind is None else (kind,)
+    return StreamingResponse(EXPORTERS[format](storage, user_id, kinds), media_type=MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="texts_{user_id}.{format}"'})
+
+def run_cipher_job(job, decrypt: bool):
+    # Шифрование / дешифрование сохранённого текста в фоне: текст переводится в индексы
+    # один раз, затем обрабатывается отрезками из целых блоков ключа, после каждого —
+    # прогресс и проверка отмены. Шифртекст сохраняется как текст пользователя,
+    # расшифровка — файлом результата задачи. Уже сохранённый шифртекст того же
+    # текста тем же ключом переиспользуется, как в encrypt_stored
+    kind = ENCRYPTED if decrypt else PLAIN
+    digest = None
     try:
-        language = detect_language(data.text)
+        with storage.text_buffer(job.user_id, kind, job.params["text_id"]) as buffer:
+            alphabet, key_matrix, indices = stored_params(buffer, job.params["key"], keep_case=decrypt)
+            if not decrypt and cipher_cache.enabled:
+                digest = cipher_digest(buffer, key_matrix, alphabet)
+    except FileNotFoundError:
+        raise ValueError(f"Текст {job.params['text_id']} не найден")
+    except HTTPException as e:
+        raise ValueError(e.detail)
+    n = key_matrix.shape[0]
+    if digest is not None:
+        size = encrypted_size(indices, n, alphabet)
+        existing = saved_encrypted_file(job.user_id, digest, size)
+        if existing is not None:
+            return {"file": existing, "size": size}
+    segment = JOB_SEGMENT // n * n
+    transform = hill.hill_cipher_decrypt if decrypt else hill.hill_cipher_encrypt
+    if decrypt:
+        path = job_queue.file_path(job.id, ".txt")
+        f = open(path, 'wb')
+    else:
+        fd, path = tempfile.mkstemp(dir=storage.temp_dir, suffix=".part")
+        f = os.fdopen(fd, 'wb')
+    try:
+        with f:
+            for start in range(0, len(indices), segment):
+                f.write(transform(indices[start:start + segment], key_matrix, alphabet, utf8=True))
+                job.progress((start + segment) / len(indices))
+        size = os.path.getsize(path)
+        if decrypt:
+            return {"size": size}
+        encrypted_id = storage.add_text_file(job.user_id, ENCRYPTED, path)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    if digest is not None:
+        cipher_cache.remember_file(job.user_id, digest, encrypted_id)
+    return {"file": encrypted_id, "size": size}
+
+def run_import_job(job):
+    # Импорт загруженного файла; прогресс — доля прочитанных байт. При ошибке или
+    # отмене add_texts удаляет уже добавленные тексты
+    path = job.params["upload"]
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            def tracked():
+                for item in iter_import(f, job.params["format"]):
+                    yield item
+                    job.progress(f.tell() / size if size else 1.0)
+
+            try:
+                added = storage.add_texts(job.user_id, tracked())
+            except IMPORT_ERRORS as e:
+                raise ValueError(f"Ошибка импорта: {str(e)}")
+    finally:
+        remove_upload(job.params)
+    counts = {kind: sum(1 for added_kind, _ in added if added_kind == kind) for kind in KINDS}
+    return {"message": f"Импортировано текстов: {len(added)}", "count": len(added), **counts}
+
+def remove_upload(params: dict):
+    if os.path.exists(params["upload"]):
+        os.remove(params["upload"])
+
+def register_jobs(queue: JobQueue):
+    queue.register("encrypt", lambda job: run_cipher_job(job, decrypt=False))
+    queue.register("decrypt", lambda job: run_cipher_job(job, decrypt=True))
+    queue.register("import", run_import_job, cleanup=remove_upload)
+
+register_jobs(job_queue)
+
+async def find_job(job_id: str, token: str) -> dict:
+    # Чужая задача не отличается от несуществующей
+    user_id = await get_user_id_from_token(token)
+    job = await run_io(job_queue.get, job_id)
+    if job is None or job["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail=f"Задача {job_id} не найдена")
+    return job
+
+def job_status(job: dict) -> dict:
+    return {"job_id": job["id"], "type": job["type"], "state": job["state"], "progress": job["progress"],
+            "priority": job["priority"], "error": job["error"], "result": job["result"],
+            "created_at": job["created_at"], "started_at": job["started_at"], "finished_at": job["finished_at"]}
+
+@app.post("/jobs")  # Фоновое шифрование / дешифрование сохранённого текста; ответ — идентификатор задачи
+async def submit_job(data: JobRequest):
+    user_id = await get_user_id_from_token(data.token)
+    if data.type not in JOB_TYPES:
+        raise HTTPException(status_code=400, detail=f"Тип задачи должен быть одним из {', '.join(JOB_TYPES)}")
+    # Несуществующий текст — ошибка сразу, а не проваленная задача
+    await run_io(stored_text_size, user_id, ENCRYPTED if data.type == "decrypt" else PLAIN, data.text_id)
+    job_id = await run_io(job_queue.submit, user_id, data.type, {"text_id": data.text_id, "key": data.key},
+                          data.priority)
+    return {"job_id": job_id, "state": "queued"}
+
+@app.post("/jobs/import")  # Фоновый импорт: тело как у /import
+async def submit_import_job(request: Request, token: str, format: Union[str, None] = None, priority: int = 0):
+    user_id = await get_user_id_from_token(token)
+    if format is not None and format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Формат должен быть одним из {', '.join(FORMATS)}")
+    fd, upload_path = await run_io(job_queue.temp_file, ".upload")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            async for chunk in request.stream():
+                await run_io(f.write, chunk)
+        job_id = await run_io(job_queue.submit, user_id, "import", {"upload": upload_path, "format": format}, priority)
+    except BaseException:
+        os.remove(upload_path)
+        raise
+    return {"job_id": job_id, "state": "queued"}
+
+@app.get("/jobs/{job_id}")  # Состояние и прогресс задачи
+async def get_job(job_id: str, token: str):
+    return job_status(await find_job(job_id, token))
+
+@app.get("/jobs/{job_id}/result")  # Результат: шифртекст или расшифровка потоком, у импорта — сводка
+async def get_job_result(job_id: str, token: str):
+    job = await find_job(job_id, token)
+    if job["state"] != DONE:
+        raise HTTPException(status_code=409, detail=f"Задача не завершена: {job['state']}")
+    if job["type"] == "encrypt":
+        return StreamingResponse(storage.iter_text_chunks(job["user_id"], ENCRYPTED, job["result"]["file"]),
+                                 media_type="text/plain; charset=utf-8",
+                                 headers={"X-Encrypted-File": job["result"]["file"]})
+    if job["type"] == "decrypt":
+        path = job_queue.file_path(job_id, ".txt")
+        if not os.path.exists(path):
+            raise HTTPException(status_code=410, detail="Результат задачи удалён")
+        return FileResponse(path, media_type="text/plain; charset=utf-8")
+    return job["result"]
+
+@app.post("/jobs/{job_id}/cancel")  # Отмена: задача в очереди снимается сразу, выполняемая — на следующем шаге
+async def cancel_job(job_id: str, token: str):
+    await find_job(job_id, token)
+    state = await run_io(job_queue.cancel, job_id)
+    return {"job_id": job_id, "state": state}
+
+async def analysis_ciphertext(token: str, ciphertext: Union[str, None], text_id: Union[str, None]) -> str:
+    user_id = await get_user_id_from_token(token)
+    if ciphertext:
+        return ciphertext
+    if text_id:
+        return await run_io(read_stored_text, ENCRYPTED, user_id, text_id)
+    raise HTTPException(status_code=400, detail="Не передан ни шифртекст, ни его идентификатор")
+
+@app.post("/analysis/known_plaintext")  # Восстановление ключа по известному открытому тексту
+async def known_plaintext(data: KnownPlaintextRequest):
+    ciphertext = await analysis_ciphertext(data.token, data.ciphertext, data.text_id)
+    alphabet = text_alphabet(ciphertext, data.language)
+    try:
+        key_matrix, blocks = await run_cipher(len(ciphertext), analysis.recover_key, data.plaintext, ciphertext, alphabet,
+                                              data.n, data.offset)
     except ValueError as e:
-        raise HTTPException(status_code=400, detail=f"Не удалось определить язык текста: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"key": analysis.key_to_string(key_matrix), "n": int(key_matrix.shape[0]), "blocks_verified": blocks}
+
+@app.post("/analysis/brute_force")  # Перебор всех ключей 2x2 с оценкой расшифровки по частотам букв
+async def brute_force(data: BruteForceRequest):
+    ciphertext = await analysis_ciphertext(data.token, data.ciphertext, data.text_id)
+    alphabet = text_alphabet(ciphertext, data.language)
+    if not 1 <= data.top <= analysis.TOP_KEYS:
+        raise HTTPException(status_code=400, detail=f"top должен быть от 1 до {analysis.TOP_KEYS}")
     try:
-        key_values = list(map(int, data.key.split()))
-        if len(key_values) != 4:
-            raise ValueError("Ключ должен содержать 4 числа")
-        key_matrix = np.array(key_values).reshape(2, 2)
+        # Перебор всегда вне цикла событий: даже короткий шифртекст — миллион ключей
+        candidates = await workers.cipher_executor.run(analysis.brute_force_2x2, ciphertext, alphabet, data.top, data.reference)
     except ValueError as e:
-        raise HTTPException(status_code=400, detail=f"Неверный формат ключа: {str(e)}")
-    if language == 'english':
-        alphabet = ENGLISH_ALPHABET
-    elif language == 'russian':
-        alphabet = RUSSIAN_ALPHABET
-    else:
-        raise HTTPException(status_code=400, detail="Поддерживаются только английский и русский языки")
-    decrypted_text = hill_cipher_decrypt(data.text, key_matrix, alphabet)
-    return {"message": decrypted_text}
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"candidates": [{"key": analysis.key_to_string(item["key"]), "score": item["score"], "preview": item["preview"]}
+                           for item in candidates]}
+
+@app.get("/cipher/stats")  # Статистика кэшей: обратные матрицы ключей, таблицы малых ключей и результаты шифрования
+async def cipher_stats():
+    return {"inverse_cache": modmath.inverse_cache_stats(), "table_cache": hill.table_cache_stats(),
+            "result_cache": cipher_cache.stats()}
+
+for _name, _doc, _func in (
+        ("kursovaya_result_cache_entries", "Шифртекстов в кэше результатов", lambda: cipher_cache.stats()["entries"]),
+        ("kursovaya_result_cache_bytes", "Объём кэша результатов, байт", lambda: cipher_cache.stats()["bytes"]),
+        ("kursovaya_result_cache_hit_ratio", "Доля попаданий в кэш результатов", lambda: cipher_cache.stats()["hit_ratio"]),
+        ("kursovaya_inverse_cache_size", "Обратных матриц ключей в кэше", lambda: modmath.inverse_cache_stats()["size"]),
+        ("kursovaya_table_cache_size", "Таблиц малых ключей в кэше", lambda: hill.table_cache_stats()["size"]),
+        ("kursovaya_jobs_queued", "Фоновых задач в очереди", lambda: job_queue.queued())):
+    REGISTRY.register(Gauge(_name, _doc, _func))
+
+for _stage in ("import", "warm_up", "ready"):
+    REGISTRY.register(Gauge(f"kursovaya_startup_{_stage}_seconds", f"Запуск: {_stage}, с",
+                            lambda stage_name=_stage: startup.get(stage_name, 0.0)))
+REGISTRY.register(Gauge("kursovaya_ready", "1 после прогрева", lambda: float("ready" in startup)))
+
+@app.get("/ready")  # Готовность: 200 после прогрева, до него — 503
+async def ready():
+    if "ready" not in startup:
+        raise HTTPException(status_code=503, detail="Сервер прогревается")
+    return {"status": "ready", "startup_seconds": startup, "module_load_seconds": lazy.load_seconds}
+
+@app.get("/metrics")  # Метрики в текстовом формате Prometheus
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/get_user_id/{token}")  # Получение user_id по токену
-def get_user_id(token: str):
-    user_id, user_login = token_search(token)
+async def get_user_id(token: str):
+    user_id, user_login = await find_user(token)
     if user_id is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
-    return {"user_id": user_id}
\ No newline at end of file
+    return {"user_id": user_id}
+
+startup["import"] = time.perf_counter() - IMPORT_STARTED
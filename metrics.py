@@ -0,0 +1,185 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+# Метрики в текстовом формате Prometheus (0.0.4) без сторонних пакетов.
+# Метрика с метками хранит значения по кортежу значений меток
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1 << 20, 4 << 20, 16 << 20, 64 << 20, 256 << 20)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # метки -> [счётчики по корзинам..., +Inf, сумма]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def count(self, **labels) -> int:
+        counts = self._values.get(tuple(labels[name] for name in self.labelnames))
+        return sum(counts[:-1]) if counts else 0
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._values.items())
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_value(float(bound))
+                labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    # Значение берётся функцией в момент выдачи метрик (размеры кэшей и т.п.)
+    def __init__(self, name: str, documentation: str, func):
+        self.name, self.documentation, self.func = name, documentation, func
+
+    def render(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_format_value(self.func())}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+requests_total = REGISTRY.register(Counter(
+    "kursovaya_requests_total", "Число запросов по маршруту и коду ответа", ("method", "route", "status")))
+request_seconds = REGISTRY.register(Histogram(
+    "kursovaya_request_duration_seconds", "Время обработки запроса", ("method", "route")))
+payload_bytes = REGISTRY.register(Histogram(
+    "kursovaya_payload_bytes", "Размер тела запроса и ответа", ("route", "direction"), SIZE_BUCKETS))
+stage_seconds = REGISTRY.register(Histogram(
+    "kursovaya_stage_duration_seconds", "Время этапов обработки: auth, detect_language, key_parse, "
+    "encode, matmul, decode, storage_write", ("stage",)))
+
+
+def stage(name: str):
+    # with stage("matmul"): ...
+    return stage_seconds.time(stage=name)
+
+
+def timed(name: str, func):
+    # Обёртка для run_io / run_cipher: время считается в потоке, где идёт работа,
+    # без ожидания в очереди пула
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with stage_seconds.time(stage=name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class MetricsMiddleware:
+    # ASGI-прослойка: время, код ответа и размеры тел по шаблону маршрута
+    # (/view_texts/{token}, а не путь с токеном — иначе меток было бы без счёта)
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        sizes = {"request": 0, "response": 0}
+        status = {"code": 500}
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                sizes["request"] += len(message.get("body", b''))
+            return message
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                sizes["response"] += len(message.get("body", b''))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            request_seconds.observe(time.perf_counter() - start, method=method, route=route)
+            requests_total.inc(method=method, route=route, status=str(status["code"]))
+            for direction, size in sizes.items():
+                if size:
+                    payload_bytes.observe(size, route=route, direction=direction)
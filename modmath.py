@@ -0,0 +1,57 @@
+from functools import lru_cache
+
+import numpy as np
+
+INVERSE_CACHE_SIZE = 1024
+
+
+def _matrix_inverse_mod(rows, mod: int):
+    # Гаусс-Жордан над Z_mod в целых числах Python. Модуль может быть составным
+    # (32), поэтому ведущий элемент получаем алгоритмом Евклида над строками,
+    # а не делением
+    n = len(rows)
+    a = [[value % mod for value in row] + [int(i == j) for j in range(n)] for i, row in enumerate(rows)]
+    for col in range(n):
+        for row in range(col + 1, n):
+            while a[row][col]:
+                q = a[col][col] // a[row][col]
+                a[col] = [(x - q * y) % mod for x, y in zip(a[col], a[row])]
+                a[col], a[row] = a[row], a[col]
+        try:
+            pivot_inv = pow(a[col][col], -1, mod)
+        except ValueError:
+            raise ValueError("Матрица ключа необратима по модулю размера алфавита") from None
+        a[col] = [(x * pivot_inv) % mod for x in a[col]]
+        for row in range(n):
+            factor = a[row][col]
+            if row != col and factor:
+                a[row] = [(x - factor * y) % mod for x, y in zip(a[row], a[col])]
+    return [row[n:] for row in a]
+
+
+@lru_cache(maxsize=INVERSE_CACHE_SIZE)
+def _cached_inverse(key_bytes: bytes, n: int, mod: int) -> np.ndarray:
+    matrix = np.frombuffer(key_bytes, dtype=np.int64).reshape(n, n)
+    inverse = np.array(_matrix_inverse_mod(matrix.tolist(), mod), dtype=np.int64)
+    inverse.flags.writeable = False  # Значение из кэша общее для всех запросов
+    return inverse
+
+
+def mod_inverse(matrix: np.ndarray, mod: int) -> np.ndarray:
+    matrix = np.ascontiguousarray(matrix, dtype=np.int64) % mod
+    if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+        raise ValueError("Матрица ключа должна быть квадратной")
+    return _cached_inverse(matrix.tobytes(), matrix.shape[0], mod)
+
+
+def is_invertible_mod(matrix: np.ndarray, mod: int) -> bool:
+    try:
+        mod_inverse(matrix, mod)
+    except ValueError:
+        return False
+    return True
+
+
+def inverse_cache_stats() -> dict:
+    info = _cached_inverse.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
@@ -0,0 +1,360 @@
+from __future__ import annotations  # Аннотации np.ndarray не загружают NumPy
+
+import io
+import itertools
+import logging
+import os
+import struct
+import zlib
+from functools import lru_cache
+
+from lazy import LazyModule
+
+# Чтение заголовков и обычных или сжатых текстов обходится без NumPy: хранилище
+# импортирует этот модуль при старте, а NumPy нужен только для упаковки
+np = LazyModule("numpy")
+codec = LazyModule("codec")
+
+try:
+    import zstandard  # Необязательно: без него сжатие только zlib
+except ImportError:
+    zstandard = None
+
+# Компактный формат текстов в хранилище. Заголовок: сигнатура, формат, номер
+# алфавита, размер ключа (0 — неизвестен), число битов дополнения в последнем
+# байте, длина (символов у PACKED, байт UTF-8 у сжатых) и CRC32 данных после
+# заголовка. Текст без сигнатуры — обычный UTF-8, поэтому старые файлы читаются как раньше
+MAGIC = b'\x00HLP'
+HEADER = struct.Struct('<4sBBBBQI')
+PACKED, ZLIB, ZSTD = 1, 2, 3
+COMPRESSIONS = {'zlib': ZLIB, 'zstd': ZSTD}
+ALPHABET_LANGUAGES = {1: 'english', 2: 'russian'}  # Номер алфавита в заголовке -> codec.LANGUAGE_ALPHABETS
+SYMBOL_UTF8_BYTES = {1: 1, 2: 2}  # Байт UTF-8 на символ алфавита: размер текста без загрузки кодека
+SYMBOL_BITS = 5  # В обоих алфавитах не больше 32 символов
+GROUP = 8  # 8 символов по 5 бит — ровно 5 байт
+GROUP_BYTES = GROUP * SYMBOL_BITS // 8
+DECODE_CHUNK = 1 << 20  # Байт хранимых данных на шаг decode()
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# KURSOVAYA_PACK_CIPHERTEXTS=1 — шифртексты по 5 бит на символ;
+# KURSOVAYA_TEXT_COMPRESSION=zlib / zstd — сжатие открытых текстов
+PACK_CIPHERTEXTS = os.environ.get("KURSOVAYA_PACK_CIPHERTEXTS", "0") == "1"
+TEXT_COMPRESSION = os.environ.get("KURSOVAYA_TEXT_COMPRESSION") or None
+
+
+def _symbol_table(alphabet: str) -> np.ndarray:
+    # Только символы самого алфавита, без приведения регистра (в отличие от
+    # exact_table кодека): упакованный текст должен распаковываться в тот же
+    table = np.full(codec.TABLE_SIZE + 1, -1, dtype=np.int16)
+    for index, char in enumerate(alphabet):
+        table[ord(char)] = index
+    return table
+
+
+@lru_cache(maxsize=None)
+def symbol_tables() -> dict:
+    # {номер алфавита: таблица}; строятся при первой упаковке
+    return {number: _symbol_table(alphabet(number)) for number in ALPHABET_LANGUAGES}
+
+
+@lru_cache(maxsize=None)
+def _shifts():
+    return [np.uint64(SYMBOL_BITS * (GROUP - 1 - k)) for k in range(GROUP)]
+
+
+def packed_size(count: int) -> int:
+    return (count * SYMBOL_BITS + 7) // 8
+
+
+def pack_indices(indices: np.ndarray) -> bytes:
+    # Старшие биты первыми, как у np.packbits: 8 символов собираются сдвигами в
+    # 40-битное число и пишутся 5 байтами big-endian (в разы быстрее unpackbits/packbits)
+    count = len(indices)
+    groups = np.zeros((-(-count // GROUP), GROUP), dtype=np.uint8)
+    groups.ravel()[:count] = indices
+    values = np.zeros(len(groups), dtype=np.uint64)
+    for k, shift in enumerate(_shifts()):
+        values |= groups[:, k].astype(np.uint64) << shift
+    return values.astype('>u8').view(np.uint8).reshape(-1, 8)[:, 8 - GROUP_BYTES:].tobytes()[:packed_size(count)]
+
+
+def unpack_indices(data, count: int) -> np.ndarray:
+    if len(data) != packed_size(count):
+        raise ValueError("Повреждён текст: длина данных не совпадает с заголовком")
+    group_count = -(-count // GROUP)
+    padded = np.zeros(group_count * GROUP_BYTES, dtype=np.uint8)
+    padded[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+    raw = np.zeros((group_count, 8), dtype=np.uint8)
+    raw[:, 8 - GROUP_BYTES:] = padded.reshape(-1, GROUP_BYTES)
+    values = raw.view('>u8').ravel()
+    out = np.empty((group_count, GROUP), dtype=np.uint8)
+    mask = np.uint64((1 << SYMBOL_BITS) - 1)
+    for k, shift in enumerate(_shifts()):
+        out[:, k] = (values >> shift) & mask
+    return out.ravel()[:count]
+
+
+def make_header(fmt: int, length: int, crc: int, alphabet_id: int = 0, key_size: int = 0, pad_bits: int = 0) -> bytes:
+    return HEADER.pack(MAGIC, fmt, alphabet_id, key_size, pad_bits, length, crc)
+
+
+def read_header(head):
+    # (формат, номер алфавита, размер ключа, биты дополнения, длина, CRC32) или None для обычного текста
+    if len(head) < HEADER.size or bytes(head[:len(MAGIC)]) != MAGIC:
+        return None
+    return HEADER.unpack(bytes(head[:HEADER.size]))[1:]
+
+
+def text_size(head, stored_size: int) -> int:
+    # Размер текста в UTF-8 по началу хранимых данных, без их чтения целиком
+    header = read_header(head)
+    if header is None:
+        return stored_size
+    fmt, alphabet_id, _, _, length, _ = header
+    if fmt == PACKED:
+        if alphabet_id not in SYMBOL_UTF8_BYTES:
+            raise ValueError(f"Неизвестный алфавит в заголовке: {alphabet_id}")
+        return length * SYMBOL_UTF8_BYTES[alphabet_id]
+    return length
+
+
+def alphabet(alphabet_id: int) -> str:
+    if alphabet_id not in ALPHABET_LANGUAGES:
+        raise ValueError(f"Неизвестный алфавит в заголовке: {alphabet_id}")
+    return codec.LANGUAGE_ALPHABETS[ALPHABET_LANGUAGES[alphabet_id]]
+
+
+class _Packer:
+    # PACKED по кускам строки: целые группы по 8 символов сразу пишутся 5 байтами,
+    # остаток — со следующим куском. None вместо байт — в тексте есть символ не из
+    # алфавита или текст пуст, упаковать нельзя
+    def __init__(self, key_size: int = 0):
+        self.tables = symbol_tables()
+        self.alphabet_id = None
+        self.key_size = key_size
+        self.count = 0
+        self.rest = np.empty(0, dtype=np.uint8)
+
+    def feed(self, piece: str):
+        if not piece:
+            return b''
+        clamped = codec.clamp_codepoints(codec.text_to_codepoints(piece))
+        if self.alphabet_id is None:
+            self.alphabet_id = next((number for number, table in self.tables.items() if table[clamped[0]] >= 0), None)
+            if self.alphabet_id is None:
+                return None
+        indices = self.tables[self.alphabet_id][clamped]
+        if (indices < 0).any():
+            return None
+        indices = np.concatenate([self.rest, indices.astype(np.uint8)])
+        whole = len(indices) // GROUP * GROUP
+        self.rest = indices[whole:]
+        self.count += whole
+        return pack_indices(indices[:whole])
+
+    def finish(self):
+        if self.alphabet_id is None:
+            return None
+        self.count += len(self.rest)
+        return pack_indices(self.rest)
+
+    def header(self, crc: int, size: int) -> bytes:
+        pad_bits = size * 8 - self.count * SYMBOL_BITS
+        return make_header(PACKED, self.count, crc, self.alphabet_id, self.key_size, pad_bits)
+
+
+class _Compressor:
+    def __init__(self, compression: str):
+        self.fmt = COMPRESSIONS[compression]
+        if compression == 'zstd':
+            self.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            self.compressor = zlib.compressobj(ZLIB_LEVEL)
+        self.length = 0
+
+    def feed(self, chunk) -> bytes:
+        self.length += len(chunk)
+        return self.compressor.compress(chunk)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush()
+
+    def header(self, crc: int, size: int) -> bytes:
+        return make_header(self.fmt, self.length, crc)
+
+
+def _encode_stream(encoder, pieces, out) -> bool:
+    # Куски текста -> заголовок и данные в файл out (с seek). Место заголовка
+    # занимается сразу, сам он с длиной и CRC32 пишется в конце. False, если
+    # encoder отказался (в out тогда мусор)
+    start = out.tell()
+    out.write(bytes(HEADER.size))
+    crc = size = 0
+    for piece in itertools.chain(pieces, [None]):
+        chunk = encoder.feed(piece) if piece is not None else encoder.finish()
+        if chunk is None:
+            return False
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        out.write(chunk)
+    end = out.tell()
+    out.seek(start)
+    out.write(encoder.header(crc, size))
+    out.seek(end)
+    return True
+
+
+def _encode(encoder, pieces):
+    out = io.BytesIO()
+    return out.getvalue() if _encode_stream(encoder, pieces, out) else None
+
+
+def _utf8_pieces(data):
+    # Куски строки из строки или байтов UTF-8 (bytes, mmap)
+    if isinstance(data, str):
+        return (data[start:start + codec.UTF8_CHUNK] for start in range(0, len(data), codec.UTF8_CHUNK))
+    return codec.iter_utf8(data)
+
+
+def pack_text(data, key_size: int = 0):
+    # Текст только из символов одного алфавита (шифртекст) — в PACKED; None, если
+    # в тексте есть другие символы или он пуст. data — строка или байты UTF-8 (bytes, mmap).
+    # По кускам: промежуточные массивы остаются в кэше процессора
+    pieces = _utf8_pieces(data)
+    try:
+        return _encode(_Packer(key_size), pieces)
+    finally:
+        pieces.close()  # Отпускает отображённый файл, даже если упаковка прервана
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    return _encode(_Compressor(compression), [data])
+
+
+class _Unpacker:
+    # PACKED по кускам: целые группы по 5 байт сразу, остаток — со следующим куском
+    def __init__(self, alphabet_id: int, count: int):
+        self.codec = codec.get_codec(alphabet(alphabet_id))
+        self.left = count
+        self.rest = b''
+
+    def feed(self, chunk) -> bytes:
+        data = self.rest + bytes(chunk)
+        groups = min(len(data) // GROUP_BYTES, self.left // GROUP)
+        self.rest = data[groups * GROUP_BYTES:]
+        self.left -= groups * GROUP
+        return self.codec.decode_utf8(unpack_indices(data[:groups * GROUP_BYTES], groups * GROUP))
+
+    def finish(self) -> bytes:
+        return self.codec.decode_utf8(unpack_indices(self.rest, self.left))
+
+
+class _Decompressor:
+    def __init__(self, fmt: int, length: int):
+        if fmt == ZSTD:
+            if zstandard is None:
+                raise ValueError("Текст сжат zstd, а пакет zstandard не установлен")
+            self.decompressor = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            self.decompressor = zlib.decompressobj()
+        self.length = length
+        self.size = 0
+
+    def feed(self, chunk) -> bytes:
+        piece = self.decompressor.decompress(chunk)
+        self.size += len(piece)
+        return piece
+
+    def finish(self) -> bytes:
+        piece = self.decompressor.flush()
+        if self.size + len(piece) != self.length:
+            raise ValueError("Повреждён текст: длина данных не совпадает с заголовком")
+        return piece
+
+
+def iter_decoded(chunks):
+    # Куски хранимых данных -> куски текста в UTF-8. Обычный текст проходит как есть,
+    # упакованный и сжатый декодируются по мере чтения; несовпадение CRC32 —
+    # ValueError после последнего куска
+    chunks = iter(chunks)
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= HEADER.size:
+            break
+    header = read_header(head)
+    if header is None:
+        if head:
+            yield head
+        yield from chunks
+        return
+    fmt, alphabet_id, _, _, length, crc = header
+    if fmt == PACKED:
+        decoder = _Unpacker(alphabet_id, length)
+    elif fmt in (ZLIB, ZSTD):
+        decoder = _Decompressor(fmt, length)
+    else:
+        raise ValueError(f"Неизвестный формат текста: {fmt}")
+    checksum = 0
+    for chunk in itertools.chain([head[HEADER.size:]], chunks):
+        checksum = zlib.crc32(chunk, checksum)
+        piece = decoder.feed(chunk)
+        if piece:
+            yield piece
+    tail = decoder.finish()
+    if checksum != crc:
+        raise ValueError("Повреждён текст: контрольная сумма не совпадает")
+    if tail:
+        yield tail
+
+
+def decode(data) -> bytes:
+    # Хранимые данные целиком -> текст в UTF-8
+    if read_header(data) is None:
+        return data
+    with memoryview(data) as view:  # Данные после заголовка не копируются, декодируются по кускам
+        return b''.join(iter_decoded(view[start:start + DECODE_CHUNK] for start in range(0, len(view), DECODE_CHUNK)))
+
+
+class TextFormat:
+    # Как тексты записываются в хранилище: pack — шифртексты по 5 бит на символ,
+    # compression — 'zlib' / 'zstd' для открытых текстов. Чтение от настроек не
+    # зависит: формат узнаётся по заголовку
+
+    def __init__(self, pack: bool = PACK_CIPHERTEXTS, compression: str = TEXT_COMPRESSION):
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"Неизвестное сжатие: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            logging.warning("Пакет zstandard не установлен: вместо zstd используется zlib")
+            compression = 'zlib'
+        self.pack, self.compression = pack, compression
+
+    def applies(self, ciphertext: bool) -> bool:
+        return self.pack if ciphertext else self.compression is not None
+
+    def encode(self, data, ciphertext: bool) -> bytes:
+        # data — строка или байты UTF-8; результат — что записать в хранилище
+        if ciphertext and self.pack:
+            packed = pack_text(data)
+            if packed is not None:
+                return packed
+        if not ciphertext and self.compression is not None and len(data):
+            return compress(data.encode('utf-8') if isinstance(data, str) else bytes(data), self.compression)
+        return data.encode('utf-8') if isinstance(data, str) else bytes(data)
+
+    def encode_file(self, data, out, ciphertext: bool) -> bool:
+        # То же, что encode, для байтов UTF-8 (bytes, mmap) с записью в файл out по
+        # кускам, без результата целиком в памяти. False, если формат к тексту не
+        # применяется — тогда хранится исходный текст, а out не нужен
+        if ciphertext and self.pack:
+            pieces = codec.iter_utf8(data)
+            try:
+                return _encode_stream(_Packer(), pieces, out)
+            finally:
+                pieces.close()
+        if not ciphertext and self.compression is not None and len(data):
+            with memoryview(data) as view:
+                return _encode_stream(_Compressor(self.compression), (
+                    view[start:start + DECODE_CHUNK] for start in range(0, len(view), DECODE_CHUNK)), out)
+        return False
@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from codec import get_codec
+from hill import hill_cipher_encrypt, hill_cipher_decrypt, hill_transform
+from metrics import stage
+from modmath import mod_inverse
+
+# Число процессов для крупных текстов; 1 — параллельный путь выключен
+CIPHER_PROCESSES = int(os.environ.get("KURSOVAYA_CIPHER_PROCESSES", str(os.cpu_count() or 1)))
+# С какой длины текста (в символах) шифрование делится между процессами:
+# на коротких текстах запуск задач дороже самого умножения
+PARALLEL_THRESHOLD = int(os.environ.get("KURSOVAYA_PARALLEL_THRESHOLD", str(4 << 20)))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(processes: int) -> ProcessPoolExecutor:
+    # Пулы создаются лениво и живут до shutdown(). spawn, а не fork: сервер
+    # многопоточный, и fork мог бы скопировать захваченные блокировки
+    with _pools_lock:
+        pool = _pools.get(processes)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+            _pools[processes] = pool
+        return pool
+
+
+def shutdown():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _pools.clear()
+
+
+def _transform_segment(shm_name: str, shape, start: int, stop: int, key_bytes: bytes, mod: int):
+    # Выполняется в дочернем процессе: блоки [start, stop) общего буфера
+    # заменяются результатом; через pickle передаются только имя и границы
+    n = shape[1]
+    key_matrix = np.frombuffer(key_bytes, dtype=np.int64).reshape(n, n)
+    shm = SharedMemory(name=shm_name)
+    try:
+        blocks = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        blocks[start:stop] = hill_transform(blocks[start:stop], key_matrix, mod)
+        del blocks
+    finally:
+        shm.close()
+
+
+def hill_cipher_parallel(text: str, key_matrix: np.ndarray, alphabet: str, decrypt: bool = False,
+                         processes: int = None, utf8: bool = False):
+    # Блоки шифра Хилла независимы, поэтому текст делится на отрезки целых
+    # блоков; результат совпадает с hill_cipher_encrypt / hill_cipher_decrypt
+    processes = processes or CIPHER_PROCESSES
+    codec = get_codec(alphabet)
+    n = key_matrix.shape[0]
+    with stage("encode"):
+        indices = codec.pad(codec.encode(text, keep_case=decrypt), n)
+    if decrypt:
+        key_matrix = mod_inverse(key_matrix, codec.size)
+    key_bytes = (np.ascontiguousarray(key_matrix, dtype=np.int64) % codec.size).tobytes()
+    shape = (len(indices) // n, n)
+    if shape[0] < processes:
+        with stage("matmul"):
+            out = hill_transform(indices.reshape(shape), key_matrix, codec.size)
+        with stage("decode"):
+            return codec.decode_utf8(out) if utf8 else codec.decode(out)
+    shm = SharedMemory(create=True, size=len(indices))
+    try:
+        blocks = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        blocks.ravel()[:] = indices
+        del indices
+        pool = get_pool(processes)
+        bounds = np.linspace(0, shape[0], processes + 1, dtype=np.int64)
+        with stage("matmul"):  # Метрики дочерних процессов не видны: время меряется здесь, до последнего отрезка
+            futures = [pool.submit(_transform_segment, shm.name, shape, int(start), int(stop), key_bytes, codec.size)
+                       for start, stop in zip(bounds[:-1], bounds[1:])]
+            for future in futures:
+                future.result()
+        with stage("decode"):
+            result = codec.decode_utf8(blocks) if utf8 else codec.decode(blocks)
+        del blocks
+    finally:
+        shm.close()
+        shm.unlink()
+    return result
+
+
+def cipher_text(text: str, key_matrix: np.ndarray, alphabet: str, decrypt: bool = False, utf8: bool = False):
+    # Крупные тексты — в пуле процессов, остальные — в текущем потоке.
+    # utf8=True — результат байтами UTF-8, иначе строкой
+    if CIPHER_PROCESSES > 1 and len(text) >= PARALLEL_THRESHOLD:
+        return hill_cipher_parallel(text, key_matrix, alphabet, decrypt, utf8=utf8)
+    if decrypt:
+        return hill_cipher_decrypt(text, key_matrix, alphabet, utf8)
+    return hill_cipher_encrypt(text, key_matrix, alphabet, utf8)
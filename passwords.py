@@ -0,0 +1,80 @@
+import logging
+import os
+import threading
+
+from lazy import LazyModule
+from workers import BoundedExecutor
+
+# passlib и бэкенд bcrypt загружаются при первом хешировании или при прогреве сервера
+passlib_context = LazyModule("passlib.context")
+
+# Схема новых хешей и её стоимость (для bcrypt — log2 числа раундов,
+# для pbkdf2_sha256 — число итераций); None — значение passlib по умолчанию
+PASSWORD_SCHEME = os.environ.get("KURSOVAYA_PASSWORD_SCHEME", "bcrypt")
+PASSWORD_ROUNDS = os.environ.get("KURSOVAYA_PASSWORD_ROUNDS")
+FALLBACK_SCHEME = "pbkdf2_sha256"
+LEGACY_SCHEME = "hex_sha256"  # Прежний формат: sha256(пароль).hexdigest() без соли
+HASH_WORKERS = int(os.environ.get("KURSOVAYA_HASH_WORKERS", "2"))
+# passlib пишет трассировку при проверке версии bcrypt >= 4.1; сама схема при этом работает или заменяется запасной
+logging.getLogger("passlib.handlers.bcrypt").setLevel(logging.ERROR)
+
+
+def _scheme_works(scheme: str) -> bool:
+    # passlib 1.7 не работает с bcrypt >= 4.1 (ошибка при самопроверке бэкенда)
+    try:
+        context = passlib_context.CryptContext(schemes=[scheme])
+        return context.verify("check", context.hash("check"))
+    except Exception as e:
+        logging.warning(f"Схема хеширования {scheme} недоступна: {e}")
+        return False
+
+
+def make_context(scheme: str = PASSWORD_SCHEME, rounds=PASSWORD_ROUNDS):
+    # Хеши всех схем, кроме основной, считаются устаревшими: при входе
+    # пароль проверяется и пересчитывается основной схемой
+    if not _scheme_works(scheme):
+        logging.warning(f"Вместо {scheme} используется {FALLBACK_SCHEME}")
+        scheme, rounds = FALLBACK_SCHEME, None  # Стоимость другой схемы сюда не подходит
+    schemes = [scheme] + [other for other in (FALLBACK_SCHEME, LEGACY_SCHEME) if other != scheme]
+    settings = {f"{scheme}__rounds": int(rounds)} if rounds else {}
+    return passlib_context.CryptContext(schemes=schemes, default=scheme, deprecated=schemes[1:], **settings)
+
+
+class PasswordHasher:
+    # Хеширование и проверка паролей в отдельном пуле потоков: медленный KDF
+    # не занимает цикл событий и пулы хранилища и шифрования. Без context
+    # CryptContext строится при первом обращении (в пуле, а не в цикле событий)
+
+    def __init__(self, context=None, workers: int = HASH_WORKERS):
+        self._context = context
+        self._context_lock = threading.Lock()
+        self.executor = BoundedExecutor(workers, "password-hash")
+
+    @property
+    def context(self):
+        if self._context is None:
+            with self._context_lock:
+                if self._context is None:
+                    self._context = make_context()
+        return self._context
+
+    @property
+    def scheme(self) -> str:
+        return self.context.default_scheme()
+
+    async def warm_up(self):
+        await self.executor.run(lambda: self.context)
+
+    async def hash(self, password: str) -> str:
+        return await self.executor.run(lambda: self.context.hash(password))
+
+    async def verify(self, password: str, stored_hash: str):
+        # (пароль верен, новый хеш или None); новый хеш — если запись в
+        # устаревшем формате или со старой стоимостью
+        try:
+            return await self.executor.run(lambda: self.context.verify_and_update(password, stored_hash))
+        except ValueError:  # Хеш не распознан ни одной схемой
+            return False, None
+
+    def shutdown(self):
+        self.executor.shutdown()
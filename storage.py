@@ -0,0 +1,820 @@
+import argparse
+import io
+import json
+import logging
+import mmap
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from durable import ALWAYS, BATCH, DURABILITY, NONE, TEMP_SUFFIX, AtomicWriter, remove_stale_temp
+from packed import COMPRESSIONS, HEADER, TextFormat, decode, iter_decoded, read_header, text_size
+from user_index import UserIndex
+
+try:
+    import fcntl  # Блокировка индекса между процессами (нет в Windows)
+except ImportError:
+    fcntl = None
+
+PLAIN = 'plain'  # Тексты пользователя (user_text/)
+ENCRYPTED = 'encrypted'  # Зашифрованные тексты (encrypted_text/)
+KINDS = (PLAIN, ENCRYPTED)
+READ_CHUNK_SIZE = 1 << 20
+INDEX_NAME = '.index'
+RECORD_SIZE = 64
+# Режим fsync (durable.py) для SQLite: batch — как прежде, NORMAL в режиме WAL
+SQLITE_SYNCHRONOUS = {ALWAYS: 'FULL', BATCH: 'NORMAL', NONE: 'OFF'}
+
+_text_name_re = re.compile(r'^text_(\d+)(?:_(\d+))?\.txt$')
+
+
+def text_sort_key(text_id: str):
+    # text_1700000000.txt, text_1700000000_1.txt — по числам, остальные имена в конце
+    match = _text_name_re.match(text_id)
+    if match is None:
+        return (1, 0, 0, text_id)
+    return (0, int(match.group(1)), int(match.group(2) or 0), text_id)
+
+
+def check_text_id(text_id: str):
+    if not text_id or os.path.basename(text_id) != text_id or text_id in ('.', '..') or text_id.startswith('.'):
+        raise ValueError("Неверный идентификатор текста")
+
+
+class Storage:
+    # Хранилище пользователей и текстов. kind — PLAIN или ENCRYPTED,
+    # text_id — строка вида text_<n>.txt, уникальная в пределах пользователя.
+    # Тексты пишутся в формате text_format (packed.py), читаются всегда как UTF-8
+    temp_dir = None  # Где создавать временные файлы для add_text_file
+    text_format = TextFormat(pack=False, compression=None)
+
+    def build(self):
+        pass
+
+    def close(self):
+        pass
+
+    def remove_temp_files(self) -> int:
+        # Удаление временных файлов, брошенных упавшим процессом; вызывается при запуске
+        return 0
+
+    def find_user_by_token(self, token: str):
+        raise NotImplementedError
+
+    def find_user_by_login(self, login: str):
+        raise NotImplementedError
+
+    def create_user(self, login: str, password: str, token: str) -> dict:
+        # None, если логин уже занят (в том числе параллельной регистрацией)
+        raise NotImplementedError
+
+    def update_password(self, user_id: int, password: str):
+        # password — уже готовый хеш
+        raise NotImplementedError
+
+    def add_text(self, user_id: int, kind: str, text: str) -> str:
+        raise NotImplementedError
+
+    def add_text_file(self, user_id: int, kind: str, path: str) -> str:
+        # Забирает готовый файл (UTF-8) как новый текст; исходный файл удаляется
+        raise NotImplementedError
+
+    def add_texts(self, user_id: int, items):
+        # Массовое добавление: items — пары (kind, text), читаются по одной.
+        # Всё или ничего: при ошибке (в том числе внутри items) уже добавленные
+        # тексты удаляются. Возвращает [(kind, text_id)] в порядке items
+        added = []
+        try:
+            for kind, text in items:
+                added.append((kind, self.add_text(user_id, kind, text)))
+        except BaseException:
+            for kind, text_id in reversed(added):
+                self.delete_text(user_id, kind, text_id)
+            raise
+        return added
+
+    def list_texts(self, user_id: int, kind: str):
+        # Идентификаторы текстов от старых к новым
+        raise NotImplementedError
+
+    def has_texts(self, user_id: int, kind: str) -> bool:
+        return bool(self.list_texts(user_id, kind))
+
+    def last_text_id(self, user_id: int, kind: str):
+        text_ids = self.list_texts(user_id, kind)
+        return text_ids[-1] if text_ids else None
+
+    def page_texts(self, user_id: int, kind: str, after=None, limit: int = 100):
+        # Страница метаданных текстов после курсора after: ([{"id", "size", "created_at"}], курсор
+        # следующей страницы или None). Курсор непрозрачен для клиента
+        raise NotImplementedError
+
+    def text_info(self, user_id: int, kind: str, text_id: str):
+        # {"id", "size", "stored_size", "created_at"} или None, если текста нет;
+        # size — размер текста в UTF-8, stored_size — сколько он занимает в хранилище
+        raise NotImplementedError
+
+    def read_text(self, user_id: int, kind: str, text_id: str):
+        # None, если текста нет
+        raise NotImplementedError
+
+    def iter_text_chunks(self, user_id: int, kind: str, text_id: str, chunk_size: int = READ_CHUNK_SIZE):
+        raise NotImplementedError
+
+    @contextmanager
+    def text_buffer(self, user_id: int, kind: str, text_id: str):
+        # Содержимое текста в UTF-8 как объект с буферным протоколом, без
+        # декодирования в строку; FileNotFoundError, если текста нет
+        yield b''.join(self.iter_text_chunks(user_id, kind, text_id))
+
+    def update_text(self, user_id: int, kind: str, text_id: str, text: str):
+        raise NotImplementedError
+
+    def delete_text(self, user_id: int, kind: str, text_id: str):
+        raise NotImplementedError
+
+    def _encoded_file(self, path: str, kind: str):
+        # Готовый файл в UTF-8 -> путь к скрытому временному файлу рядом с ним в формате
+        # хранения или None, если формат к нему не применяется. Кодируется по кускам,
+        # ни текст, ни результат целиком в памяти не держатся
+        if not self.text_format.applies(kind == ENCRYPTED) or os.path.getsize(path) == 0:
+            return None
+        folder, name = os.path.split(path)
+        encoded_path = os.path.join(folder, f".{name}{TEMP_SUFFIX}")
+        try:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer, \
+                    open(encoded_path, 'wb') as out:
+                encoded = self.text_format.encode_file(buffer, out, kind == ENCRYPTED)
+        except BaseException:
+            if os.path.exists(encoded_path):
+                os.remove(encoded_path)
+            raise
+        if not encoded:
+            os.remove(encoded_path)
+            return None
+        return encoded_path
+
+
+class TextIndex:
+    # Индекс текстов одной папки: файл .index из записей по RECORD_SIZE байт.
+    # Запись 0 — заголовок {"next": следующий номер текста, "mtime": mtime папки},
+    # дальше имена текстов от старых к новым. Добавление, поиск и удаление
+    # последнего текста — O(1): дописать, прочитать или отрезать последнюю запись.
+    # Если mtime папки не совпадает с заголовком, папку меняли вне индекса,
+    # и он перестраивается по os.listdir
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.path = os.path.join(folder, INDEX_NAME)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(os.open(self.path, os.O_RDWR | os.O_CREAT), 'r+b') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                header = self._read_header(f)
+                if header is None or header["mtime"] != self._dir_mtime():
+                    header = self._rebuild(f, header)
+                yield f, header
+
+    def _dir_mtime(self):
+        return os.stat(self.folder).st_mtime_ns
+
+    def _read_header(self, f):
+        f.seek(0)
+        record = f.read(RECORD_SIZE)
+        try:
+            return json.loads(record)
+        except ValueError:
+            return None
+
+    def _write_header(self, f, next_seq: int):
+        header = {"next": next_seq, "mtime": self._dir_mtime()}
+        f.seek(0)
+        f.write(self._record(json.dumps(header)))
+        return header
+
+    def _record(self, value: str) -> bytes:
+        return value.encode('utf-8').ljust(RECORD_SIZE - 1) + b'\n'
+
+    def _rebuild(self, f, header):
+        names = []
+        for name in sorted(os.listdir(self.folder), key=text_sort_key):
+            if name.startswith('.'):
+                continue
+            if len(name.encode('utf-8')) >= RECORD_SIZE:
+                logging.warning(f"Файл {name} пропущен: слишком длинное имя для индекса")
+                continue
+            names.append(name)
+        numbers = [text_sort_key(name)[1] for name in names]
+        next_seq = max([header["next"] if header else 1] + [number + 1 for number in numbers])
+        f.seek(RECORD_SIZE)
+        f.write(b''.join(self._record(name) for name in names))
+        f.truncate()
+        return self._write_header(f, next_seq)
+
+    def _last(self, f):
+        size = f.seek(0, os.SEEK_END)
+        if size < 2 * RECORD_SIZE:
+            return None
+        f.seek(size - RECORD_SIZE)
+        return f.read(RECORD_SIZE).decode('utf-8').rstrip()
+
+    def add(self, create) -> str:
+        # create(path) создаёт файл текста; имя — следующий номер, который ещё не занят
+        with self._locked() as (f, header):
+            seq = header["next"]
+            while os.path.exists(os.path.join(self.folder, f"text_{seq}.txt")):
+                seq += 1
+            name = f"text_{seq}.txt"
+            create(os.path.join(self.folder, name))
+            f.seek(0, os.SEEK_END)
+            f.write(self._record(name))
+            self._write_header(f, seq + 1)
+            return name
+
+    def last(self):
+        with self._locked() as (f, header):
+            return self._last(f)
+
+    def names(self):
+        with self._locked() as (f, header):
+            f.seek(RECORD_SIZE)
+            data = f.read()
+        return [data[i:i + RECORD_SIZE].decode('utf-8').rstrip() for i in range(0, len(data), RECORD_SIZE)]
+
+    def page(self, after, limit: int):
+        # Курсор — "<номер записи>:<имя>"; если запись с тех пор сдвинулась,
+        # позиция ищется заново по имени или по порядку имён
+        with self._locked() as (f, header):
+            total = f.seek(0, os.SEEK_END) // RECORD_SIZE - 1
+            start = 0
+            if after is not None:
+                position, _, name = after.partition(':')
+                if not position.isdigit():
+                    raise ValueError("Неверный курсор")
+                position = int(position)
+                if position < total and self._read_record(f, position) == name:
+                    start = position + 1
+                else:
+                    names = [self._read_record(f, i) for i in range(total)]
+                    start = next((i for i, other in enumerate(names)
+                                  if text_sort_key(other) > text_sort_key(name)), total)
+            f.seek(RECORD_SIZE * (start + 1))
+            data = f.read(RECORD_SIZE * limit)
+        names = [data[i:i + RECORD_SIZE].decode('utf-8').rstrip() for i in range(0, len(data), RECORD_SIZE)]
+        end = start + len(names)
+        next_cursor = f"{end - 1}:{names[-1]}" if names and end < total else None
+        return names, next_cursor
+
+    def _read_record(self, f, position: int) -> str:
+        f.seek(RECORD_SIZE * (position + 1))
+        return f.read(RECORD_SIZE).decode('utf-8').rstrip()
+
+    def __len__(self):
+        with self._locked() as (f, header):
+            return f.seek(0, os.SEEK_END) // RECORD_SIZE - 1
+
+    def remove(self, name: str):
+        with self._locked() as (f, header):
+            is_last = self._last(f) == name
+            os.remove(os.path.join(self.folder, name))
+            if is_last:
+                f.truncate(f.seek(0, os.SEEK_END) - RECORD_SIZE)
+                self._write_header(f, header["next"])
+            else:
+                self._rebuild(f, header)
+
+    def touch(self):
+        # Файл в папке заменён нами (например, через rename) — индекс актуален
+        with self._locked() as (f, header):
+            self._write_header(f, header["next"])
+
+
+class FileStorage(Storage):
+    # Прежняя раскладка: users/user_<id>.json, user_text/<id>/, encrypted_text/<id>/.
+    # Файлы пишутся атомарно через writer (durable.py)
+
+    def __init__(self, root: str = '.', text_format: TextFormat = None, durability: str = DURABILITY):
+        self.root = root
+        self.text_format = text_format or TextFormat()
+        self.users_folder = os.path.join(root, 'users')
+        self.text_folders = {PLAIN: os.path.join(root, 'user_text'), ENCRYPTED: os.path.join(root, 'encrypted_text')}
+        self.writer = AtomicWriter(durability)
+        self.user_index = UserIndex(self.users_folder)
+        self._create_lock = threading.Lock()
+        self._indexes = {}
+        self._indexes_lock = threading.Lock()
+
+    @property
+    def temp_dir(self):
+        # Во временный файл пишется потоковый шифртекст; та же файловая система,
+        # что и у папок пользователей, чтобы перенос был os.replace
+        os.makedirs(self.text_folders[ENCRYPTED], exist_ok=True)
+        return self.text_folders[ENCRYPTED]
+
+    def build(self):
+        self.user_index.build()
+
+    def remove_temp_files(self) -> int:
+        folders = [self.users_folder]
+        for kind_folder in self.text_folders.values():
+            if os.path.isdir(kind_folder):
+                folders += [entry.path for entry in os.scandir(kind_folder) if entry.is_dir()]
+        return sum(remove_stale_temp(folder) for folder in folders)
+
+    def find_user_by_token(self, token: str):
+        return self.user_index.find_by_token(token)
+
+    def find_user_by_login(self, login: str):
+        return self.user_index.find_by_login(login)
+
+    def create_user(self, login: str, password: str, token: str) -> dict:
+        os.makedirs(self.users_folder, exist_ok=True)
+        with self._create_lock:
+            if self.user_index.find_by_login(login) is not None:
+                return None
+            user_id = int(time.time())
+            while os.path.exists(os.path.join(self.users_folder, f"user_{user_id}.json")):
+                user_id += 1  # Несколько регистраций за одну секунду
+            user_data = {"id": user_id, "login": login, "password": password, "token": token}
+            filename = f"user_{user_id}.json"
+            self.writer.write(os.path.join(self.users_folder, filename), json.dumps(user_data).encode('utf-8'))
+            self.user_index.add(user_data, filename)  # Под блокировкой: следующая регистрация увидит логин
+        return user_data
+
+    def update_password(self, user_id: int, password: str):
+        filename = f"user_{user_id}.json"
+        path = os.path.join(self.users_folder, filename)
+        with self._create_lock:
+            with open(path, 'r', encoding='utf-8') as user_file:
+                user_data = json.load(user_file)
+            user_data["password"] = password
+            self.writer.write(path, json.dumps(user_data).encode('utf-8'))
+        self.user_index.add(user_data, filename)
+
+    def user_folder(self, user_id: int, kind: str) -> str:
+        return os.path.join(self.text_folders[kind], str(user_id))
+
+    def text_path(self, user_id: int, kind: str, text_id: str) -> str:
+        check_text_id(text_id)
+        return os.path.join(self.user_folder(user_id, kind), text_id)
+
+    def text_index(self, user_id: int, kind: str) -> TextIndex:
+        with self._indexes_lock:
+            index = self._indexes.get((user_id, kind))
+            if index is None:
+                index = self._indexes[(user_id, kind)] = TextIndex(self.user_folder(user_id, kind))
+            return index
+
+    def add_text(self, user_id: int, kind: str, text: str) -> str:
+        # Временный файл создаётся в папке текстов под блокировкой индекса: созданный
+        # до неё, он сменил бы mtime папки, и индекс перестраивался бы при каждом добавлении
+        data = self.text_format.encode(text, kind == ENCRYPTED)
+        return self.text_index(user_id, kind).add(lambda path: self.writer.write(path, data))
+
+    def add_text_file(self, user_id: int, kind: str, path: str) -> str:
+        encoded_path = self._encoded_file(path, kind)
+        if encoded_path is not None:
+            os.replace(encoded_path, path)
+        return self.text_index(user_id, kind).add(lambda text_path: self.writer.publish(path, text_path))
+
+    def list_texts(self, user_id: int, kind: str):
+        if not os.path.isdir(self.user_folder(user_id, kind)):
+            return []
+        return self.text_index(user_id, kind).names()
+
+    def has_texts(self, user_id: int, kind: str) -> bool:
+        if not os.path.isdir(self.user_folder(user_id, kind)):
+            return False
+        return len(self.text_index(user_id, kind)) > 0
+
+    def last_text_id(self, user_id: int, kind: str):
+        if not os.path.isdir(self.user_folder(user_id, kind)):
+            return None
+        return self.text_index(user_id, kind).last()
+
+    def page_texts(self, user_id: int, kind: str, after=None, limit: int = 100):
+        if not os.path.isdir(self.user_folder(user_id, kind)):
+            return [], None
+        names, next_cursor = self.text_index(user_id, kind).page(after, limit)
+        items = [self.text_info(user_id, kind, name) for name in names]
+        return [item for item in items if item is not None], next_cursor
+
+    def text_info(self, user_id: int, kind: str, text_id: str):
+        try:
+            with open(self.text_path(user_id, kind, text_id), 'rb') as f:
+                st = os.fstat(f.fileno())
+                head = f.read(HEADER.size)  # По заголовку — размер упакованного или сжатого текста
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+        return {"id": text_id, "size": text_size(head, st.st_size), "stored_size": st.st_size, "created_at": st.st_mtime}
+
+    def read_text(self, user_id: int, kind: str, text_id: str):
+        try:
+            with open(self.text_path(user_id, kind, text_id), 'rb') as f:
+                if read_header(f.peek(HEADER.size)) is None:
+                    return io.TextIOWrapper(f, encoding='utf-8').read()
+                return decode(f.read()).decode('utf-8')
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+
+    def iter_text_chunks(self, user_id: int, kind: str, text_id: str, chunk_size: int = READ_CHUNK_SIZE):
+        yield from iter_decoded(self._file_chunks(self.text_path(user_id, kind, text_id), chunk_size))
+
+    def _file_chunks(self, path: str, chunk_size: int):
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    @contextmanager
+    def text_buffer(self, user_id: int, kind: str, text_id: str):
+        # Файл отображается в память: страницы читаются по мере обращения, копии нет.
+        # Упакованный или сжатый текст декодируется в bytes
+        with open(self.text_path(user_id, kind, text_id), 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b''  # Пустой файл отобразить нельзя
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                yield buffer if read_header(buffer) is None else decode(buffer)
+
+    def update_text(self, user_id: int, kind: str, text_id: str, text: str):
+        data = self.text_format.encode(text, kind == ENCRYPTED)
+        self.writer.write(self.text_path(user_id, kind, text_id), data)
+        self.text_index(user_id, kind).touch()  # Переименование в папке сделано нами — индекс актуален
+
+    def delete_text(self, user_id: int, kind: str, text_id: str):
+        check_text_id(text_id)
+        self.text_index(user_id, kind).remove(text_id)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    login TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    token TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS users_token ON users (token);
+CREATE TABLE IF NOT EXISTS texts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT,
+    body BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    size INTEGER
+);
+CREATE INDEX IF NOT EXISTS texts_user_created ON texts (user_id, kind, created_at, id);
+CREATE UNIQUE INDEX IF NOT EXISTS texts_user_name ON texts (user_id, kind, name);
+"""
+
+
+class SQLiteStorage(Storage):
+    # Всё в одном файле SQLite в режиме WAL; соединения берутся из пула,
+    # поэтому обработчики из пула потоков FastAPI не делят одно соединение
+
+    def __init__(self, path: str, pool_size: int = 8, text_format: TextFormat = None, durability: str = DURABILITY):
+        if durability not in SQLITE_SYNCHRONOUS:
+            raise ValueError(f"Режим fsync должен быть одним из {', '.join(SQLITE_SYNCHRONOUS)}")
+        self.path = path
+        self.text_format = text_format or TextFormat()
+        self.synchronous = SQLITE_SYNCHRONOUS[durability]
+        self._pool = queue.LifoQueue()
+        self._pool_size = pool_size
+        self._opened = 0
+        self._pool_lock = threading.Lock()
+        with self.connection() as conn:
+            conn.executescript(SQLITE_SCHEMA)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(texts)")]
+            if "size" not in columns:  # База прежней версии: там тела — UTF-8, размер — length(body)
+                conn.execute("ALTER TABLE texts ADD COLUMN size INTEGER")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                can_open = self._opened < self._pool_size
+                if can_open:
+                    self._opened += 1
+            conn = self._connect() if can_open else self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        self._opened = 0
+
+    def _user(self, row):
+        if row is None:
+            return None
+        return {"id": row[0], "login": row[1], "password": row[2], "token": row[3]}
+
+    def find_user_by_token(self, token: str):
+        with self.connection() as conn:
+            return self._user(conn.execute(
+                "SELECT id, login, password, token FROM users WHERE token = ?", (token,)).fetchone())
+
+    def find_user_by_login(self, login: str):
+        with self.connection() as conn:
+            return self._user(conn.execute(
+                "SELECT id, login, password, token FROM users WHERE login = ?", (login,)).fetchone())
+
+    def create_user(self, login: str, password: str, token: str) -> dict:
+        try:
+            with self.transaction() as conn:
+                last_id = conn.execute("SELECT MAX(id) FROM users").fetchone()[0] or 0
+                user_id = max(int(time.time()), last_id + 1)
+                conn.execute("INSERT INTO users (id, login, password, token) VALUES (?, ?, ?, ?)",
+                             (user_id, login, password, token))
+        except sqlite3.IntegrityError:
+            # Проверка логина в обработчике и вставка не атомарны: тот же логин мог
+            # зарегистрировать параллельный запрос
+            if self.find_user_by_login(login) is not None:
+                return None
+            raise
+        return {"id": user_id, "login": login, "password": password, "token": token}
+
+    def update_password(self, user_id: int, password: str):
+        with self.transaction() as conn:
+            conn.execute("UPDATE users SET password = ? WHERE id = ?", (password, user_id))
+
+    def _insert_text(self, conn, user_id: int, kind: str, body, name=None, created_at=None, size=None):
+        # body — bytes или размер в байтах (тогда вставляется zeroblob под blobopen, а size
+        # передаётся явно). size — размер текста в UTF-8: length(body) не годится для
+        # упакованных тел, а читать заголовок через substr — значит читать всё тело
+        if size is None:
+            size = text_size(body, len(body))
+        body_sql = "zeroblob(?)" if isinstance(body, int) else "?"
+        cursor = conn.execute(f"INSERT INTO texts (user_id, kind, name, body, created_at, size) "
+                              f"VALUES (?, ?, ?, {body_sql}, ?, ?)",
+                              (user_id, kind, name, body, time.time() if created_at is None else created_at, size))
+        if name is None:
+            name = f"text_{cursor.lastrowid}.txt"
+            conn.execute("UPDATE texts SET name = ? WHERE id = ?", (name, cursor.lastrowid))
+        return cursor.lastrowid, name
+
+    def add_text(self, user_id: int, kind: str, text: str) -> str:
+        with self.transaction() as conn:
+            return self._insert_text(conn, user_id, kind, self.text_format.encode(text, kind == ENCRYPTED))[1]
+
+    def add_texts(self, user_id: int, items):
+        # Одна транзакция на все тексты: один COMMIT вместо одного на каждый текст
+        with self.transaction() as conn:
+            return [(kind, self._insert_text(conn, user_id, kind, self.text_format.encode(text, kind == ENCRYPTED))[1])
+                    for kind, text in items]
+
+    def add_text_file(self, user_id: int, kind: str, path: str) -> str:
+        # Содержимое переносится кусками через blobopen, без чтения файла целиком
+        encoded_path = self._encoded_file(path, kind)
+        if encoded_path is not None:
+            os.replace(encoded_path, path)
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            head = f.read(HEADER.size)
+        with self.transaction() as conn:
+            row_id, text_id = self._insert_text(conn, user_id, kind, size, size=text_size(head, size))
+            if size:
+                with conn.blobopen("texts", "body", row_id) as blob, open(path, 'rb') as f:
+                    while True:
+                        chunk = f.read(READ_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        blob.write(chunk)
+        os.remove(path)
+        return text_id
+
+    def _row_id(self, conn, user_id: int, kind: str, text_id: str):
+        row = conn.execute("SELECT id FROM texts WHERE user_id = ? AND kind = ? AND name = ?",
+                           (user_id, kind, text_id)).fetchone()
+        return None if row is None else row[0]
+
+    def list_texts(self, user_id: int, kind: str):
+        with self.connection() as conn:
+            rows = conn.execute("SELECT name FROM texts WHERE user_id = ? AND kind = ? ORDER BY created_at, id",
+                                (user_id, kind)).fetchall()
+        return [row[0] for row in rows]
+
+    def has_texts(self, user_id: int, kind: str) -> bool:
+        with self.connection() as conn:
+            return conn.execute("SELECT 1 FROM texts WHERE user_id = ? AND kind = ? LIMIT 1",
+                                (user_id, kind)).fetchone() is not None
+
+    def last_text_id(self, user_id: int, kind: str):
+        with self.connection() as conn:
+            row = conn.execute("SELECT name FROM texts WHERE user_id = ? AND kind = ? "
+                               "ORDER BY created_at DESC, id DESC LIMIT 1", (user_id, kind)).fetchone()
+        return None if row is None else row[0]
+
+    def page_texts(self, user_id: int, kind: str, after=None, limit: int = 100):
+        # Курсор — "<created_at>:<id>" последней строки, поиск идёт по индексу texts_user_created
+        query = ("SELECT name, COALESCE(size, length(body)), length(body), created_at, id FROM texts "
+                 "WHERE user_id = ? AND kind = ?")
+        params = [user_id, kind]
+        if after is not None:
+            try:
+                created_at, row_id = after.rsplit(':', 1)
+                params += [float(created_at), int(row_id)]
+            except ValueError:
+                raise ValueError("Неверный курсор") from None
+            query += " AND (created_at, id) > (?, ?)"
+        query += " ORDER BY created_at, id LIMIT ?"
+        params.append(limit + 1)
+        with self.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+        items = [{"id": name, "size": size, "stored_size": stored_size, "created_at": created_at}
+                 for name, size, stored_size, created_at, _ in rows[:limit]]
+        next_cursor = f"{rows[limit - 1][3]!r}:{rows[limit - 1][4]}" if len(rows) > limit else None
+        return items, next_cursor
+
+    def text_info(self, user_id: int, kind: str, text_id: str):
+        with self.connection() as conn:
+            row = conn.execute("SELECT COALESCE(size, length(body)), length(body), created_at FROM texts "
+                               "WHERE user_id = ? AND kind = ? AND name = ?", (user_id, kind, text_id)).fetchone()
+        return None if row is None else {"id": text_id, "size": row[0], "stored_size": row[1], "created_at": row[2]}
+
+    def read_text(self, user_id: int, kind: str, text_id: str):
+        with self.connection() as conn:
+            row = conn.execute("SELECT body FROM texts WHERE user_id = ? AND kind = ? AND name = ?",
+                               (user_id, kind, text_id)).fetchone()
+        return None if row is None else decode(bytes(row[0])).decode('utf-8')
+
+    def iter_text_chunks(self, user_id: int, kind: str, text_id: str, chunk_size: int = READ_CHUNK_SIZE):
+        yield from iter_decoded(self._blob_chunks(user_id, kind, text_id, chunk_size))
+
+    def _blob_chunks(self, user_id: int, kind: str, text_id: str, chunk_size: int):
+        # Каждый кусок читается на своём коротком захвате соединения: потоковый ответ,
+        # пока клиент читает, не держит соединение пула. Blob открывается заново и
+        # читается с нужного смещения
+        with self.connection() as conn:
+            row_id = self._row_id(conn, user_id, kind, text_id)
+        if row_id is None:
+            raise FileNotFoundError(text_id)
+        offset, size = 0, None
+        while True:
+            with self.connection() as conn:
+                try:
+                    blob = conn.blobopen("texts", "body", row_id, readonly=True)
+                except sqlite3.OperationalError:
+                    raise FileNotFoundError(text_id) from None  # Текст удалён во время чтения
+                with blob:
+                    if size is None:
+                        size = len(blob)
+                    elif len(blob) != size:
+                        raise ValueError("Текст изменён во время чтения")
+                    blob.seek(offset)
+                    chunk = blob.read(chunk_size)
+            if not chunk:
+                break
+            offset += len(chunk)
+            yield chunk
+
+    def update_text(self, user_id: int, kind: str, text_id: str, text: str):
+        body = self.text_format.encode(text, kind == ENCRYPTED)
+        with self.transaction() as conn:
+            conn.execute("UPDATE texts SET body = ?, size = ? WHERE user_id = ? AND kind = ? AND name = ?",
+                         (body, text_size(body, len(body)), user_id, kind, text_id))
+
+    def delete_text(self, user_id: int, kind: str, text_id: str):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM texts WHERE user_id = ? AND kind = ? AND name = ?", (user_id, kind, text_id))
+
+
+def make_storage(spec: str) -> Storage:
+    # "files" или "files:<каталог>" — прежняя раскладка, "sqlite:<путь к базе>" — SQLite
+    backend, _, path = spec.partition(':')
+    if backend == 'files':
+        return FileStorage(path or '.')
+    if backend == 'sqlite':
+        return SQLiteStorage(path or 'kursovaya.db')
+    raise ValueError(f"Неизвестное хранилище: {spec}")
+
+
+def migrate(source: FileStorage, target: SQLiteStorage):
+    # Перенос каталогов users/, user_text/, encrypted_text/ в SQLite с сохранением
+    # идентификаторов пользователей и имён текстов
+    users = texts = 0
+    if os.path.isdir(source.users_folder):
+        with target.transaction() as conn:
+            for filename in sorted(os.listdir(source.users_folder)):
+                if not filename.endswith(".json"):
+                    continue
+                with open(os.path.join(source.users_folder, filename), 'r', encoding='utf-8') as f:
+                    user_data = json.load(f)
+                conn.execute("INSERT OR REPLACE INTO users (id, login, password, token) VALUES (?, ?, ?, ?)",
+                             (user_data["id"], user_data["login"], user_data["password"], user_data["token"]))
+                users += 1
+    for kind in KINDS:
+        kind_folder = source.text_folders[kind]
+        if not os.path.isdir(kind_folder):
+            continue
+        for user_dir in sorted(os.listdir(kind_folder)):
+            if not user_dir.isdigit():
+                continue
+            user_id = int(user_dir)
+            with target.transaction() as conn:
+                for text_id in source.list_texts(user_id, kind):
+                    path = source.text_path(user_id, kind, text_id)
+                    match = _text_name_re.match(text_id)
+                    created_at = int(match.group(1)) if match else os.path.getmtime(path)
+                    with open(path, 'rb') as f:
+                        body = f.read()
+                    conn.execute("DELETE FROM texts WHERE user_id = ? AND kind = ? AND name = ?",
+                                 (user_id, kind, text_id))
+                    target._insert_text(conn, user_id, kind, body, name=text_id, created_at=created_at)
+                    texts += 1
+    return users, texts
+
+
+def repack(storage: FileStorage):
+    # Перевод уже сохранённых текстов в формат storage.text_format. Файл заменяется
+    # атомарно (storage.writer), после чего индекс папки помечается актуальным (иначе
+    # он перестраивался бы при следующем обращении). (текстов, байт было, байт стало)
+    texts = before = after = 0
+    for kind in KINDS:
+        kind_folder = storage.text_folders[kind]
+        if not os.path.isdir(kind_folder):
+            continue
+        for user_dir in sorted(os.listdir(kind_folder)):
+            if not user_dir.isdigit():
+                continue
+            user_id = int(user_dir)
+            replaced = False
+            for text_id in storage.list_texts(user_id, kind):
+                path = storage.text_path(user_id, kind, text_id)
+                with open(path, 'rb') as f:
+                    if read_header(f.read(HEADER.size)) is not None:
+                        continue  # Уже упакован или сжат
+                encoded_path = storage._encoded_file(path, kind)
+                if encoded_path is None:
+                    continue
+                before += os.path.getsize(path)
+                after += os.path.getsize(encoded_path)
+                try:
+                    storage.writer.publish(encoded_path, path)
+                except BaseException:
+                    storage.writer.discard(encoded_path)
+                    raise
+                replaced = True
+                texts += 1
+            if replaced:
+                storage.text_index(user_id, kind).touch()
+    return texts, before, after
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Хранилище пользователей и текстов")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="перенести каталоги в базу SQLite")
+    migrate_parser.add_argument("--source", default=".", help="каталог с users/, user_text/, encrypted_text/")
+    migrate_parser.add_argument("--db", default="kursovaya.db", help="путь к базе SQLite")
+    repack_parser = subparsers.add_parser("repack", help="перевести сохранённые тексты в компактный формат")
+    repack_parser.add_argument("--source", default=".", help="каталог с user_text/, encrypted_text/")
+    repack_parser.add_argument("--pack", action="store_true", help="шифртексты по 5 бит на символ")
+    repack_parser.add_argument("--compression", choices=sorted(COMPRESSIONS), help="сжатие открытых текстов")
+    args = parser.parse_args()
+    if args.command == "migrate":
+        target = SQLiteStorage(args.db)
+        users, texts = migrate(FileStorage(args.source), target)
+        target.close()
+        print(f"Перенесено пользователей: {users}, текстов: {texts}")
+    elif args.command == "repack":
+        source = FileStorage(args.source, TextFormat(args.pack, args.compression))
+        texts, before, after = repack(source)
+        source.close()
+        print(f"Переписано текстов: {texts}, байт: {before} -> {after}")
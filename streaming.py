@@ -0,0 +1,51 @@
+import codecs
+
+import numpy as np
+
+from codec import get_codec
+from hill import hill_transform
+from modmath import mod_inverse
+
+STREAM_CHUNK_SIZE = 1 << 20  # Крупные куски тела запроса режутся до этого размера
+
+
+class HillStreamCipher:
+    # Потоковое шифрование: данные приходят кусками произвольной длины,
+    # неполный блок переносится в следующий кусок, поэтому результат
+    # совпадает с hill_cipher_encrypt / hill_cipher_decrypt для всего текста
+
+    def __init__(self, key_matrix: np.ndarray, alphabet: str, decrypt: bool = False):
+        self.codec = get_codec(alphabet)
+        self.n = key_matrix.shape[0]
+        self.decrypt = decrypt
+        self.key_matrix = mod_inverse(key_matrix, self.codec.size) if decrypt else key_matrix
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._carry = np.empty(0, dtype=np.uint8)
+        self.symbols_in = 0
+
+    def feed(self, data: bytes) -> str:
+        indices = self.codec.encode(self._decoder.decode(data), keep_case=self.decrypt)
+        self.symbols_in += len(indices)
+        if len(self._carry):
+            indices = np.concatenate([self._carry, indices])
+        complete = len(indices) - len(indices) % self.n
+        self._carry = indices[complete:]
+        return self._transform(indices[:complete])
+
+    def finish(self) -> str:
+        tail = self.codec.encode(self._decoder.decode(b'', final=True), keep_case=self.decrypt)
+        self.symbols_in += len(tail)
+        indices = self.codec.pad(np.concatenate([self._carry, tail]), self.n)
+        self._carry = np.empty(0, dtype=np.uint8)
+        return self._transform(indices)
+
+    def _transform(self, indices: np.ndarray) -> str:
+        if not len(indices):
+            return ''
+        blocks = indices.reshape(-1, self.n)
+        return self.codec.decode(hill_transform(blocks, self.key_matrix, self.codec.size))
+
+
+def split_chunks(data: bytes, size: int = STREAM_CHUNK_SIZE):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
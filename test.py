@@ -1,6 +1,46 @@
 import unittest
 import requests
 import json
+import os
+import subprocess
+import sys
+import shutil
+import tempfile
+import numpy as np
+from user_index import UserIndex
+from storage import PLAIN, ENCRYPTED, FileStorage, SQLiteStorage, migrate, repack
+import packed
+from packed import TextFormat
+from codec import ENGLISH_ALPHABET, RUSSIAN_ALPHABET, detect_language, iter_utf8, scan_bytes, scan_text, get_codec
+from modmath import mod_inverse
+import hill
+from hill import parse_key, hill_cipher_encrypt, hill_cipher_decrypt, hill_cipher_batch
+from streaming import HillStreamCipher
+import asyncio
+import threading
+import workers
+import parallel
+import main
+import httpx
+from async_client import AsyncClient
+import io
+import bulk
+import hashlib
+from passwords import PasswordHasher, make_context
+from cipher_cache import CipherCache, cipher_digest
+import metrics
+from analysis import recover_key, brute_force_2x2
+import jobs
+from jobs import JobQueue
+import durable
+from durable import AtomicWriter
+from unittest import mock
+
+def temp_dir(test: unittest.TestCase) -> str:
+    # Временный каталог, который удаляется после теста
+    folder = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+    return folder
 
 class TestUserRegistration(unittest.TestCase):
     def test_create_user(self):
@@ -39,5 +79,633 @@ class TestEncryptText(unittest.TestCase):
         print("Результат текста шифрования:")
         print("Текст успешно зашифрован.")
 
+class TestUserIndex(unittest.TestCase):
+    def setUp(self):
+        self.folder = temp_dir(self)
+        self.write_user("user_1.json", {"id": 1, "login": "User1", "password": "", "token": "token1"})
+        self.index = UserIndex(self.folder, rescan_interval=0)
+        self.index.build()
+
+    def write_user(self, filename, user_data):
+        with open(os.path.join(self.folder, filename), 'w') as f:
+            json.dump(user_data, f)
+
+    def test_lookup(self):
+        self.assertEqual(self.index.find_by_token("token1")["id"], 1)
+        self.assertEqual(self.index.find_by_login("User1")["token"], "token1")
+        self.assertIsNone(self.index.find_by_token("token2"))
+
+    def test_external_changes(self):
+        self.write_user("user_2.json", {"id": 2, "login": "User2", "password": "", "token": "token2"})
+        self.assertEqual(self.index.find_by_token("token2")["id"], 2)
+        os.remove(os.path.join(self.folder, "user_2.json"))
+        self.assertIsNone(self.index.find_by_login("User2"))
+
+class TestStorage(unittest.TestCase):
+    def check_backend(self, storage):
+        user = storage.create_user("User1", "hash", "token1")
+        self.assertEqual(storage.find_user_by_token("token1")["id"], user["id"])
+        self.assertEqual(storage.find_user_by_login("User1")["token"], "token1")
+        self.assertIsNone(storage.create_user("User1", "hash", "token3"))  # Логин занят
+        first = storage.add_text(user["id"], PLAIN, "первый")
+        second = storage.add_text(user["id"], PLAIN, "второй")
+        self.assertEqual(storage.list_texts(user["id"], PLAIN), [first, second])
+        with storage.text_buffer(user["id"], PLAIN, first) as buffer:
+            self.assertEqual(bytes(buffer), "первый".encode('utf-8'))
+        self.assertEqual(storage.last_text_id(user["id"], PLAIN), second)
+        storage.update_text(user["id"], PLAIN, second, "изменён")
+        self.assertEqual(storage.read_text(user["id"], PLAIN, second), "изменён")
+        storage.delete_text(user["id"], PLAIN, second)
+        self.assertEqual(storage.last_text_id(user["id"], PLAIN), first)
+        self.assertFalse(storage.has_texts(user["id"], ENCRYPTED))
+        for i in range(4):
+            storage.add_text(user["id"], ENCRYPTED, f"текст {i}")
+        pages, cursor = [], None
+        while True:
+            items, cursor = storage.page_texts(user["id"], ENCRYPTED, cursor, limit=3)
+            pages.append([item["id"] for item in items])
+            if cursor is None:
+                break
+        self.assertEqual(pages, [storage.list_texts(user["id"], ENCRYPTED)[:3], storage.list_texts(user["id"], ENCRYPTED)[3:]])
+        self.assertEqual(storage.text_info(user["id"], ENCRYPTED, pages[1][0])["size"], len("текст 3".encode('utf-8')))
+        return user
+
+    def check_bulk(self, storage):
+        user = storage.create_user("Bulk", "hash", "token2")
+        bad = io.BytesIO('{"text": "раз"}\n{"body": "два", "kind": "encrypted"}\nне json\n'.encode('utf-8'))
+        with self.assertRaises(ValueError):
+            storage.add_texts(user["id"], bulk.iter_import(bad))
+        self.assertEqual(storage.list_texts(user["id"], PLAIN) + storage.list_texts(user["id"], ENCRYPTED), [])
+        good = io.BytesIO('{"text": "раз"}\n\n"два"\n{"body": "три", "kind": "encrypted"}\n'.encode('utf-8'))
+        self.assertEqual([kind for kind, _ in storage.add_texts(user["id"], bulk.iter_import(good))],
+                         [PLAIN, PLAIN, ENCRYPTED])
+        for fmt in bulk.FORMATS:
+            exported = io.BytesIO(b''.join(bulk.EXPORTERS[fmt](storage, user["id"])))
+            self.assertEqual(list(bulk.iter_import(exported)), [(PLAIN, "раз"), (PLAIN, "два"), (ENCRYPTED, "три")])
+
+    def test_file_storage(self):
+        storage = FileStorage(temp_dir(self))
+        self.check_backend(storage)
+        self.check_bulk(storage)
+
+    def test_file_storage_index(self):
+        storage = FileStorage(temp_dir(self))
+        folder = storage.user_folder(1, PLAIN)
+        os.makedirs(folder)
+        for name in ["text_1700000000.txt", "text_1700000000_1.txt"]:  # Имена прежнего формата
+            with open(os.path.join(folder, name), 'w') as f:
+                f.write(name)
+        new_id = storage.add_text(1, PLAIN, "новый")
+        self.assertEqual(storage.list_texts(1, PLAIN), ["text_1700000000.txt", "text_1700000000_1.txt", new_id])
+        storage.delete_text(1, PLAIN, new_id)
+        self.assertNotEqual(storage.add_text(1, PLAIN, "ещё"), new_id)  # Номера не переиспользуются
+        os.remove(os.path.join(folder, "text_1700000000.txt"))
+        self.assertEqual(len(storage.list_texts(1, PLAIN)), 2)
+
+    def test_sqlite_storage(self):
+        storage = SQLiteStorage(os.path.join(temp_dir(self), "test.db"))
+        self.check_backend(storage)
+        self.check_bulk(storage)
+        storage.close()
+
+    def test_sqlite_stream_releases_connection(self):
+        folder = temp_dir(self)
+        storage = SQLiteStorage(os.path.join(folder, "test.db"), pool_size=1)
+        text_id = storage.add_text(1, PLAIN, "поток" * 20)
+        chunks = storage.iter_text_chunks(1, PLAIN, text_id, chunk_size=3)
+        first = next(chunks)
+        self.assertEqual(storage.list_texts(1, PLAIN), [text_id])  # Единственное соединение пула свободно
+        self.assertEqual(first + b''.join(chunks), ("поток" * 20).encode('utf-8'))
+        chunks = storage.iter_text_chunks(1, PLAIN, text_id, chunk_size=3)
+        next(chunks)
+        storage.delete_text(1, PLAIN, text_id)
+        with self.assertRaises(FileNotFoundError):
+            list(chunks)
+        storage.close()
+
+    def test_packed_format(self):
+        text_format = TextFormat(pack=True, compression='zlib')
+        ciphertext = hill_cipher_encrypt("Привет, мир! Шифр Хилла" * 20, np.array([[3, 3], [2, 5]]), RUSSIAN_ALPHABET)
+        for storage in (FileStorage(temp_dir(self), text_format),
+                        SQLiteStorage(os.path.join(temp_dir(self), "test.db"), text_format=text_format)):
+            self.check_backend(storage)
+            self.check_bulk(storage)
+            text_id = storage.add_text(1, ENCRYPTED, ciphertext)
+            info = storage.text_info(1, ENCRYPTED, text_id)
+            self.assertEqual(info["size"], len(ciphertext.encode('utf-8')))
+            self.assertLess(info["stored_size"] * 2, info["size"])
+            self.assertEqual(storage.read_text(1, ENCRYPTED, text_id), ciphertext)
+            self.assertEqual(b''.join(storage.iter_text_chunks(1, ENCRYPTED, text_id, chunk_size=7)), ciphertext.encode('utf-8'))
+            with storage.text_buffer(1, ENCRYPTED, text_id) as buffer:
+                self.assertEqual(bytes(buffer), ciphertext.encode('utf-8'))
+            storage.close()
+
+    def test_add_text_file_streams(self):
+        text_format = TextFormat(pack=True, compression='zlib')
+        ciphertext = hill_cipher_encrypt("Привет, мир! Шифр Хилла" * 30000, np.array([[3, 3], [2, 5]]), RUSSIAN_ALPHABET)
+        plaintext = "Привет, мир! Шифр Хилла" * 300
+        folder = temp_dir(self)
+        for storage in (FileStorage(os.path.join(folder, "files"), text_format),
+                        SQLiteStorage(os.path.join(folder, "test.db"), text_format=text_format)):
+            # Шифртекст длиннее куска UTF-8, открытый текст сжимается кусками по 1000 байт
+            with mock.patch.object(packed, "DECODE_CHUNK", 1000):
+                for kind, text in ((ENCRYPTED, ciphertext), (PLAIN, plaintext), (ENCRYPTED, "не шифртекст")):
+                    upload = os.path.join(folder, "upload.part")
+                    with open(upload, 'wb') as f:
+                        f.write(text.encode('utf-8'))
+                    text_id = storage.add_text_file(1, kind, upload)
+                    self.assertEqual(storage.read_text(1, kind, text_id), text)
+                    info = storage.text_info(1, kind, text_id)
+                    self.assertEqual(info["size"], len(text.encode('utf-8')))
+                    if text != "не шифртекст":
+                        self.assertLess(info["stored_size"] * 2, info["size"])
+                    self.assertFalse(os.path.exists(upload))
+                    self.assertEqual([name for name in os.listdir(folder) if name.startswith('.')], [])  # Временных не осталось
+            storage.close()
+
+    def test_repack(self):
+        storage = FileStorage(temp_dir(self))
+        ciphertext = hill_cipher_encrypt("Hello, world" * 50, np.array([[3, 3], [2, 5]]), ENGLISH_ALPHABET)
+        text_ids = [storage.add_text(1, ENCRYPTED, ciphertext), storage.add_text(1, PLAIN, "Hello, world" * 50)]
+        texts, before, after = repack(FileStorage(storage.root, TextFormat(pack=True, compression='zlib')))
+        self.assertEqual(texts, 2)
+        self.assertLess(after * 2, before)
+        self.assertEqual(storage.read_text(1, ENCRYPTED, text_ids[0]), ciphertext)
+        self.assertEqual(storage.read_text(1, PLAIN, text_ids[1]), "Hello, world" * 50)
+        self.assertEqual(storage.list_texts(1, ENCRYPTED), text_ids[:1])
+
+    def test_migrate(self):
+        source = FileStorage(temp_dir(self))
+        user = self.check_backend(source)
+        source.add_text(user["id"], ENCRYPTED, "ШИФР")
+        target = SQLiteStorage(os.path.join(temp_dir(self), "test.db"))
+        self.assertEqual(migrate(source, target), (1, 6))
+        self.assertEqual(target.find_user_by_token("token1")["login"], "User1")
+        for kind in (PLAIN, ENCRYPTED):
+            text_ids = source.list_texts(user["id"], kind)
+            self.assertEqual(target.list_texts(user["id"], kind), text_ids)
+            self.assertEqual(target.read_text(user["id"], kind, text_ids[-1]), source.read_text(user["id"], kind, text_ids[-1]))
+        target.close()
+
+class TestAtomicWriter(unittest.TestCase):
+    def test_modes(self):
+        for mode in ("always", "batch", "none"):
+            root = temp_dir(self)
+            storage = FileStorage(root, durability=mode)
+            user_id = storage.create_user("w", "", "token")["id"]
+            text_id = storage.add_text(user_id, PLAIN, "раз")
+            storage.update_text(user_id, PLAIN, text_id, "два")
+            index = storage.text_index(user_id, PLAIN)
+            with index._locked() as (f, header):  # Переименования сделаны под индексом или с touch()
+                self.assertEqual(header["mtime"], index._dir_mtime())
+            storage.close()
+            self.assertEqual(storage.read_text(user_id, PLAIN, text_id), "два")
+            self.assertEqual(storage.writer.commits, 3 if mode == "batch" else 0)  # Записи по одной: группа на каждую
+            self.assertEqual([name for name in os.listdir(storage.user_folder(user_id, PLAIN)) if name.endswith(".tmp")], [])
+        with self.assertRaises(ValueError):
+            AtomicWriter("sometimes")
+
+    def test_batch_syncs_before_rename(self):
+        folder = temp_dir(self)
+        writer = AtomicWriter("batch")
+        synced, renamed = set(), []
+        real_fsync, real_replace = durable.fsync_path, os.replace
+
+        def fsync(path):
+            synced.add(path)
+            real_fsync(path)
+
+        def replace(src, dst):
+            renamed.append(src in synced)  # Переименование только после fsync данных
+            real_replace(src, dst)
+
+        with mock.patch("durable.fsync_path", fsync), mock.patch("durable.os.replace", replace):
+            threads = [threading.Thread(target=writer.write, args=(os.path.join(folder, f"text_{i}.txt"), b"data"))
+                       for i in range(16)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(renamed, [True] * 16)
+        self.assertLessEqual(writer.commits, 16)
+        self.assertEqual(sorted(os.listdir(folder)), sorted(f"text_{i}.txt" for i in range(16)))
+
+    def test_failed_publish_keeps_old_file(self):
+        for mode in ("none", "batch"):
+            folder = temp_dir(self)
+            writer = AtomicWriter(mode)
+            path = os.path.join(folder, "text.txt")
+            writer.write(path, b"old")
+            os.makedirs(os.path.join(folder, "dir", "inner"))
+            with self.assertRaises(OSError):
+                writer.write(os.path.join(folder, "dir"), b"new")  # На месте файла — непустой каталог
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b"old")
+            self.assertEqual(sorted(os.listdir(folder)), ["dir", "text.txt"])
+
+    def test_stale_temp_files(self):
+        root = temp_dir(self)
+        storage = FileStorage(root, durability="none")
+        user_id = storage.create_user("w", "", "token")["id"]
+        storage.add_text(user_id, PLAIN, "раз")
+        folder = storage.user_folder(user_id, PLAIN)
+        stale = storage.writer.stage(folder, b"stale")
+        fresh = storage.writer.stage(storage.users_folder, b"fresh")
+        os.utime(stale, (0, 0))
+        self.assertEqual(storage.remove_temp_files(), 1)
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(fresh))  # Может принадлежать идущей записи
+
+class TestHillCipher(unittest.TestCase):
+    def test_round_trip(self):
+        key_matrix = np.array([[3, 3], [2, 5]])
+        for text, alphabet, expected in [("Hello, world", ENGLISH_ALPHABET, "HELLOWORLD"),
+                                         ("Привет, мир", RUSSIAN_ALPHABET, "ПРИВЕТМИРЕ")]:
+            encrypted = hill_cipher_encrypt(text, key_matrix, alphabet)
+            self.assertEqual(hill_cipher_decrypt(encrypted, key_matrix, alphabet), expected)
+
+    def test_large_key_round_trip(self):
+        key_matrix = parse_key("6 24 1 13 16 10 20 17 15", len(ENGLISH_ALPHABET))
+        encrypted = hill_cipher_encrypt("ACT NOW PLEASE GO", key_matrix, ENGLISH_ALPHABET)
+        self.assertEqual(hill_cipher_decrypt(encrypted, key_matrix, ENGLISH_ALPHABET), "ACTNOWPLEASEGOX")
+
+    def test_batch_matches_single(self):
+        key_matrix = np.array([[3, 3], [2, 5]])
+        texts = ["Привет", "мир", "", "шифр Хилла"]
+        encrypted = hill_cipher_batch(texts, key_matrix, RUSSIAN_ALPHABET)
+        self.assertEqual(encrypted, [hill_cipher_encrypt(text, key_matrix, RUSSIAN_ALPHABET) for text in texts])
+        decrypted = hill_cipher_batch(encrypted, key_matrix, RUSSIAN_ALPHABET, decrypt=True)
+        self.assertEqual(decrypted, [hill_cipher_decrypt(text, key_matrix, RUSSIAN_ALPHABET) for text in encrypted])
+
+    def test_table_matches_matmul(self):
+        rng = np.random.default_rng(0)
+        for alphabet, key in [(ENGLISH_ALPHABET, "3 3 2 5"), (RUSSIAN_ALPHABET, "3 3 2 5"),
+                              (ENGLISH_ALPHABET, "6 24 1 13 16 10 20 17 15"), (RUSSIAN_ALPHABET, "1 2 0 0 1 2 2 0 1")]:
+            mod = len(alphabet)
+            key_matrix = parse_key(key, mod)
+            n = key_matrix.shape[0]
+            self.assertTrue(hill.uses_table(2 * mod ** n, n, mod))
+            blocks = rng.integers(0, mod, (1000, n), dtype=np.uint8)
+            np.testing.assert_array_equal(hill.table_transform(blocks, key_matrix, mod),
+                                          hill.matmul_transform(blocks, key_matrix, mod))
+            # Длинный текст идёт по таблице, расшифровка — по таблице обратного ключа
+            codec = get_codec(alphabet)
+            text = ''.join(rng.choice(list(alphabet.upper()), 2 * n * mod ** n + 1))
+            encrypted = hill_cipher_encrypt(text, key_matrix, alphabet)
+            self.assertEqual(hill_cipher_decrypt(encrypted, key_matrix, alphabet),
+                             codec.decode(codec.pad(codec.encode(text), n)))
+        self.assertFalse(hill.uses_table(10, 2, 32))
+        self.assertFalse(hill.uses_table(1 << 30, 4, 32))
+
+    def test_parse_key(self):
+        self.assertEqual(parse_key("3 3 2 5", 32).shape, (2, 2))
+        np.testing.assert_array_equal(parse_key("99999999999999999999 1 2 1", 32), [[31, 1], [2, 1]])
+        for key in ["1 2 3", "2 4 6 8", "a b c d", "99999999999999999999 1 1 1"]:
+            with self.assertRaises(ValueError):
+                parse_key(key, 32)
+
+    def test_detect_language(self):
+        self.assertEqual(detect_language("hello мир"), 'english')
+        self.assertEqual(detect_language("привет world"), 'russian')
+        with self.assertRaises(ValueError):
+            detect_language("123")
+
+    def test_sampled_detection(self):
+        russian = "съешь же ещё этих мягких французских булок " * 100
+        self.assertEqual(detect_language(russian + "hello world " * 100, sample=1600), 'russian')
+        # Поровну букв в выборке: решение по всему тексту
+        balanced = "абвгд" * 1000 + "abcde" * 1000 + "я" * 10
+        self.assertEqual(detect_language(balanced, sample=800), 'russian')
+        alphabet, indices = scan_text(russian, sample=1600)
+        self.assertEqual(alphabet, RUSSIAN_ALPHABET)
+        np.testing.assert_array_equal(indices, get_codec(RUSSIAN_ALPHABET).encode(russian))
+        self.assertEqual(scan_text("aBc", language='english', keep_case=True)[1].tolist(), [1, 2, 5])
+
+    def test_scan_bytes(self):
+        text = "Привет, мир! Шифр Хилла ё" * 50
+        alphabet, indices = scan_bytes(text.encode('utf-8'), sample=100)
+        self.assertEqual(alphabet, RUSSIAN_ALPHABET)
+        np.testing.assert_array_equal(indices, scan_text(text)[1])
+        codec = get_codec(RUSSIAN_ALPHABET)
+        self.assertEqual(codec.decode_utf8(indices), codec.decode(indices).encode('utf-8'))
+        # Куски по 7 байт режут двухбайтовые символы UTF-8
+        self.assertEqual(''.join(iter_utf8(text.encode('utf-8'), chunk_size=7)), text)
+
+class TestPackedFormat(unittest.TestCase):
+    def test_bit_layout(self):
+        indices = np.random.default_rng(0).integers(0, 32, 1001, dtype=np.uint8)
+        # Тот же порядок битов, что у np.packbits
+        expected = np.packbits(np.unpackbits(indices[:, None], axis=1)[:, 3:].ravel()).tobytes()
+        self.assertEqual(packed.pack_indices(indices), expected)
+        np.testing.assert_array_equal(packed.unpack_indices(expected, len(indices)), indices)
+
+    def test_corruption(self):
+        data = bytearray(packed.pack_text(hill_cipher_encrypt("Привет, мир", np.array([[3, 3], [2, 5]]), RUSSIAN_ALPHABET)))
+        self.assertIsNone(packed.pack_text("Привет, мир"))  # Пробел и строчные буквы — не шифртекст
+        self.assertIsNone(packed.pack_text("три"))
+        data[-1] ^= 1
+        with self.assertRaises(ValueError):
+            packed.decode(bytes(data))
+
+class TestHillStreamCipher(unittest.TestCase):
+    def test_matches_whole_text(self):
+        key_matrix = np.array([[3, 3], [2, 5]])
+        data = "Привет, мир! Шифр Хилла".encode('utf-8')
+        cipher = HillStreamCipher(key_matrix, RUSSIAN_ALPHABET)
+        # Куски по 3 байта режут и блоки, и двухбайтовые символы UTF-8
+        encrypted = ''.join(cipher.feed(data[i:i + 3]) for i in range(0, len(data), 3)) + cipher.finish()
+        self.assertEqual(encrypted, hill_cipher_encrypt(data.decode('utf-8'), key_matrix, RUSSIAN_ALPHABET))
+
+class TestModInverse(unittest.TestCase):
+    def test_inverse(self):
+        key_matrix = np.array([[3, 3], [2, 5]])
+        inverse = mod_inverse(key_matrix, 32)
+        self.assertTrue(((key_matrix @ inverse) % 32 == np.eye(2, dtype=int)).all())
+
+    def test_large_key(self):
+        key_matrix = np.triu(np.full((12, 12), 31)) + np.eye(12, dtype=int) * 2  # Плохо обусловлена для float
+        inverse = mod_inverse(key_matrix, 32)
+        self.assertTrue(((key_matrix @ inverse) % 32 == np.eye(12, dtype=int)).all())
+
+    def test_not_invertible(self):
+        with self.assertRaises(ValueError):
+            mod_inverse(np.array([[2, 4], [6, 8]]), 32)
+
+class TestParallelCipher(unittest.TestCase):
+    def tearDown(self):
+        parallel.shutdown()
+
+    def test_matches_single_process(self):
+        key_matrix = np.array([[3, 3], [2, 5]])
+        text = "Привет, мир! Шифр Хилла. " * 40 + "Ёж"
+        encrypted = parallel.hill_cipher_parallel(text, key_matrix, RUSSIAN_ALPHABET, processes=2)
+        self.assertEqual(encrypted, hill_cipher_encrypt(text, key_matrix, RUSSIAN_ALPHABET))
+        decrypted = parallel.hill_cipher_parallel(encrypted, key_matrix, RUSSIAN_ALPHABET, decrypt=True, processes=2)
+        self.assertEqual(decrypted, hill_cipher_decrypt(encrypted, key_matrix, RUSSIAN_ALPHABET))
+
+class TestAsyncClient(unittest.TestCase):
+    def test_bulk_upload(self):
+        async def scenario():
+            transport = httpx.ASGITransport(app=main.app)
+            async with AsyncClient(base_url="http://test", transport=transport, concurrency=4) as client:
+                await client.register("bulk", "StrongPassword.1")
+                await client.login("bulk", "StrongPassword.1")
+                await client.add_texts([f"Text {i}" for i in range(10)])
+                encrypted = await client.encrypt_many(["Hello world"] * 3, "3 3 2 5")
+                return client.token, encrypted
+
+        with tempfile.TemporaryDirectory() as root:
+            old_storage, main.storage = main.storage, FileStorage(root)
+            try:
+                main.storage.build()
+                token, encrypted = asyncio.run(scenario())
+                user_id = main.storage.find_user_by_token(token)["id"]
+                self.assertEqual(len(main.storage.list_texts(user_id, PLAIN)), 10)
+                self.assertEqual(encrypted, [hill_cipher_encrypt("Hello world", np.array([[3, 3], [2, 5]]), ENGLISH_ALPHABET)] * 3)
+            finally:
+                main.storage = old_storage
+
+class TestPasswords(unittest.TestCase):
+    def test_legacy_rehash(self):
+        hasher = PasswordHasher(make_context("pbkdf2_sha256", 1000), workers=1)
+        legacy = hashlib.sha256("StrongPassword.1".encode()).hexdigest()
+        is_valid, new_hash = asyncio.run(hasher.verify("StrongPassword.1", legacy))
+        self.assertTrue(is_valid)
+        self.assertTrue(new_hash.startswith("$pbkdf2-sha256$1000$"))
+        self.assertEqual(asyncio.run(hasher.verify("StrongPassword.1", new_hash)), (True, None))
+        self.assertEqual(asyncio.run(hasher.verify("WrongPassword.1", legacy)), (False, None))
+        self.assertEqual(asyncio.run(hasher.verify("StrongPassword.1", "")), (False, None))
+        hasher.shutdown()
+
+    def test_update_password(self):
+        storage = FileStorage(temp_dir(self))
+        user = storage.create_user("User1", "old", "token1")
+        storage.update_password(user["id"], "new")
+        self.assertEqual(storage.find_user_by_login("User1")["password"], "new")
+        self.assertEqual(storage.find_user_by_token("token1")["id"], user["id"])
+
+class TestCipherCache(unittest.TestCase):
+    def test_lru_and_disk(self):
+        key_matrix = np.array([[3, 3], [2, 5]])
+        digests = [cipher_digest(f"текст {i}", key_matrix, RUSSIAN_ALPHABET) for i in range(3)]
+        self.assertEqual(digests[0], cipher_digest("текст 0", key_matrix + 31, RUSSIAN_ALPHABET))
+        cache = CipherCache(max_bytes=20, disk_dir=temp_dir(self))
+        for digest in digests:
+            cache.put(digest, "ШИФРТЕКСТ")  # 18 байт: в памяти помещается одна запись
+        self.assertEqual(cache.stats()["entries"], 1)
+        self.assertEqual(cache.get(digests[0]), "ШИФРТЕКСТ")  # С диска
+        self.assertIsNone(cache.get(cipher_digest("другой", key_matrix, RUSSIAN_ALPHABET)))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["disk_hits"], stats["misses"], stats["bytes_saved"]), (1, 1, 1, 18))
+
+class TestWorkers(unittest.TestCase):
+    def test_offload_threshold(self):
+        current = lambda: threading.current_thread().name
+        small = asyncio.run(workers.run_cipher(workers.CIPHER_OFFLOAD_THRESHOLD - 1, current))
+        large = asyncio.run(workers.run_cipher(workers.CIPHER_OFFLOAD_THRESHOLD, current))
+        self.assertEqual(small, threading.current_thread().name)
+        self.assertTrue(large.startswith("cipher"))
+
+class TestMetrics(unittest.TestCase):
+    def test_render(self):
+        histogram = metrics.Histogram("test_seconds", "Тест", ("stage",), buckets=(0.1, 1.0))
+        histogram.observe(0.5, stage="matmul")
+        histogram.observe(5, stage="matmul")
+        lines = histogram.render()
+        self.assertIn('test_seconds_bucket{stage="matmul",le="1.0"} 1', lines)
+        self.assertIn('test_seconds_bucket{stage="matmul",le="+Inf"} 2', lines)
+        self.assertIn('test_seconds_count{stage="matmul"} 2', lines)
+
+    def test_route_labels(self):
+        self.addCleanup(setattr, main, "storage", main.storage)
+        main.storage = FileStorage(temp_dir(self))
+        main.storage.build()
+        transport = httpx.ASGITransport(app=main.app)
+
+        async def scenario():
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                await client.get("/view_texts/secret-token")
+                return (await client.get("/metrics")).text
+
+        text = asyncio.run(scenario())
+        self.assertIn('route="/view_texts/{token}",status="404"', text)
+        self.assertNotIn("secret-token", text)
+        self.assertIn('kursovaya_stage_duration_seconds_count{stage="auth"}', text)
+
+class TestEncryptByReference(unittest.TestCase):
+    def test_matches_text_request(self):
+        self.addCleanup(setattr, main, "storage", main.storage)
+        main.storage = FileStorage(temp_dir(self))
+        main.storage.build()
+        transport = httpx.ASGITransport(app=main.app)
+        text = "Привет, мир! Шифр Хилла"
+
+        async def scenario():
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                token = (await client.post("/create_user", json={"login": "ref", "password": "StrongPassword.1",
+                                                                 "token": ""})).json()["token"]
+                await client.post("/add_text", json={"token": token, "text": text})
+                text_id = main.storage.list_texts(main.storage.find_user_by_token(token)["id"], PLAIN)[0]
+                by_text = (await client.post("/cipher/encrypt/", json={"token": token, "text": text, "key": "3 3 2 5"})).json()
+                by_id = (await client.post("/cipher/encrypt/", json={"token": token, "text_id": text_id,
+                                                                     "key": "3 3 2 5"})).json()
+                decrypted = (await client.post("/cipher/decrypt/", json={"token": token, "text_id": by_id["file"],
+                                                                         "key": "3 3 2 5"})).json()
+                missing = await client.post("/cipher/encrypt/", json={"token": token, "text_id": "text_99.txt",
+                                                                      "key": "3 3 2 5"})
+                return by_text, by_id, decrypted, missing.status_code
+
+        by_text, by_id, decrypted, missing = asyncio.run(scenario())
+        self.assertEqual(by_id["file"], by_text["file"])  # Тот же шифртекст: файл переиспользован
+        self.assertEqual(by_id["size"], len(by_text["message"].encode('utf-8')))
+        self.assertEqual(decrypted["message"], hill_cipher_decrypt(by_text["message"], np.array([[3, 3], [2, 5]]),
+                                                                   RUSSIAN_ALPHABET))
+        self.assertEqual(missing, 404)
+
+class TestJobQueue(unittest.TestCase):
+    def test_priority_and_cancel(self):
+        queue = JobQueue(temp_dir(self), workers=0)
+        order = []
+
+        def handler(job):
+            order.append(job.params["n"])
+            job.progress(0.5)
+            return {"n": job.params["n"]}
+
+        queue.register("test", handler)
+        low = queue.submit(1, "test", {"n": 1})
+        high = queue.submit(1, "test", {"n": 2}, priority=5)
+        cancelled = queue.submit(1, "test", {"n": 3})
+        self.assertEqual(queue.cancel(cancelled), jobs.CANCELLED)
+        while queue.run_next():
+            pass
+        self.assertEqual(order, [2, 1])
+        self.assertEqual(queue.get(high)["result"], {"n": 2})
+        self.assertEqual((queue.get(low)["state"], queue.get(low)["progress"]), (jobs.DONE, 1.0))
+        self.assertEqual(queue.get(cancelled)["state"], jobs.CANCELLED)
+        with self.assertRaises(ValueError):
+            queue.submit(1, "unknown", {})
+
+    def test_running_cancel_and_failure(self):
+        queue = JobQueue(temp_dir(self), workers=0)
+
+        def handler(job):
+            if job.params.get("fail"):
+                raise ValueError("сбой")
+            queue.cancel(job.id)  # Отмена во время выполнения срабатывает на следующем progress()
+            job.progress(0.5)
+            return {}
+
+        queue.register("test", handler)
+        running = queue.submit(1, "test", {})
+        failed = queue.submit(1, "test", {"fail": True})
+        while queue.run_next():
+            pass
+        self.assertEqual(queue.get(running)["state"], jobs.CANCELLED)
+        self.assertEqual((queue.get(failed)["state"], queue.get(failed)["error"]), (jobs.FAILED, "сбой"))
+
+    def test_cipher_jobs(self):
+        self.addCleanup(setattr, main, "storage", main.storage)
+        self.addCleanup(setattr, main, "job_queue", main.job_queue)
+        self.addCleanup(setattr, main, "JOB_SEGMENT", main.JOB_SEGMENT)
+        main.storage = FileStorage(temp_dir(self))
+        main.storage.build()
+        main.job_queue = JobQueue(temp_dir(self), workers=0)  # Задачи выполняются в тесте через run_next()
+        self.addCleanup(main.job_queue.stop)
+        main.register_jobs(main.job_queue)
+        main.JOB_SEGMENT = 8  # Несколько отрезков даже на коротком тексте
+        transport = httpx.ASGITransport(app=main.app)
+        text = "Все счастливые семьи похожи друг на друга"
+
+        async def scenario():
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                token = (await client.post("/create_user", json={"login": "jobs", "password": "StrongPassword.1",
+                                                                 "token": ""})).json()["token"]
+                await client.post("/add_text", json={"token": token, "text": text})
+                text_id = main.storage.list_texts(main.storage.find_user_by_token(token)["id"], PLAIN)[0]
+                job = (await client.post("/jobs", json={"token": token, "type": "encrypt", "text_id": text_id,
+                                                        "key": "3 3 2 5"})).json()
+                early = (await client.get(f"/jobs/{job['job_id']}/result", params={"token": token})).status_code
+                main.job_queue.run_next()
+                status = (await client.get(f"/jobs/{job['job_id']}", params={"token": token})).json()
+                encrypted = (await client.get(f"/jobs/{job['job_id']}/result", params={"token": token})).text
+                job = (await client.post("/jobs", json={"token": token, "type": "encrypt", "text_id": text_id,
+                                                        "key": "3 3 2 5"})).json()
+                main.job_queue.run_next()
+                repeated = (await client.get(f"/jobs/{job['job_id']}", params={"token": token})).json()
+                job = (await client.post("/jobs", json={"token": token, "type": "decrypt",
+                                                        "text_id": status["result"]["file"], "key": "3 3 2 5"})).json()
+                main.job_queue.run_next()
+                decrypted = (await client.get(f"/jobs/{job['job_id']}/result", params={"token": token})).text
+                missing = (await client.get(f"/jobs/{job['job_id']}", params={"token": "чужой"})).status_code
+                return early, status, encrypted, repeated, decrypted, missing
+
+        early, status, encrypted, repeated, decrypted, missing = asyncio.run(scenario())
+        key_matrix = np.array([[3, 3], [2, 5]])
+        self.assertEqual(early, 409)
+        self.assertEqual(status["state"], jobs.DONE)
+        self.assertEqual(encrypted, hill_cipher_encrypt(text, key_matrix, RUSSIAN_ALPHABET))
+        self.assertEqual(status["result"]["size"], len(encrypted.encode('utf-8')))
+        self.assertEqual(repeated["result"], status["result"])  # Тот же шифртекст: файл переиспользован
+        self.assertEqual(decrypted, hill_cipher_decrypt(encrypted, key_matrix, RUSSIAN_ALPHABET))
+        self.assertEqual(missing, 404)
+
+class TestStartup(unittest.TestCase):
+    def test_lazy_imports(self):
+        # Чистый процесс: импорт main не загружает NumPy и passlib
+        code = "import sys, main; print(sorted(m for m in ('numpy', 'passlib', 'codec', 'hill') if m in sys.modules))"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        self.assertEqual(output.strip().splitlines()[-1], "[]")
+        # Остановка сервера до прогрева тоже не загружает шифр ради завершения пула процессов
+        code = ("import asyncio, sys, main\n"
+                "async def run():\n"
+                "    async with main.lifespan(main.app):\n"
+                "        pass\n"
+                "asyncio.run(run())\n"
+                "print(sorted(m for m in ('numpy', 'parallel') if m in sys.modules))")
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=temp_dir(self), env=env).stdout
+        self.assertEqual(output.strip().splitlines()[-1], "[]")
+
+    def test_ready_after_warm_up(self):
+        self.addCleanup(setattr, main, "storage", main.storage)
+        startup = dict(main.startup)
+        self.addCleanup(lambda: (main.startup.clear(), main.startup.update(startup)))
+        main.storage = FileStorage(temp_dir(self))
+        main.startup.pop("ready", None)
+        transport = httpx.ASGITransport(app=main.app)
+
+        async def scenario():
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                before = (await client.get("/ready")).status_code
+                await main.warm_up()
+                return before, await client.get("/ready")
+
+        before, after = asyncio.run(scenario())
+        self.assertEqual(before, 503)
+        self.assertEqual(after.status_code, 200)
+        self.assertIn("warm_up", after.json()["startup_seconds"])
+
+class TestAnalysis(unittest.TestCase):
+    text = ("Все счастливые семьи похожи друг на друга, каждая несчастливая семья несчастлива по-своему. "
+            "Все смешалось в доме Облонских. Жена узнала, что муж был в связи с бывшею в их доме француженкою-гувернанткой.")
+
+    def test_known_plaintext(self):
+        key_matrix = np.array([[9, 3, 30], [7, 16, 22], [10, 16, 9]])
+        ciphertext = hill_cipher_encrypt(self.text, key_matrix, RUSSIAN_ALPHABET)
+        recovered, blocks = recover_key(self.text[10:80], ciphertext, RUSSIAN_ALPHABET, offset=9)
+        np.testing.assert_array_equal(recovered, key_matrix)
+        with self.assertRaises(ValueError):
+            recover_key("ПРИВЕТ", ciphertext, RUSSIAN_ALPHABET, n=4)
+
+    def test_brute_force(self):
+        key_matrix = np.array([[3, 3], [2, 5]])
+        ciphertext = hill_cipher_encrypt(self.text, key_matrix, RUSSIAN_ALPHABET)
+        candidates = brute_force_2x2(ciphertext, RUSSIAN_ALPHABET, top=3, processes=1)
+        np.testing.assert_array_equal(candidates[0]["key"], key_matrix)
+        self.assertTrue(candidates[0]["preview"].startswith("ВСЕСЧАСТЛИВЫЕ"))
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,149 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+class UserIndex:
+    # Индекс пользователей в памяти: token -> запись и login -> запись.
+    # Строится один раз при старте и сверяется с файлами в users/,
+    # чтобы подхватывать изменения, сделанные вне процесса.
+
+    def __init__(self, user_folder: str = 'users', rescan_interval: float = 1.0):
+        self.user_folder = user_folder
+        self.rescan_interval = rescan_interval
+        self._lock = threading.RLock()
+        self._by_token = {}
+        self._by_login = {}
+        self._files = {}  # имя файла -> (mtime_ns, size, данные пользователя)
+        self._dir_mtime = None
+        self._last_sweep = 0.0
+        self._built = False
+
+    def build(self):
+        with self._lock:
+            self._by_token.clear()
+            self._by_login.clear()
+            self._files.clear()
+            self._dir_mtime = self._stat_dir()
+            if self._dir_mtime is not None:
+                for filename in os.listdir(self.user_folder):
+                    self._load_file(filename)
+            self._last_sweep = time.monotonic()
+            self._built = True
+
+    def __len__(self):
+        return len(self._files)
+
+    def find_by_token(self, token: str):
+        return self._lookup(self._by_token, token)
+
+    def find_by_login(self, login: str):
+        return self._lookup(self._by_login, login)
+
+    def add(self, user_data: dict, filename: str):
+        # Вызывается после записи файла нового пользователя
+        with self._lock:
+            self._ensure_built()
+            path = os.path.join(self.user_folder, filename)
+            try:
+                st = os.stat(path)
+                self._store(filename, st.st_mtime_ns, st.st_size, user_data)
+            except OSError:
+                self._store(filename, None, None, user_data)
+            self._dir_mtime = self._stat_dir()
+
+    def _lookup(self, table: dict, key: str):
+        with self._lock:
+            self._ensure_built()
+            self._sync_directory()
+            filename = table.get(key)
+            if filename is not None and self._is_fresh(filename):
+                return self._files[filename][2]
+            if filename is not None:
+                # Файл изменён или удалён вне процесса — перечитываем только его
+                self._load_file(filename)
+                filename = table.get(key)
+                if filename is not None:
+                    return self._files[filename][2]
+            # Промах: содержимое файлов могло поменяться на месте без изменения
+            # каталога, поэтому не чаще раза в rescan_interval сверяем mtime всех файлов
+            if time.monotonic() - self._last_sweep >= self.rescan_interval:
+                self._sweep()
+                filename = table.get(key)
+                if filename is not None:
+                    return self._files[filename][2]
+            return None
+
+    def _ensure_built(self):
+        if not self._built:
+            self.build()
+
+    def _stat_dir(self):
+        try:
+            return os.stat(self.user_folder).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _sync_directory(self):
+        # Добавление, удаление и переименование файлов меняют mtime каталога
+        dir_mtime = self._stat_dir()
+        if dir_mtime == self._dir_mtime:
+            return
+        self._dir_mtime = dir_mtime
+        on_disk = set(os.listdir(self.user_folder)) if dir_mtime is not None else set()
+        for filename in list(self._files):
+            if filename not in on_disk:
+                self._forget(filename)
+        for filename in on_disk:
+            if filename not in self._files:
+                self._load_file(filename)
+
+    def _sweep(self):
+        for filename in list(self._files):
+            if not self._is_fresh(filename):
+                self._load_file(filename)
+        self._last_sweep = time.monotonic()
+
+    def _is_fresh(self, filename: str) -> bool:
+        mtime_ns, size, _ = self._files[filename]
+        try:
+            st = os.stat(os.path.join(self.user_folder, filename))
+        except OSError:
+            return False
+        return st.st_mtime_ns == mtime_ns and st.st_size == size
+
+    def _load_file(self, filename: str):
+        self._forget(filename)
+        if not filename.endswith(".json"):
+            return
+        path = os.path.join(self.user_folder, filename)
+        try:
+            st = os.stat(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                user_data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.error(f"Ошибка при чтении файла пользователя {filename}: {e}")
+            return
+        self._store(filename, st.st_mtime_ns, st.st_size, user_data)
+
+    def _store(self, filename: str, mtime_ns, size, user_data: dict):
+        self._forget(filename)
+        self._files[filename] = (mtime_ns, size, user_data)
+        if "token" in user_data:
+            self._by_token[user_data["token"]] = filename
+        if "login" in user_data:
+            self._by_login[user_data["login"]] = filename
+
+    def _forget(self, filename: str):
+        entry = self._files.pop(filename, None)
+        if entry is None:
+            return
+        user_data = entry[2]
+        if self._by_token.get(user_data.get("token")) == filename:
+            del self._by_token[user_data["token"]]
+        if self._by_login.get(user_data.get("login")) == filename:
+            del self._by_login[user_data["login"]]
@@ -0,0 +1,52 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# Размеры пулов и порог задаются переменными окружения
+IO_WORKERS = int(os.environ.get("KURSOVAYA_IO_WORKERS", "16"))
+CIPHER_WORKERS = int(os.environ.get("KURSOVAYA_CIPHER_WORKERS", str(os.cpu_count() or 4)))
+# Тексты короче порога (в символах) шифруются прямо в цикле событий:
+# пересылка в поток дороже самого шифрования
+CIPHER_OFFLOAD_THRESHOLD = int(os.environ.get("KURSOVAYA_CIPHER_OFFLOAD_THRESHOLD", str(64 * 1024)))
+
+
+class BoundedExecutor:
+    # Пул потоков с ограниченной очередью: не больше max_workers * queue_factor
+    # задач ждут или выполняются, остальные запросы ждут в цикле событий
+
+    def __init__(self, max_workers: int, name: str, queue_factor: int = 4):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._limit = max_workers * queue_factor
+        self._semaphore = None
+
+    async def run(self, func, *args, **kwargs):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._limit)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+io_executor = BoundedExecutor(IO_WORKERS, "storage-io")
+cipher_executor = BoundedExecutor(CIPHER_WORKERS, "cipher")
+
+
+async def run_io(func, *args, **kwargs):
+    # Блокирующий вызов хранилища (файлы или SQLite) вне цикла событий
+    return await io_executor.run(func, *args, **kwargs)
+
+
+async def run_cipher(size: int, func, *args, **kwargs):
+    if size < CIPHER_OFFLOAD_THRESHOLD:
+        return func(*args, **kwargs)
+    return await cipher_executor.run(func, *args, **kwargs)
+
+
+def shutdown():
+    io_executor.shutdown()
+    cipher_executor.shutdown()